@@ -1,7 +1,6 @@
 import json
 import os
 from typing import Dict, Any
-import psycopg2
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
@@ -33,19 +32,27 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'isBase64Encoded': False
         }
     
+    import psycopg2
+    
     db_url = os.environ.get('DATABASE_URL')
     conn = psycopg2.connect(db_url)
     
     try:
         with conn.cursor() as cur:
-            cur.execute('DELETE FROM movements')
-            movements_deleted = cur.rowcount
+            cur.execute('SELECT COUNT(*) FROM products')
+            products_deleted = cur.fetchone()[0]
             
-            cur.execute('DELETE FROM products')
-            products_deleted = cur.rowcount
+            # Точный COUNT(*) по секционированной истории занял бы время, пропорциональное её размеру,
+            # поэтому число движений - оценка из статистики планировщика по секциям
+            cur.execute('''
+                SELECT COALESCE(SUM(GREATEST(c.reltuples, 0)), 0)::BIGINT
+                FROM pg_inherits i
+                JOIN pg_class c ON c.oid = i.inhrelid
+                WHERE i.inhparent = 'movements'::regclass
+            ''')
+            movements_deleted_estimate = cur.fetchone()[0]
             
-            cur.execute("ALTER SEQUENCE products_id_seq RESTART WITH 1")
-            cur.execute("ALTER SEQUENCE movements_id_seq RESTART WITH 1")
+            cur.execute('TRUNCATE stock_take_counts, stock_takes, stock_recommendations, stock_balances, quantity_deltas, lot_consumptions, lots, movements, products RESTART IDENTITY')
             
             conn.commit()
             
@@ -58,7 +65,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 'body': json.dumps({
                     'success': True,
                     'products_deleted': products_deleted,
-                    'movements_deleted': movements_deleted
+                    'movements_deleted_estimate': movements_deleted_estimate
                 }),
                 'isBase64Encoded': False
             }
@@ -1,18 +1,207 @@
 """
-Business: Экспорт данных товаров из БД в Excel файл
-Args: event - dict с httpMethod
+Business: Экспорт данных товаров из БД в Excel или CSV с выбором колонок, фильтрами и сортировкой,
+          а также книга закрытия периода (view=ledger): товары, движения и строки актов списания
+Args: event - dict с httpMethod, queryStringParameters (columns, batch, below_min_stock, updated_since, sort, format;
+      для view=ledger - from и to)
       context - объект с request_id, function_name
-Returns: Excel файл в base64 или JSON с ошибкой
+Returns: Excel файл в base64, CSV или JSON с ошибкой
 """
 
 import json
 import os
 import base64
-from typing import Dict, Any
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Dict, Any, List, Tuple
 from io import BytesIO
-import psycopg2
-from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Alignment
+
+
+# Колонка экспорта -> (SQL-выражение, заголовок в Excel, ширина колонки)
+EXPORT_COLUMNS: Dict[str, Tuple[str, str, int]] = {
+    'name': ('p.name', 'Название', 25),
+    'inventory_number': ('p.inventory_number', 'Инвентарный номер', 15),
+    'quantity': ('p.quantity + COALESCE(d.pending, 0)', 'Количество', 12),
+    'unit': ("COALESCE(p.unit, 'шт')", 'Единица измерения', 18),
+    'min_stock': ('p.min_stock', 'Мин. остаток', 14),
+    'price': ('p.price', 'Цена (₽)', 15),
+    'batch': ("COALESCE(p.batch, '')", 'Партия', 15),
+    'created_at': ('p.created_at', 'Создан', 18),
+    'updated_at': ('p.updated_at', 'Обновлен', 18)
+}
+DEFAULT_COLUMNS = list(EXPORT_COLUMNS)
+DEFAULT_SORT = 'name'
+
+PENDING_DELTAS_JOIN = '''
+    LEFT JOIN (
+        SELECT product_id, SUM(delta) AS pending
+        FROM t_p72161094_stock_management_exc.quantity_deltas
+        GROUP BY product_id
+    ) d ON d.product_id = p.id
+'''
+
+
+def build_export_query(params: Dict[str, Any]) -> Tuple[List[str], str, List[Any]]:
+    '''
+    Собирает SELECT из разрешённых колонок и фильтров; значения фильтров передаются параметрами.
+    Бросает ValueError с текстом для ответа 400.
+    '''
+    columns = [c.strip() for c in (params.get('columns') or '').split(',') if c.strip()] or DEFAULT_COLUMNS
+    unknown = [c for c in columns if c not in EXPORT_COLUMNS]
+    if unknown:
+        raise ValueError(f'Неизвестные колонки: {", ".join(unknown)}')
+
+    order_by = []
+    for key in (params.get('sort') or DEFAULT_SORT).split(','):
+        key = key.strip()
+        descending = key.startswith('-')
+        key = key.lstrip('-')
+        if key not in EXPORT_COLUMNS:
+            raise ValueError(f'Неизвестное поле сортировки: {key}')
+        order_by.append(EXPORT_COLUMNS[key][0] + (' DESC' if descending else ''))
+    order_by.append('p.id')
+
+    conditions = []
+    values: List[Any] = []
+    if params.get('batch'):
+        conditions.append('p.batch = %s')
+        values.append(params['batch'])
+    if params.get('below_min_stock') == 'true':
+        conditions.append(f"{EXPORT_COLUMNS['quantity'][0]} < p.min_stock")
+    if params.get('updated_since'):
+        try:
+            updated_since = datetime.fromisoformat(params['updated_since'])
+        except ValueError:
+            raise ValueError('updated_since должен быть датой в формате ISO 8601')
+        conditions.append('p.updated_at >= %s')
+        values.append(updated_since)
+
+    select_list = ', '.join(f'{EXPORT_COLUMNS[c][0]} AS {c}' for c in columns)
+    query = f'SELECT {select_list} FROM t_p72161094_stock_management_exc.products p'
+    if 'd.pending' in select_list + ' '.join(conditions + order_by):
+        query += PENDING_DELTAS_JOIN
+    if conditions:
+        query += ' WHERE ' + ' AND '.join(conditions)
+    query += ' ORDER BY ' + ', '.join(order_by)
+
+    return columns, query, values
+
+
+def excel_value(column: str, value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d %H:%M")
+    if isinstance(value, date):
+        return value.strftime("%Y-%m-%d")
+    if isinstance(value, Decimal):
+        return round(float(value), 3)
+    if value is None:
+        return 0 if column in ('quantity', 'min_stock', 'price') else ""
+    return value
+
+
+LEDGER_FETCH_SIZE = 5000
+
+MOVEMENTS_LEDGER_SQL = '''
+    SELECT m.created_at, m.id, p.name, p.inventory_number, m.movement_type, w.name, m.quantity,
+           m.unit_cost, m.batch, m.user_name, m.reason, m.supplier, m.notes
+    FROM t_p72161094_stock_management_exc.movements m
+    LEFT JOIN t_p72161094_stock_management_exc.products p ON p.id = m.product_id
+    LEFT JOIN t_p72161094_stock_management_exc.warehouses w ON w.id = m.warehouse_id
+    WHERE m.created_at >= %s AND m.created_at < %s
+    ORDER BY m.created_at, m.id
+'''
+
+# Строки акта хранятся массивом в writeoff_acts.items - разворачиваем по одной строке на позицию
+WRITEOFF_LINES_LEDGER_SQL = '''
+    SELECT a.act_number, a.act_date, a.responsible_person, a.is_draft, i.line,
+           i.item->>'product_name', i.item->>'inventory_number',
+           NULLIF(i.item->>'quantity', '')::NUMERIC,
+           NULLIF(i.item->>'price', '')::NUMERIC,
+           NULLIF(i.item->>'quantity', '')::NUMERIC * NULLIF(i.item->>'price', '')::NUMERIC,
+           i.item->>'reason'
+    FROM t_p72161094_stock_management_exc.writeoff_acts a
+    CROSS JOIN LATERAL jsonb_array_elements(
+        CASE WHEN jsonb_typeof(a.items) = 'array' THEN a.items ELSE '[]'::JSONB END
+    ) WITH ORDINALITY AS i(item, line)
+    WHERE a.act_date >= %s AND a.act_date < %s
+    ORDER BY a.act_date, a.id, i.line
+'''
+
+# Лист книги -> (SQL, [(заголовок, ширина)])
+LEDGER_SHEETS: List[Tuple[str, str, List[Tuple[str, int]]]] = [
+    ('Движения', MOVEMENTS_LEDGER_SQL, [
+        ('Дата', 18), ('ID', 10), ('Товар', 25), ('Инвентарный номер', 15), ('Тип', 14), ('Склад', 18),
+        ('Количество', 12), ('Себестоимость ед.', 16), ('Партия', 15), ('Пользователь', 18), ('Причина', 20), ('Поставщик', 20),
+        ('Примечание', 25)
+    ]),
+    ('Строки актов списания', WRITEOFF_LINES_LEDGER_SQL, [
+        ('Номер акта', 15), ('Дата акта', 12), ('Ответственный', 20), ('Черновик', 10), ('Строка', 8),
+        ('Товар', 25), ('Инвентарный номер', 15), ('Количество', 12), ('Цена (₽)', 12), ('Сумма (₽)', 14),
+        ('Причина', 20)
+    ])
+]
+
+
+def write_sheet(wb: 'Workbook', conn, title: str, columns: List[Tuple[str, int]], query: str, values: List[Any],
+                keys: List[str]) -> None:
+    '''
+    Пишет лист write-only книги из именованного (серверного) курсора: в памяти одновременно
+    только LEDGER_FETCH_SIZE строк, а готовые строки листа openpyxl сразу сбрасывает во временный файл.
+    '''
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font, PatternFill, Alignment
+    from openpyxl.utils import get_column_letter
+
+    ws = wb.create_sheet(title)
+    for index, (_, width) in enumerate(columns, start=1):
+        ws.column_dimensions[get_column_letter(index)].width = width
+
+    header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
+    header_font = Font(color="FFFFFF", bold=True, size=12)
+    header_alignment = Alignment(horizontal="center", vertical="center")
+    header = []
+    for label, _ in columns:
+        cell = WriteOnlyCell(ws, value=label)
+        cell.fill = header_fill
+        cell.font = header_font
+        cell.alignment = header_alignment
+        header.append(cell)
+    ws.append(header)
+
+    with conn.cursor(name=f'ledger_sheet_{len(wb.worksheets)}') as cursor:
+        cursor.itersize = LEDGER_FETCH_SIZE
+        cursor.execute(query, values)
+        for row in cursor:
+            ws.append([excel_value(key, value) for key, value in zip(keys, row)])
+
+
+def export_ledger(database_url: str, date_from: date, date_to: date) -> bytes:
+    '''Книга закрытия периода [date_from, date_to]: все листы читаются из одного снимка REPEATABLE READ.'''
+    import psycopg2
+    from openpyxl import Workbook
+
+    conn = psycopg2.connect(database_url)
+    conn.set_session(isolation_level='REPEATABLE READ', readonly=True)
+    try:
+        wb = Workbook(write_only=True)
+
+        product_columns, products_query, products_values = build_export_query({})
+        write_sheet(
+            wb, conn, 'Товары',
+            [(EXPORT_COLUMNS[c][1], EXPORT_COLUMNS[c][2]) for c in product_columns],
+            products_query, products_values, product_columns
+        )
+
+        period = [date_from, date_to + timedelta(days=1)]
+        for title, query, columns in LEDGER_SHEETS:
+            write_sheet(wb, conn, title, columns, query, period, [''] * len(columns))
+
+        conn.rollback()
+    finally:
+        conn.close()
+
+    excel_file = BytesIO()
+    wb.save(excel_file)
+    return excel_file.getvalue()
 
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
@@ -48,16 +237,87 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'body': json.dumps({'error': 'DATABASE_URL not configured'})
         }
     
+    params = event.get('queryStringParameters') or {}
+    
+    if params.get('view') == 'ledger':
+        try:
+            date_from = date.fromisoformat(params.get('from') or '')
+            date_to = date.fromisoformat(params.get('to') or '')
+        except ValueError:
+            return {
+                'statusCode': 400,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'isBase64Encoded': False,
+                'body': json.dumps({'error': 'Укажите период from и to в формате YYYY-MM-DD'})
+            }
+        
+        try:
+            ledger = export_ledger(database_url, date_from, date_to)
+        except Exception as e:
+            return {
+                'statusCode': 500,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'isBase64Encoded': False,
+                'body': json.dumps({'error': f'Database error: {str(e)}'})
+            }
+        
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Content-Type': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+                'Content-Disposition': f'attachment; filename="stock_ledger_{date_from}_{date_to}.xlsx"',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'isBase64Encoded': True,
+            'body': base64.b64encode(ledger).decode('utf-8')
+        }
+    
+    export_format = params.get('format', 'xlsx')
+    if export_format not in ('xlsx', 'csv'):
+        return {
+            'statusCode': 400,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'isBase64Encoded': False,
+            'body': json.dumps({'error': 'format должен быть xlsx или csv'})
+        }
+    
+    try:
+        columns, query, values = build_export_query(params)
+    except ValueError as e:
+        return {
+            'statusCode': 400,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'isBase64Encoded': False,
+            'body': json.dumps({'error': str(e)})
+        }
+    
+    # openpyxl нужен только для xlsx - CSV отдаётся без него
+    import psycopg2
+    
     try:
         conn = psycopg2.connect(database_url)
         cursor = conn.cursor()
         
-        cursor.execute("""
-            SELECT name, inventory_number, quantity, unit, min_stock, price, batch, created_at, updated_at
-            FROM t_p72161094_stock_management_exc.products
-            ORDER BY name
-        """)
+        if export_format == 'csv':
+            # COPY отдаёт готовый CSV потоком байтов - строки не превращаются в объекты Python
+            csv_file = BytesIO()
+            copy_sql = cursor.mogrify(query, values).decode('utf-8')
+            cursor.copy_expert(f'COPY ({copy_sql}) TO STDOUT WITH (FORMAT csv, HEADER true)', csv_file)
+            cursor.close()
+            conn.close()
+            
+            return {
+                'statusCode': 200,
+                'headers': {
+                    'Content-Type': 'text/csv; charset=utf-8',
+                    'Content-Disposition': 'attachment; filename="stock_products.csv"',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'isBase64Encoded': False,
+                'body': csv_file.getvalue().decode('utf-8')
+            }
         
+        cursor.execute(query, values)
         products = cursor.fetchall()
         cursor.close()
         conn.close()
@@ -69,6 +329,10 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'body': json.dumps({'error': f'Database error: {str(e)}'})
         }
     
+    from openpyxl import Workbook
+    from openpyxl.styles import Font, PatternFill, Alignment
+    from openpyxl.utils import get_column_letter
+    
     # Create Excel workbook
     wb = Workbook()
     ws = wb.active
@@ -80,8 +344,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     header_alignment = Alignment(horizontal="center", vertical="center")
     
     # Headers
-    headers = ["Название", "Инвентарный номер", "Количество", "Единица измерения", "Мин. остаток", "Цена (₽)", "Партия", "Создан", "Обновлен"]
-    ws.append(headers)
+    ws.append([EXPORT_COLUMNS[c][1] for c in columns])
     
     for cell in ws[1]:
         cell.fill = header_fill
@@ -90,29 +353,11 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     
     # Data rows
     for product in products:
-        name, inventory_number, quantity, unit, min_stock, price, batch, created_at, updated_at = product
-        ws.append([
-            name,
-            inventory_number,
-            round(float(quantity), 3) if quantity else 0.000,
-            unit or "шт",
-            round(float(min_stock), 3) if min_stock else 0.000,
-            float(price) if price else 0,
-            batch or "",
-            created_at.strftime("%Y-%m-%d %H:%M") if created_at else "",
-            updated_at.strftime("%Y-%m-%d %H:%M") if updated_at else ""
-        ])
+        ws.append([excel_value(column, value) for column, value in zip(columns, product)])
     
     # Column widths
-    ws.column_dimensions['A'].width = 25
-    ws.column_dimensions['B'].width = 15
-    ws.column_dimensions['C'].width = 12
-    ws.column_dimensions['D'].width = 18
-    ws.column_dimensions['E'].width = 14
-    ws.column_dimensions['F'].width = 15
-    ws.column_dimensions['G'].width = 15
-    ws.column_dimensions['H'].width = 18
-    ws.column_dimensions['I'].width = 18
+    for index, column in enumerate(columns, start=1):
+        ws.column_dimensions[get_column_letter(index)].width = EXPORT_COLUMNS[column][2]
     
     # Save to BytesIO
     excel_file = BytesIO()
@@ -1,43 +1,377 @@
 """
 Business: Импорт товаров из Excel файла в БД
-Args: event - dict с httpMethod, body (base64 Excel файл)
+Args: event - dict с httpMethod, body (base64 Excel файл, sheets - 'all' или список листов,
+      warehouse_id - склад, остатки которого задаёт файл), queryStringParameters
       context - объект с request_id, function_name
-Returns: JSON с результатом импорта
+Returns: JSON с результатом импорта или состоянием фонового задания
 """
 
 import json
 import os
 import base64
-from typing import Dict, Any, List
+import time
+from itertools import islice
+from typing import Dict, Any, List, Tuple, Optional
 from io import BytesIO
-import psycopg2
-from openpyxl import load_workbook
-from decimal import Decimal
+
+
+JOB_CHUNK_SIZE = 500
+JOB_TIME_BUDGET_SECONDS = 20
+JOB_LOCK_NAMESPACE = 7301
+
+DEFAULT_WAREHOUSE_ID = int(os.environ.get('DEFAULT_WAREHOUSE_ID', '1'))
+
+_worker_file_bytes: bytes = b''
+
+
+def parse_positive_int(raw: Any) -> Optional[int]:
+    '''Целое из строки запроса или тела в пределах INTEGER; None для пустого, нецелого или нулевого значения.'''
+    value = str(raw if raw is not None else '').strip()
+    if not (value.isascii() and value.isdigit()) or not 0 < int(value) <= 2147483647:
+        return None
+    return int(value)
+
+
+def parse_row(row: tuple) -> Dict[str, Any]:
+    name = str(row[0]) if row[0] else ''
+    inventory_number = str(row[1]) if row[1] else ''
+    quantity = float(row[2]) if row[2] else 0.0
+    unit = str(row[3]) if row[3] else 'шт'
+    min_stock = float(row[4]) if row[4] else 0.0
+    price = float(row[5]) if row[5] else 0.0
+    batch = str(row[6]) if row[6] else ''
+
+    return {
+        'name': name,
+        'inventory_number': inventory_number,
+        'quantity': quantity,
+        'unit': unit,
+        'min_stock': min_stock,
+        'price': price,
+        'batch': batch
+    }
+
+
+def _init_sheet_worker(file_bytes: bytes) -> None:
+    global _worker_file_bytes
+    _worker_file_bytes = file_bytes
+
+
+def parse_sheet(sheet_name: str) -> List[Dict[str, Any]]:
+    '''
+    Разбирает один лист книги. Выполняется в дочернем процессе пула:
+    книга открывается в режиме read_only, поэтому читается только нужный лист.
+    '''
+    from openpyxl import load_workbook
+
+    wb = load_workbook(BytesIO(_worker_file_bytes), read_only=True)
+    products = [parse_row(row) for row in wb[sheet_name].iter_rows(min_row=2, values_only=True) if row and row[0]]
+    wb.close()
+    return products
+
+
+def parse_sheets(file_bytes: bytes, sheet_names: List[str], max_workers: Optional[int] = None) -> List[List[Dict[str, Any]]]:
+    '''
+    Разбирает листы параллельно в ProcessPoolExecutor, результат в порядке sheet_names.
+    Если среда не позволяет создавать процессы, листы разбираются последовательно.
+    '''
+    workers = max_workers or min(len(sheet_names), os.cpu_count() or 1)
+
+    if workers > 1 and len(sheet_names) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+
+        try:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_sheet_worker, initargs=(file_bytes,)) as pool:
+                return list(pool.map(parse_sheet, sheet_names))
+        except (OSError, NotImplementedError):
+            pass
+
+    _init_sheet_worker(file_bytes)
+    return [parse_sheet(name) for name in sheet_names]
+
+
+def merge_sheets(sheets: List[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    '''
+    Объединяет строки листов в один список без повторов инвентарного номера.
+    При повторе побеждает строка из более позднего листа (в порядке книги),
+    а внутри листа - более поздняя строка.
+    '''
+    merged: Dict[str, Dict[str, Any]] = {}
+    for products in sheets:
+        for product in products:
+            merged.pop(product['inventory_number'], None)
+            merged[product['inventory_number']] = product
+    return list(merged.values())
+
+
+def bulk_upsert_products(cursor, products: List[Dict], warehouse_id: int = DEFAULT_WAREHOUSE_ID) -> Tuple[int, int]:
+    '''
+    Загружает товары одним пакетом через временную таблицу и выполняет upsert
+    и запись движений на разницу остатков набором SQL-операторов, без цикла по строкам.
+    Количество из файла - остаток на складе warehouse_id; итог товара пересчитывает триггер stock_balances.
+    Инвентарные номера в products должны быть уникальны (см. merge_sheets).
+    Транзакцией управляет вызывающий код.
+    '''
+    from psycopg2.extras import execute_values
+
+    cursor.execute('SELECT compact_quantity_deltas(TRUE)')
+    cursor.execute('''
+        CREATE TEMP TABLE IF NOT EXISTS import_staging (
+            name VARCHAR(255),
+            inventory_number VARCHAR(100) PRIMARY KEY,
+            quantity NUMERIC(10,3),
+            unit VARCHAR(20),
+            min_stock NUMERIC(10,3),
+            price DECIMAL(10, 2),
+            batch VARCHAR(50),
+            product_id INTEGER,
+            old_quantity NUMERIC(10,3)
+        ) ON COMMIT DROP
+    ''')
+    cursor.execute('TRUNCATE import_staging')
+    execute_values(
+        cursor,
+        'INSERT INTO import_staging (name, inventory_number, quantity, unit, min_stock, price, batch) VALUES %s',
+        [(p['name'], p['inventory_number'], p['quantity'], p['unit'], p['min_stock'], p['price'], p['batch']) for p in products],
+        page_size=1000
+    )
+
+    # Строки остатков существующих товаров создаются заранее, чтобы их можно было заблокировать:
+    # остаток блокируется раньше товара, в том же порядке, что и при записи движения
+    cursor.execute('''
+        INSERT INTO stock_balances (warehouse_id, product_id, quantity)
+        SELECT %s, p.id, 0
+        FROM products p
+        JOIN import_staging st ON st.inventory_number = p.inventory_number
+        ON CONFLICT (warehouse_id, product_id) DO NOTHING
+    ''', (warehouse_id,))
+    cursor.execute('''
+        UPDATE import_staging s
+        SET product_id = locked.id, old_quantity = locked.quantity
+        FROM (
+            SELECT p.id, p.inventory_number, b.quantity
+            FROM products p
+            JOIN import_staging st ON st.inventory_number = p.inventory_number
+            JOIN stock_balances b ON b.product_id = p.id AND b.warehouse_id = %s
+            FOR UPDATE OF b
+        ) locked
+        WHERE locked.inventory_number = s.inventory_number
+    ''', (warehouse_id,))
+    updated = cursor.rowcount
+    inserted = len(products) - updated
+
+    cursor.execute('''
+        WITH upserted AS (
+            INSERT INTO products (name, inventory_number, quantity, unit, min_stock, price, batch)
+            SELECT name, inventory_number, 0, unit, min_stock, price, batch FROM import_staging
+            ON CONFLICT (inventory_number) DO UPDATE
+            SET name = EXCLUDED.name, unit = EXCLUDED.unit,
+                min_stock = EXCLUDED.min_stock, price = EXCLUDED.price, batch = EXCLUDED.batch,
+                updated_at = NOW()
+            RETURNING id, inventory_number
+        )
+        UPDATE import_staging s SET product_id = u.id
+        FROM upserted u
+        WHERE u.inventory_number = s.inventory_number AND s.product_id IS NULL
+    ''')
+
+    cursor.execute('''
+        INSERT INTO stock_balances (warehouse_id, product_id, quantity)
+        SELECT %s, product_id, quantity
+        FROM import_staging
+        WHERE quantity <> COALESCE(old_quantity, 0)
+        ON CONFLICT (warehouse_id, product_id) DO UPDATE SET quantity = EXCLUDED.quantity
+    ''', (warehouse_id,))
+
+    cursor.execute('''
+        INSERT INTO movements (product_id, movement_type, quantity, user_name, supplier, reason, warehouse_id)
+        SELECT product_id,
+               CASE WHEN quantity > COALESCE(old_quantity, 0) THEN 'Поступление' ELSE 'Списание' END,
+               ABS(quantity - COALESCE(old_quantity, 0)),
+               'Импорт из Excel',
+               CASE WHEN quantity > COALESCE(old_quantity, 0) THEN 'Excel импорт' END,
+               CASE WHEN quantity < COALESCE(old_quantity, 0) THEN 'Корректировка импорта' END,
+               %s
+        FROM import_staging
+        WHERE quantity <> COALESCE(old_quantity, 0)
+          AND (old_quantity IS NOT NULL OR quantity > 0)
+    ''', (warehouse_id,))
+
+    return inserted, updated
+
+
+def create_job(conn, file_bytes: bytes, chunk_size: int, warehouse_id: int = DEFAULT_WAREHOUSE_ID) -> int:
+    import psycopg2
+    from openpyxl import load_workbook
+
+    wb = load_workbook(BytesIO(file_bytes), read_only=True)
+    total_rows = max((wb.active.max_row or 1) - 1, 0)
+    wb.close()
+
+    with conn.cursor() as cur:
+        cur.execute('''
+            INSERT INTO import_jobs (file_data, chunk_size, total_rows, warehouse_id)
+            VALUES (%s, %s, %s, %s)
+            RETURNING id
+        ''', (psycopg2.Binary(file_bytes), chunk_size, total_rows, warehouse_id))
+        job_id = cur.fetchone()[0]
+    conn.commit()
+
+    return job_id
+
+
+def process_job(conn, job_id: int, time_budget: float) -> bool:
+    '''
+    Обрабатывает задание порциями, коммитя каждую порцию вместе с новым смещением строки.
+    Прерванное задание продолжается с последней закоммиченной порции: по истечении бюджета времени
+    оно переходит в статус 'paused' и ждёт следующего POST с job_id.
+    Возвращает False, если задание сейчас обрабатывает другой воркер.
+    '''
+    import psycopg2
+    from openpyxl import load_workbook
+
+    deadline = time.monotonic() + time_budget
+    cursor = conn.cursor()
+
+    cursor.execute('SELECT pg_try_advisory_lock(%s, %s)', (JOB_LOCK_NAMESPACE, job_id))
+    if not cursor.fetchone()[0]:
+        conn.rollback()
+        cursor.close()
+        return False
+
+    try:
+        cursor.execute(
+            'SELECT status, file_data, chunk_size, row_offset, warehouse_id FROM import_jobs WHERE id = %s',
+            (job_id,)
+        )
+        job = cursor.fetchone()
+        if not job or job[0] == 'done':
+            conn.rollback()
+            return True
+
+        _, file_data, chunk_size, row_offset, warehouse_id = job
+
+        cursor.execute('''
+            UPDATE import_jobs
+            SET status = 'running', error = NULL,
+                started_at = COALESCE(started_at, NOW()), updated_at = NOW()
+            WHERE id = %s
+        ''', (job_id,))
+        conn.commit()
+
+        try:
+            wb = load_workbook(BytesIO(bytes(file_data)), read_only=True)
+            rows = wb.active.iter_rows(min_row=2 + row_offset, values_only=True)
+            finished = False
+
+            while time.monotonic() < deadline:
+                chunk_started = time.monotonic()
+                chunk = list(islice(rows, chunk_size))
+                if not chunk:
+                    finished = True
+                    break
+
+                products = merge_sheets([[parse_row(row) for row in chunk if row and row[0]]])
+                inserted, updated = bulk_upsert_products(cursor, products, warehouse_id) if products else (0, 0)
+                row_offset += len(chunk)
+
+                cursor.execute('''
+                    UPDATE import_jobs
+                    SET row_offset = %s, inserted = inserted + %s, updated = updated + %s,
+                        elapsed_seconds = elapsed_seconds + %s, updated_at = NOW()
+                    WHERE id = %s
+                ''', (row_offset, inserted, updated, time.monotonic() - chunk_started, job_id))
+                conn.commit()
+
+            wb.close()
+
+            # 'running' остаётся только у задания, которое сейчас держит воркер
+            if finished:
+                cursor.execute('''
+                    UPDATE import_jobs
+                    SET status = 'done', file_data = NULL, finished_at = NOW(), updated_at = NOW()
+                    WHERE id = %s
+                ''', (job_id,))
+            else:
+                cursor.execute(
+                    "UPDATE import_jobs SET status = 'paused', updated_at = NOW() WHERE id = %s",
+                    (job_id,)
+                )
+            conn.commit()
+        except Exception as e:
+            # Соединение могло оборваться вместе с порцией: тогда статус не записать,
+            # а задание продолжит следующий POST с job_id с последней закоммиченной порции
+            try:
+                conn.rollback()
+                cursor.execute('''
+                    UPDATE import_jobs SET status = 'failed', error = %s, updated_at = NOW() WHERE id = %s
+                ''', (str(e), job_id))
+                conn.commit()
+            except psycopg2.Error:
+                raise e
+
+        return True
+    finally:
+        # Сессионная блокировка снимается и при закрытии соединения, поэтому ошибка снятия
+        # не должна скрывать исходную
+        try:
+            cursor.execute('SELECT pg_advisory_unlock(%s, %s)', (JOB_LOCK_NAMESPACE, job_id))
+            conn.commit()
+        except psycopg2.Error:
+            pass
+        cursor.close()
+
+
+def get_job(conn, job_id: int) -> Optional[Dict[str, Any]]:
+    from psycopg2.extras import RealDictCursor
+
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute('''
+            SELECT id, status, warehouse_id, chunk_size, total_rows, row_offset, inserted, updated,
+                   elapsed_seconds, error, created_at, started_at, updated_at, finished_at
+            FROM import_jobs
+            WHERE id = %s
+        ''', (job_id,))
+        job = cur.fetchone()
+
+    if not job:
+        return None
+
+    elapsed = float(job.pop('elapsed_seconds') or 0)
+    job['processed_rows'] = job.pop('row_offset')
+    job['elapsed_seconds'] = round(elapsed, 3)
+    job['rows_per_sec'] = round(job['processed_rows'] / elapsed, 1) if elapsed > 0 else 0
+    job['progress'] = round(100 * job['processed_rows'] / job['total_rows'], 1) if job['total_rows'] else (100.0 if job['status'] == 'done' else 0)
+    for key in ('created_at', 'started_at', 'updated_at', 'finished_at'):
+        if job[key]:
+            job[key] = job[key].isoformat()
+
+    return job
 
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'POST')
-    
+
     if method == 'OPTIONS':
         return {
             'statusCode': 200,
             'headers': {
                 'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'POST, OPTIONS',
+                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
                 'Access-Control-Allow-Headers': 'Content-Type',
                 'Access-Control-Max-Age': '86400'
             },
             'body': ''
         }
-    
-    if method != 'POST':
+
+    if method not in ('GET', 'POST'):
         return {
             'statusCode': 405,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
             'isBase64Encoded': False,
             'body': json.dumps({'error': 'Method not allowed'})
         }
-    
+
     database_url = os.environ.get('DATABASE_URL')
     if not database_url:
         return {
@@ -46,7 +380,42 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'isBase64Encoded': False,
             'body': json.dumps({'error': 'DATABASE_URL not configured'})
         }
-    
+
+    import psycopg2
+
+    if method == 'GET':
+        params = event.get('queryStringParameters') or {}
+        job_id = parse_positive_int(params.get('job_id'))
+
+        if not job_id:
+            return {
+                'statusCode': 400,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'isBase64Encoded': False,
+                'body': json.dumps({'error': 'job_id must be a positive integer'})
+            }
+
+        conn = psycopg2.connect(database_url)
+        try:
+            job = get_job(conn, job_id)
+        finally:
+            conn.close()
+
+        if not job:
+            return {
+                'statusCode': 404,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'isBase64Encoded': False,
+                'body': json.dumps({'error': 'Job not found'})
+            }
+
+        return {
+            'statusCode': 200,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'isBase64Encoded': False,
+            'body': json.dumps({'job': job})
+        }
+
     body_str = event.get('body', '{}')
     if not body_str or body_str == '{}':
         return {
@@ -55,11 +424,44 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'isBase64Encoded': False,
             'body': json.dumps({'error': 'No file provided'})
         }
-    
+
     try:
         body_data = json.loads(body_str)
+
+        if body_data.get('job_id'):
+            job_id = parse_positive_int(body_data['job_id'])
+            if not job_id:
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'isBase64Encoded': False,
+                    'body': json.dumps({'error': 'job_id must be a positive integer'})
+                }
+
+            conn = psycopg2.connect(database_url)
+            try:
+                acquired = process_job(conn, job_id, JOB_TIME_BUDGET_SECONDS)
+                job = get_job(conn, job_id)
+            finally:
+                conn.close()
+
+            if not job:
+                return {
+                    'statusCode': 404,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'isBase64Encoded': False,
+                    'body': json.dumps({'error': 'Job not found'})
+                }
+
+            return {
+                'statusCode': 200 if acquired else 409,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'isBase64Encoded': False,
+                'body': json.dumps({'job': job})
+            }
+
         file_base64 = body_data.get('file')
-        
+
         if not file_base64:
             return {
                 'statusCode': 400,
@@ -67,99 +469,122 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 'isBase64Encoded': False,
                 'body': json.dumps({'error': 'No file provided'})
             }
-        
+
         file_bytes = base64.b64decode(file_base64)
+        warehouse_id = parse_positive_int(body_data.get('warehouse_id') or DEFAULT_WAREHOUSE_ID)
+        if not warehouse_id:
+            return {
+                'statusCode': 400,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'isBase64Encoded': False,
+                'body': json.dumps({'error': 'warehouse_id must be a positive integer'})
+            }
+
+        if body_data.get('mode') == 'job':
+            chunk_size = parse_positive_int(body_data.get('chunk_size') or JOB_CHUNK_SIZE)
+            if not chunk_size:
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'isBase64Encoded': False,
+                    'body': json.dumps({'error': 'chunk_size must be a positive integer'})
+                }
+
+            conn = psycopg2.connect(database_url)
+            try:
+                job_id = create_job(conn, file_bytes, chunk_size, warehouse_id)
+                process_job(conn, job_id, JOB_TIME_BUDGET_SECONDS)
+                job = get_job(conn, job_id)
+            finally:
+                conn.close()
+
+            return {
+                'statusCode': 202,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'isBase64Encoded': False,
+                'body': json.dumps({'job': job})
+            }
+
+        from openpyxl import load_workbook
+
+        sheets_param = body_data.get('sheets')
+        if sheets_param is not None and sheets_param != 'all' and not (
+            isinstance(sheets_param, list) and all(isinstance(name, str) for name in sheets_param)
+        ):
+            return {
+                'statusCode': 400,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'isBase64Encoded': False,
+                'body': json.dumps({'error': "sheets must be 'all' or a list of sheet names"})
+            }
+
+        if sheets_param:
+            wb = load_workbook(BytesIO(file_bytes), read_only=True)
+            workbook_sheets = wb.sheetnames
+            wb.close()
+
+            if sheets_param == 'all':
+                sheet_names = workbook_sheets
+            else:
+                requested = set(sheets_param)
+                missing = sorted(requested - set(workbook_sheets))
+                if missing:
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'isBase64Encoded': False,
+                        'body': json.dumps({'error': f'Sheets not found: {", ".join(missing)}'})
+                    }
+                sheet_names = [name for name in workbook_sheets if name in requested]
+
+            parsed = parse_sheets(file_bytes, sheet_names)
+            products = merge_sheets(parsed)
+
+            conn = psycopg2.connect(database_url)
+            try:
+                with conn.cursor() as cursor:
+                    inserted, updated = bulk_upsert_products(cursor, products, warehouse_id) if products else (0, 0)
+                conn.commit()
+            finally:
+                conn.close()
+
+            return {
+                'statusCode': 200,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'isBase64Encoded': False,
+                'body': json.dumps({
+                    'success': True,
+                    'inserted': inserted,
+                    'updated': updated,
+                    'total': inserted + updated,
+                    'sheets': {name: len(rows) for name, rows in zip(sheet_names, parsed)},
+                    'duplicates': sum(len(rows) for rows in parsed) - len(products)
+                })
+            }
+
         excel_file = BytesIO(file_bytes)
-        
+
         wb = load_workbook(excel_file)
         ws = wb.active
-        
+
         products: List[Dict] = []
         for row in ws.iter_rows(min_row=2, values_only=True):
             if not row[0]:
                 continue
-            
-            name = str(row[0]) if row[0] else ''
-            inventory_number = str(row[1]) if row[1] else ''
-            quantity = float(row[2]) if row[2] else 0.0
-            unit = str(row[3]) if row[3] else 'шт'
-            min_stock = float(row[4]) if row[4] else 0.0
-            price = float(row[5]) if row[5] else 0.0
-            batch = str(row[6]) if row[6] else ''
-            
-            products.append({
-                'name': name,
-                'inventory_number': inventory_number,
-                'quantity': quantity,
-                'unit': unit,
-                'min_stock': min_stock,
-                'price': price,
-                'batch': batch
-            })
-        
+
+            products.append(parse_row(row))
+
+        products = merge_sheets([products])
+
         conn = psycopg2.connect(database_url)
         cursor = conn.cursor()
-        
-        inserted = 0
-        updated = 0
-        
-        for product in products:
-            safe_inv = str(product['inventory_number']).replace("'", "''")
-            safe_name = str(product['name']).replace("'", "''")
-            safe_unit = str(product['unit']).replace("'", "''")
-            safe_batch = str(product['batch']).replace("'", "''")
-            
-            cursor.execute(
-                f"SELECT id, quantity FROM products WHERE inventory_number = '{safe_inv}'"
-            )
-            
-            existing = cursor.fetchone()
-            
-            if existing:
-                product_id = existing[0]
-                old_quantity = float(existing[1]) if existing[1] else 0.0
-                new_quantity = float(product['quantity'])
-                quantity_diff = new_quantity - old_quantity
-                
-                cursor.execute(
-                    f"UPDATE products SET name = '{safe_name}', quantity = {product['quantity']}, " +
-                    f"unit = '{safe_unit}', min_stock = {product['min_stock']}, price = {product['price']}, " +
-                    f"batch = '{safe_batch}', updated_at = NOW() WHERE inventory_number = '{safe_inv}'"
-                )
-                
-                if quantity_diff > 0:
-                    cursor.execute(
-                        f"INSERT INTO movements (product_id, movement_type, quantity, user_name, supplier) " +
-                        f"VALUES ({product_id}, 'Поступление', {quantity_diff}, 'Импорт из Excel', 'Excel импорт')"
-                    )
-                elif quantity_diff < 0:
-                    cursor.execute(
-                        f"INSERT INTO movements (product_id, movement_type, quantity, user_name, reason) " +
-                        f"VALUES ({product_id}, 'Списание', {abs(quantity_diff)}, 'Импорт из Excel', 'Корректировка импорта')"
-                    )
-                
-                updated += 1
-            else:
-                cursor.execute(
-                    f"INSERT INTO products (name, inventory_number, quantity, unit, min_stock, price, batch) " +
-                    f"VALUES ('{safe_name}', '{safe_inv}', {product['quantity']}, '{safe_unit}', " +
-                    f"{product['min_stock']}, {product['price']}, '{safe_batch}') RETURNING id"
-                )
-                
-                product_id = cursor.fetchone()[0]
-                
-                if product['quantity'] > 0:
-                    cursor.execute(
-                        f"INSERT INTO movements (product_id, movement_type, quantity, user_name, supplier) " +
-                        f"VALUES ({product_id}, 'Поступление', {product['quantity']}, 'Импорт из Excel', 'Excel импорт')"
-                    )
-                
-                inserted += 1
-        
+
+        inserted, updated = bulk_upsert_products(cursor, products, warehouse_id) if products else (0, 0)
+
         conn.commit()
         cursor.close()
         conn.close()
-        
+
         return {
             'statusCode': 200,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
@@ -171,11 +596,11 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 'total': inserted + updated
             })
         }
-    
+
     except Exception as e:
         return {
             'statusCode': 500,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
             'isBase64Encoded': False,
             'body': json.dumps({'error': f'Import error: {str(e)}'})
-        }
\ No newline at end of file
+        }
@@ -0,0 +1,129 @@
+"""
+Business: Партионный учёт остатков - список лотов товара и оценка склада по FIFO
+Args: event - dict с httpMethod, queryStringParameters (product_id или view=valuation)
+      context - объект с request_id
+Returns: HTTP response с лотами или стоимостью остатков
+"""
+
+import json
+import os
+from typing import Dict, Any, Optional
+
+
+def parse_positive_int(raw: Any) -> Optional[int]:
+    '''Целое из строки запроса в пределах INTEGER; None для нецелого или нулевого значения.'''
+    value = str(raw if raw is not None else '').strip()
+    if not (value.isascii() and value.isdigit()) or not 0 < int(value) <= 2147483647:
+        return None
+    return int(value)
+
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    method: str = event.get('httpMethod', 'GET')
+
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'GET, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id',
+                'Access-Control-Max-Age': '86400'
+            },
+            'body': '',
+            'isBase64Encoded': False
+        }
+
+    if method != 'GET':
+        return {
+            'statusCode': 405,
+            'headers': {'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Method not allowed'}),
+            'isBase64Encoded': False
+        }
+
+    params = event.get('queryStringParameters') or {}
+    product_id = params.get('product_id')
+
+    if product_id and not parse_positive_int(product_id):
+        return {
+            'statusCode': 400,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': json.dumps({'error': 'Некорректный товар'}),
+            'isBase64Encoded': False
+        }
+
+    import psycopg2
+    from psycopg2.extras import RealDictCursor
+
+    db_url = os.environ.get('DATABASE_URL')
+    conn = psycopg2.connect(db_url)
+
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            if product_id:
+                include_closed = params.get('include_closed') == 'true'
+                cur.execute('''
+                    SELECT id, batch, received_qty, remaining_qty, unit_cost, remaining_value, received_at
+                    FROM lots
+                    WHERE product_id = %s AND (remaining_qty > 0 OR %s)
+                    ORDER BY received_at, id
+                ''', (parse_positive_int(product_id), include_closed))
+                lots = cur.fetchall()
+
+                for lot in lots:
+                    for key in ('received_qty', 'remaining_qty', 'unit_cost', 'remaining_value'):
+                        lot[key] = float(lot[key])
+                    lot['received_at'] = lot['received_at'].isoformat()
+
+                return {
+                    'statusCode': 200,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'body': json.dumps({'lots': lots}),
+                    'isBase64Encoded': False
+                }
+
+            # Оценка читает только предвычисленные remaining_qty/remaining_value открытых лотов
+            cur.execute('''
+                SELECT p.id AS product_id, p.name, p.inventory_number,
+                       v.remaining_qty, v.remaining_value, v.open_lots, v.oldest_received_at
+                FROM (
+                    SELECT product_id,
+                           SUM(remaining_qty) AS remaining_qty,
+                           SUM(remaining_value) AS remaining_value,
+                           COUNT(*) AS open_lots,
+                           MIN(received_at) AS oldest_received_at
+                    FROM lots
+                    WHERE remaining_qty > 0
+                    GROUP BY product_id
+                ) v
+                JOIN products p ON p.id = v.product_id
+                ORDER BY v.remaining_value DESC
+            ''')
+            valuation = cur.fetchall()
+
+            total_value = 0.0
+            for item in valuation:
+                item['remaining_qty'] = float(item['remaining_qty'])
+                item['remaining_value'] = float(item['remaining_value'])
+                item['oldest_received_at'] = item['oldest_received_at'].isoformat()
+                total_value += item['remaining_value']
+
+            return {
+                'statusCode': 200,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'body': json.dumps({'valuation': valuation, 'total_value': round(total_value, 2)}),
+                'isBase64Encoded': False
+            }
+
+    finally:
+        conn.close()
@@ -0,0 +1,150 @@
+"""
+Business: Обслуживание помесячных секций таблицы движений (создание будущих месяцев и архивирование старых).
+          POST ensure вызывается по расписанию (раз в сутки): до создания секции месяца движения
+          попадают в movements_default и переносятся в секцию при её создании
+Args: event - dict с httpMethod, body (action: ensure | archive, months_ahead, before,
+      drop - JSON true, чтобы удалить отсоединённые секции; по умолчанию секции только отсоединяются)
+      context - объект с request_id
+Returns: HTTP response со списком секций или результатом операции
+"""
+
+import json
+import os
+from typing import Dict, Any
+
+
+DEFAULT_MONTHS_AHEAD = 3
+
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    method: str = event.get('httpMethod', 'GET')
+
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id',
+                'Access-Control-Max-Age': '86400'
+            },
+            'body': '',
+            'isBase64Encoded': False
+        }
+
+    import psycopg2
+    from psycopg2.extras import RealDictCursor
+
+    db_url = os.environ.get('DATABASE_URL')
+    conn = psycopg2.connect(db_url)
+
+    try:
+        if method == 'GET':
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute('''
+                    SELECT c.relname AS name,
+                           pg_get_expr(c.relpartbound, c.oid) AS bounds,
+                           GREATEST(c.reltuples, 0)::BIGINT AS estimated_rows,
+                           pg_total_relation_size(c.oid) AS size_bytes
+                    FROM pg_inherits i
+                    JOIN pg_class c ON c.oid = i.inhrelid
+                    WHERE i.inhparent = 'movements'::regclass
+                    ORDER BY c.relname
+                ''')
+                partitions = cur.fetchall()
+
+                return {
+                    'statusCode': 200,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'body': json.dumps({'partitions': partitions}),
+                    'isBase64Encoded': False
+                }
+
+        elif method == 'POST':
+            body = json.loads(event.get('body') or '{}')
+            action = body.get('action', 'ensure')
+
+            if action == 'ensure':
+                months_ahead = int(body.get('months_ahead', DEFAULT_MONTHS_AHEAD))
+
+                with conn.cursor() as cur:
+                    cur.execute('SELECT ensure_movement_partitions(%s)', (months_ahead,))
+                    created = cur.fetchone()[0]
+                    conn.commit()
+
+                return {
+                    'statusCode': 200,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'body': json.dumps({'success': True, 'created': created}),
+                    'isBase64Encoded': False
+                }
+
+            elif action == 'archive':
+                before = body.get('before')
+                if not before:
+                    return {
+                        'statusCode': 400,
+                        'headers': {
+                            'Content-Type': 'application/json',
+                            'Access-Control-Allow-Origin': '*'
+                        },
+                        'body': json.dumps({'error': 'before date required'}),
+                        'isBase64Encoded': False
+                    }
+
+                # Удаление секций необратимо: только явный JSON true, строки вроде "false" не считаются
+                drop = body.get('drop', False)
+                if not isinstance(drop, bool):
+                    return {
+                        'statusCode': 400,
+                        'headers': {
+                            'Content-Type': 'application/json',
+                            'Access-Control-Allow-Origin': '*'
+                        },
+                        'body': json.dumps({'error': 'drop must be true or false'}),
+                        'isBase64Encoded': False
+                    }
+
+                with conn.cursor() as cur:
+                    cur.execute(
+                        'SELECT archive_movement_partitions(%s::DATE, %s)',
+                        (before, drop)
+                    )
+                    archived = [row[0] for row in cur.fetchall()]
+                    conn.commit()
+
+                return {
+                    'statusCode': 200,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'body': json.dumps({'success': True, 'archived': archived}),
+                    'isBase64Encoded': False
+                }
+
+            return {
+                'statusCode': 400,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'body': json.dumps({'error': 'Unknown action'}),
+                'isBase64Encoded': False
+            }
+
+        return {
+            'statusCode': 405,
+            'headers': {'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Method not allowed'}),
+            'isBase64Encoded': False
+        }
+
+    finally:
+        conn.close()
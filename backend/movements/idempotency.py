@@ -0,0 +1 @@
+../shared/idempotency.py
\ No newline at end of file
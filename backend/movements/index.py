@@ -1,13 +1,138 @@
 import json
 import os
-from typing import Dict, Any
-import psycopg2
-from psycopg2.extras import RealDictCursor
+from typing import Dict, Any, Optional
+
+from db_pool import get_connection, get_read_connection, read_after_token, release_connection, prepared_executor
+from idempotency import begin_idempotent_request, store_idempotent_response
+
+
+# direct - движение сразу обновляет products.quantity (строковая блокировка товара);
+# append - движение только добавляет дельту в quantity_deltas, остаток догоняется компакцией.
+# Списание в обоих режимах забирает количество из лотов по FIFO под FOR UPDATE открытых лотов товара,
+# так что списания одного товара всё равно идут друг за другом (benchmarks/hot_sku_contention.py)
+QUANTITY_LEDGER_MODE = os.environ.get('QUANTITY_LEDGER_MODE', 'direct')
+
+# В режиме append компакцию запускает движение, чья дельта пересекла очередную кратную этому числу,
+# - отдельной транзакцией после коммита; чтения складывают остаток с ещё не перенесёнными дельтами сами
+COMPACT_EVERY_DELTAS = int(os.environ.get('COMPACT_EVERY_DELTAS', '500'))
+
+# Склад, к которому относятся движения без warehouse_id (основной склад из миграции V0018)
+DEFAULT_WAREHOUSE_ID = int(os.environ.get('DEFAULT_WAREHOUSE_ID', '1'))
+
+# Реестр горячих запросов: имя -> SQL с параметрами $n, готовится один раз на соединение
+QUERIES: Dict[str, str] = {
+    'movements_recent': '''
+        SELECT m.id, m.movement_type, m.quantity, m.user_name,
+               m.reason, m.supplier, m.notes, m.created_at,
+               m.warehouse_id, w.name as warehouse_name, m.transfer_id,
+               p.name as product_name, p.inventory_number
+        FROM movements m
+        JOIN products p ON m.product_id = p.id
+        JOIN warehouses w ON w.id = m.warehouse_id
+        ORDER BY m.created_at DESC
+        LIMIT 50
+    ''',
+    'movements_recent_warehouse': '''
+        SELECT m.id, m.movement_type, m.quantity, m.user_name,
+               m.reason, m.supplier, m.notes, m.created_at,
+               m.warehouse_id, w.name as warehouse_name, m.transfer_id,
+               p.name as product_name, p.inventory_number
+        FROM movements m
+        JOIN products p ON m.product_id = p.id
+        JOIN warehouses w ON w.id = m.warehouse_id
+        WHERE m.warehouse_id = $1
+        ORDER BY m.created_at DESC
+        LIMIT 50
+    ''',
+    'movement_insert': '''
+        INSERT INTO movements (product_id, movement_type, quantity, user_name, reason, supplier, notes, unit_cost, batch, warehouse_id)
+        VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10)
+        RETURNING id, movement_type, quantity, user_name, created_at, warehouse_id
+    ''',
+    # Перемещение - две строки одним оператором с общим transfer_id: расход с $2 и приход на $3
+    'transfer_insert': '''
+        INSERT INTO movements (product_id, movement_type, quantity, user_name, reason, notes, warehouse_id, transfer_id)
+        SELECT $1, leg.movement_type, $4, $5, $6, $7, leg.warehouse_id, t.transfer_id
+        FROM (SELECT nextval('movement_transfer_seq') AS transfer_id) t
+        CROSS JOIN (VALUES ('Перемещение', $2::INTEGER), ('Перемещение (приём)', $3::INTEGER)) AS leg(movement_type, warehouse_id)
+        RETURNING id, movement_type, quantity, user_name, created_at, warehouse_id, transfer_id
+    ''',
+    'movement_lot_cost': '''
+        SELECT COALESCE(SUM(quantity), 0) AS allocated,
+               COALESCE(SUM(quantity * unit_cost), 0) AS cost
+        FROM lot_consumptions
+        WHERE movement_id = $1
+    ''',
+    # Итог по компании в products.quantity догоняет триггер rollup_stock_balances
+    'balance_add': '''
+        INSERT INTO stock_balances (warehouse_id, product_id, quantity) VALUES ($1, $2, $3)
+        ON CONFLICT (warehouse_id, product_id) DO UPDATE
+        SET quantity = stock_balances.quantity + EXCLUDED.quantity
+    ''',
+    # Обе стороны перемещения одним оператором: итог товара не меняется и строка товара не блокируется.
+    # Строки остатков блокируются по возрастанию warehouse_id, иначе встречные перемещения A->B и B->A
+    # берут блокировки в разном порядке и взаимно блокируются
+    'transfer_balance_add': '''
+        INSERT INTO stock_balances (warehouse_id, product_id, quantity)
+        SELECT leg.warehouse_id, $1, leg.quantity
+        FROM (VALUES ($2::INTEGER, -$4::NUMERIC), ($3::INTEGER, $4::NUMERIC)) AS leg(warehouse_id, quantity)
+        ORDER BY leg.warehouse_id
+        ON CONFLICT (warehouse_id, product_id) DO UPDATE
+        SET quantity = stock_balances.quantity + EXCLUDED.quantity
+    ''',
+    'quantity_delta_insert': '''
+        INSERT INTO quantity_deltas (product_id, warehouse_id, delta) VALUES ($1, $2, $3)
+        RETURNING id
+    ''',
+    'transfer_delta_insert': '''
+        INSERT INTO quantity_deltas (product_id, warehouse_id, delta)
+        VALUES ($1, $2, -$4::NUMERIC), ($1, $3, $4::NUMERIC)
+        RETURNING id
+    '''
+}
+
+execute_prepared = prepared_executor(QUERIES)
+
+IDEMPOTENCY_SCOPE = 'movements'
+
+
+def compact_deltas(conn) -> None:
+    '''Переносит накопившиеся дельты в остатки. Запись уже закоммичена, поэтому сбой компакции её не отменяет.'''
+    import psycopg2
+
+    try:
+        with conn.cursor() as cur:
+            cur.execute('SELECT compact_quantity_deltas()')
+        conn.commit()
+    except psycopg2.Error:
+        conn.rollback()
+
+
+def parse_warehouse_id(raw: Any) -> Optional[int]:
+    '''Номер склада в пределах INTEGER; None для нецелого или нулевого значения.'''
+    value = str(raw).strip()
+    if not (value.isascii() and value.isdigit()) or not 0 < int(value) <= 2147483647:
+        return None
+    return int(value)
+
+
+def parse_quantity(raw: Any) -> Optional[float]:
+    '''Количество движения в пределах NUMERIC(10,3); None для нечисла, нуля, отрицательного или слишком большого.'''
+    if isinstance(raw, bool) or not isinstance(raw, (int, float, str)):
+        return None
+    try:
+        value = float(raw)
+    except ValueError:
+        return None
+    if not 0 < value < 10000000:
+        return None
+    return value
+
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
-    Business: API для управления операциями поступления и списания товаров
-    Args: event - dict с httpMethod, body
+    Business: API для управления операциями поступления, списания и перемещения товаров между складами
+    Args: event - dict с httpMethod, body (warehouse_id; to_warehouse_id - перемещение), queryStringParameters (warehouse_id)
           context - объект с request_id
     Returns: HTTP response с данными операций
     '''
@@ -19,31 +144,45 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id',
+                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, Idempotency-Key, X-Read-After',
                 'Access-Control-Max-Age': '86400'
             },
             'body': '',
             'isBase64Encoded': False
         }
     
-    db_url = os.environ.get('DATABASE_URL')
-    conn = psycopg2.connect(db_url)
+    import psycopg2
+    from psycopg2.extras import RealDictCursor
+    
+    conn = get_connection()
+    read_conn = conn
+    broken = False
     
     try:
         if method == 'GET':
-            with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute('''
-                    SELECT m.id, m.movement_type, m.quantity, m.user_name, 
-                           m.reason, m.supplier, m.notes, m.created_at,
-                           p.name as product_name, p.inventory_number
-                    FROM movements m
-                    JOIN products p ON m.product_id = p.id
-                    ORDER BY m.created_at DESC
-                    LIMIT 50
-                ''')
+            warehouse_id = (event.get('queryStringParameters') or {}).get('warehouse_id')
+            
+            if warehouse_id and not parse_warehouse_id(warehouse_id):
+                return {
+                    'statusCode': 400,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'body': json.dumps({'error': 'Некорректный склад'}),
+                    'isBase64Encoded': False
+                }
+            
+            read_conn, read_source = get_read_connection(event)
+            with read_conn.cursor(cursor_factory=RealDictCursor) as cur:
+                if warehouse_id:
+                    execute_prepared(cur, 'movements_recent_warehouse', (parse_warehouse_id(warehouse_id),))
+                else:
+                    execute_prepared(cur, 'movements_recent')
                 movements = cur.fetchall()
                 
                 for movement in movements:
+                    movement['quantity'] = float(movement['quantity'])
                     if movement['created_at']:
                         movement['created_at'] = movement['created_at'].isoformat()
                 
@@ -51,7 +190,8 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'statusCode': 200,
                     'headers': {
                         'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*'
+                        'Access-Control-Allow-Origin': '*',
+                        'X-Read-Source': read_source
                     },
                     'body': json.dumps({'movements': movements}),
                     'isBase64Encoded': False
@@ -61,41 +201,131 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             body = json.loads(event.get('body', '{}'))
             product_id = body.get('product_id')
             movement_type = body.get('movement_type')
-            quantity = body.get('quantity')
+            quantity = parse_quantity(body.get('quantity'))
             user_name = body.get('user_name')
             reason = body.get('reason', '')
             supplier = body.get('supplier', '')
             notes = body.get('notes', '')
+            unit_cost = body.get('unit_cost')
+            batch = body.get('batch')
+            warehouse_id = parse_warehouse_id(body.get('warehouse_id') or DEFAULT_WAREHOUSE_ID)
+            to_warehouse_id = body.get('to_warehouse_id')
             
-            with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute('''
-                    INSERT INTO movements (product_id, movement_type, quantity, user_name, reason, supplier, notes)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s)
-                    RETURNING id, movement_type, quantity, user_name, created_at
-                ''', (product_id, movement_type, quantity, user_name, reason, supplier, notes))
-                
-                movement = cur.fetchone()
-                if movement['created_at']:
-                    movement['created_at'] = movement['created_at'].isoformat()
-                
-                quantity_change = quantity if movement_type == 'Поступление' else -quantity
-                cur.execute('''
-                    UPDATE products 
-                    SET quantity = quantity + %s, updated_at = CURRENT_TIMESTAMP
-                    WHERE id = %s
-                ''', (quantity_change, product_id))
-                
-                conn.commit()
-                
+            if not warehouse_id or (to_warehouse_id is not None and not parse_warehouse_id(to_warehouse_id)):
+                return {
+                    'statusCode': 400,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'body': json.dumps({'error': 'Некорректный склад'}),
+                    'isBase64Encoded': False
+                }
+            
+            if quantity is None:
+                return {
+                    'statusCode': 400,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'body': json.dumps({'error': 'Укажите количество больше нуля'}),
+                    'isBase64Encoded': False
+                }
+            
+            if to_warehouse_id is not None and int(to_warehouse_id) == warehouse_id:
                 return {
-                    'statusCode': 201,
+                    'statusCode': 400,
                     'headers': {
                         'Content-Type': 'application/json',
                         'Access-Control-Allow-Origin': '*'
                     },
-                    'body': json.dumps({'movement': movement}),
+                    'body': json.dumps({'error': 'Для перемещения укажите другой склад-получатель'}),
                     'isBase64Encoded': False
                 }
+            
+            idempotency_key, early_response = begin_idempotent_request(conn, IDEMPOTENCY_SCOPE, event)
+            if early_response:
+                return early_response
+            
+            delta_ids = []
+            
+            try:
+                with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                    if to_warehouse_id is not None:
+                        transfer = (product_id, warehouse_id, int(to_warehouse_id), quantity)
+                        execute_prepared(cur, 'transfer_insert', transfer + (user_name, reason, notes))
+                        legs = cur.fetchall()
+                        
+                        for leg in legs:
+                            leg['quantity'] = float(leg['quantity'])
+                            leg['created_at'] = leg['created_at'].isoformat()
+                        
+                        if QUANTITY_LEDGER_MODE == 'append':
+                            execute_prepared(cur, 'transfer_delta_insert', transfer)
+                            delta_ids = [row['id'] for row in cur.fetchall()]
+                        else:
+                            execute_prepared(cur, 'transfer_balance_add', transfer)
+                        
+                        result = {'transfer_id': legs[0]['transfer_id'], 'movements': legs}
+                    else:
+                        execute_prepared(
+                            cur, 'movement_insert',
+                            (product_id, movement_type, quantity, user_name, reason, supplier, notes, unit_cost, batch, warehouse_id)
+                        )
+                        
+                        movement = cur.fetchone()
+                        movement['quantity'] = float(movement['quantity'])
+                        
+                        if movement_type == 'Списание':
+                            execute_prepared(cur, 'movement_lot_cost', (movement['id'],))
+                            consumption = cur.fetchone()
+                            movement['cost'] = float(consumption['cost'])
+                            movement['unallocated'] = float(quantity) - float(consumption['allocated'])
+                        
+                        if movement['created_at']:
+                            movement['created_at'] = movement['created_at'].isoformat()
+                        
+                        quantity_change = quantity if movement_type == 'Поступление' else -quantity
+                        if QUANTITY_LEDGER_MODE == 'append':
+                            execute_prepared(cur, 'quantity_delta_insert', (product_id, warehouse_id, quantity_change))
+                            delta_ids = [cur.fetchone()['id']]
+                        else:
+                            execute_prepared(cur, 'balance_add', (warehouse_id, product_id, quantity_change))
+                        
+                        result = {'movement': movement}
+            except psycopg2.IntegrityError:
+                conn.rollback()
+                return {
+                    'statusCode': 400,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'body': json.dumps({'error': 'Товар или склад не найден'}),
+                    'isBase64Encoded': False
+                }
+            
+            response = {
+                'statusCode': 201,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'body': json.dumps(result),
+                'isBase64Encoded': False
+            }
+            
+            if idempotency_key:
+                store_idempotent_response(conn, IDEMPOTENCY_SCOPE, idempotency_key, response)
+            
+            conn.commit()
+            
+            if any(delta_id % COMPACT_EVERY_DELTAS == 0 for delta_id in delta_ids):
+                compact_deltas(conn)
+            
+            response['headers'].update(read_after_token(conn))
+            return response
         
         return {
             'statusCode': 405,
@@ -104,5 +334,11 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'isBase64Encoded': False
         }
     
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        broken = True
+        raise
+    
     finally:
-        conn.close()
\ No newline at end of file
+        if read_conn is not conn:
+            release_connection(read_conn, broken)
+        release_connection(conn, broken)
\ No newline at end of file
@@ -0,0 +1,341 @@
+"""
+Business: Прогноз спроса и рекомендации min_stock (точка заказа) по истории списаний для всех товаров сразу
+Args: event - dict с httpMethod; GET - список рекомендаций (limit), POST - пересчёт
+      (lead_time_days, service_level, history_days, apply - записать рекомендации в products.min_stock)
+      context - объект с request_id
+Returns: HTTP response с рекомендациями или итогами пересчёта
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import struct
+import time
+from datetime import date, timedelta
+from io import BytesIO
+from statistics import NormalDist
+from typing import TYPE_CHECKING, Dict, Any, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+DEFAULT_LEAD_TIME_DAYS = 7
+DEFAULT_SERVICE_LEVEL = 0.95
+DEFAULT_HISTORY_DAYS = 730
+DEFAULT_LIST_LIMIT = 500
+
+# Верхние границы параметров: больше - это ошибка ввода, а не осмысленный расчёт
+MAX_LIST_LIMIT = 5000
+MAX_LEAD_TIME_DAYS = 365
+MAX_HISTORY_DAYS = 3650
+
+# Бинарный COPY: заголовок PGCOPY (11 байт сигнатуры + флаги + длина расширения) и завершающий -1
+COPY_HEADER = b'PGCOPY\n\377\r\n\0' + struct.pack('>ii', 0, 0)
+COPY_TRAILER = struct.pack('>h', -1)
+
+# Строка истории: (product_id int4, день от начала окна int4, списано за день float8) - фиксированной длины,
+# поэтому весь поток COPY разбирается одним np.frombuffer без цикла по строкам.
+# Описания полей - списки, а не np.dtype: GET и OPTIONS не импортируют numpy
+HISTORY_ROW = [
+    ('fields', '>i2'),
+    ('product_id_len', '>i4'), ('product_id', '>i4'),
+    ('day_len', '>i4'), ('day', '>i4'),
+    ('qty_len', '>i4'), ('qty', '>f8')
+]
+
+PRODUCT_ROW = [
+    ('fields', '>i2'),
+    ('product_id_len', '>i4'), ('product_id', '>i4'),
+    ('day_len', '>i4'), ('day', '>i4')
+]
+
+RECOMMENDATION_ROW = [
+    ('fields', '>i2'),
+    ('product_id_len', '>i4'), ('product_id', '>i4'),
+    ('avg_len', '>i4'), ('avg', '>f8'),
+    ('std_len', '>i4'), ('std', '>f8'),
+    ('safety_len', '>i4'), ('safety', '>f8'),
+    ('rop_len', '>i4'), ('rop', '>f8'),
+    ('days_len', '>i4'), ('days', '>i4')
+]
+
+
+def copy_rows(cursor, query: str, params: tuple, dtype: List[Tuple[str, str]]) -> np.ndarray:
+    import numpy as np
+
+    buffer = BytesIO()
+    cursor.copy_expert(f'COPY ({cursor.mogrify(query, params).decode()}) TO STDOUT WITH (FORMAT binary)', buffer)
+    data = buffer.getbuffer()
+    return np.frombuffer(data[len(COPY_HEADER):len(data) - len(COPY_TRAILER)], dtype=dtype)
+
+
+def load_history(cursor, window_start: date) -> Tuple[np.ndarray, np.ndarray]:
+    '''
+    Один проход по истории: БД сама сворачивает списания до (товар, день), а товары отдаются
+    с днём начала наблюдения - товар, заведённый позже начала окна, не получает лишних нулевых дней.
+    '''
+    history = copy_rows(cursor, '''
+        SELECT product_id, (created_at::DATE - %s::DATE)::INTEGER, SUM(quantity)::FLOAT8
+        FROM movements
+        WHERE movement_type = 'Списание' AND created_at >= %s AND product_id IS NOT NULL
+        GROUP BY product_id, created_at::DATE
+    ''', (window_start, window_start), HISTORY_ROW)
+
+    products = copy_rows(cursor, '''
+        SELECT id, GREATEST(COALESCE(created_at::DATE, %s::DATE) - %s::DATE, 0)::INTEGER
+        FROM products
+    ''', (window_start, window_start), PRODUCT_ROW)
+
+    return history, products
+
+
+def compute_recommendations(product_ids: np.ndarray, first_day: np.ndarray, history_product_ids: np.ndarray,
+                            history_days: np.ndarray, history_qty: np.ndarray, window_days: int,
+                            lead_time_days: int, service_level: float) -> Dict[str, np.ndarray]:
+    '''
+    Среднее и стандартное отклонение дневного спроса через суммы и суммы квадратов по товарам (bincount),
+    дни без списаний входят в выборку нулями. Точка заказа = спрос за срок поставки + страховой запас
+    z * sigma * sqrt(lead_time) для заданного уровня сервиса.
+    '''
+    import numpy as np
+
+    order = np.argsort(product_ids)
+    sorted_ids = product_ids[order]
+    position = np.searchsorted(sorted_ids, history_product_ids)
+    known = position < len(sorted_ids)
+    known[known] = sorted_ids[position[known]] == history_product_ids[known]
+    if not known.all():
+        # Товар удалён между выборками истории и справочника - его строки не участвуют
+        position, history_days, history_qty = position[known], history_days[known], history_qty[known]
+    index = order[position]
+
+    # Списания раньше даты заведения товара сдвигают начало наблюдения назад
+    observed_from = first_day.copy()
+    np.minimum.at(observed_from, index, history_days)
+    observed_days = np.maximum(window_days - observed_from, 1).astype(np.float64)
+
+    total = np.bincount(index, weights=history_qty, minlength=len(product_ids))
+    total_sq = np.bincount(index, weights=history_qty * history_qty, minlength=len(product_ids))
+
+    mean = total / observed_days
+    variance = np.maximum(total_sq / observed_days - mean * mean, 0.0)
+    std = np.sqrt(variance)
+
+    z = NormalDist().inv_cdf(service_level)
+    safety_stock = z * std * np.sqrt(lead_time_days)
+    reorder_point = mean * lead_time_days + safety_stock
+
+    return {
+        'product_id': product_ids,
+        'avg_daily_demand': mean,
+        'demand_std': std,
+        'safety_stock': safety_stock,
+        'reorder_point': reorder_point,
+        'history_days': observed_days.astype(np.int32)
+    }
+
+
+def save_recommendations(cursor, result: Dict[str, np.ndarray], lead_time_days: int, service_level: float) -> None:
+    '''Полная замена рекомендаций: бинарный COPY во временную таблицу и одна вставка с приведением типов.'''
+    import numpy as np
+
+    rows = np.zeros(len(result['product_id']), dtype=RECOMMENDATION_ROW)
+    rows['fields'] = 6
+    for name, size in (('product_id', 4), ('avg', 8), ('std', 8), ('safety', 8), ('rop', 8), ('days', 4)):
+        rows[f'{name}_len'] = size
+    rows['product_id'] = result['product_id']
+    rows['avg'] = result['avg_daily_demand']
+    rows['std'] = result['demand_std']
+    rows['safety'] = result['safety_stock']
+    rows['rop'] = result['reorder_point']
+    rows['days'] = result['history_days']
+
+    cursor.execute('''
+        CREATE TEMP TABLE recommendation_staging (
+            product_id INTEGER, avg_daily_demand FLOAT8, demand_std FLOAT8,
+            safety_stock FLOAT8, reorder_point FLOAT8, history_days INTEGER
+        ) ON COMMIT DROP
+    ''')
+    cursor.copy_expert(
+        'COPY recommendation_staging FROM STDIN WITH (FORMAT binary)',
+        BytesIO(COPY_HEADER + rows.tobytes() + COPY_TRAILER)
+    )
+    cursor.execute('DELETE FROM stock_recommendations')
+    cursor.execute('''
+        INSERT INTO stock_recommendations
+            (product_id, avg_daily_demand, demand_std, safety_stock, reorder_point,
+             lead_time_days, service_level, history_days)
+        SELECT s.product_id, s.avg_daily_demand, s.demand_std, s.safety_stock, s.reorder_point,
+               %s, %s, s.history_days
+        FROM recommendation_staging s
+        JOIN products p ON p.id = s.product_id
+    ''', (lead_time_days, service_level))
+
+
+def parse_positive_int(raw: Any, maximum: int) -> Optional[int]:
+    '''Целое из строки запроса или тела в пределах [1, maximum]; None для нецелого или выходящего за пределы.'''
+    value = str(raw).strip()
+    if not (value.isascii() and value.isdigit()) or not 0 < int(value) <= maximum:
+        return None
+    return int(value)
+
+
+def parse_service_level(raw: Any) -> Optional[float]:
+    '''Уровень сервиса в [0.5, 1); None для нечисла или значения вне диапазона.'''
+    if isinstance(raw, bool) or not isinstance(raw, (int, float, str)):
+        return None
+    try:
+        value = float(raw)
+    except ValueError:
+        return None
+    if not 0.5 <= value < 1:
+        return None
+    return value
+
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    method: str = event.get('httpMethod', 'GET')
+
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id',
+                'Access-Control-Max-Age': '86400'
+            },
+            'body': '',
+            'isBase64Encoded': False
+        }
+
+    import psycopg2
+    from psycopg2.extras import RealDictCursor
+
+    db_url = os.environ.get('DATABASE_URL')
+    conn = psycopg2.connect(db_url)
+
+    try:
+        if method == 'GET':
+            params = event.get('queryStringParameters') or {}
+            limit = parse_positive_int(params.get('limit', DEFAULT_LIST_LIMIT), MAX_LIST_LIMIT)
+
+            if not limit:
+                return {
+                    'statusCode': 400,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'body': json.dumps({'error': f'limit - целое от 1 до {MAX_LIST_LIMIT}'}),
+                    'isBase64Encoded': False
+                }
+
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute('''
+                    SELECT r.product_id, p.name, p.inventory_number, p.unit, p.min_stock,
+                           r.avg_daily_demand, r.demand_std, r.safety_stock, r.reorder_point,
+                           r.lead_time_days, r.service_level, r.history_days, r.computed_at
+                    FROM stock_recommendations r
+                    JOIN products p ON p.id = r.product_id
+                    ORDER BY ABS(r.reorder_point - p.min_stock) DESC, r.product_id
+                    LIMIT %s
+                ''', (limit,))
+                recommendations = cur.fetchall()
+
+            for item in recommendations:
+                for key in ('min_stock', 'avg_daily_demand', 'demand_std', 'safety_stock', 'reorder_point', 'service_level'):
+                    item[key] = float(item[key]) if item[key] is not None else 0
+                item['computed_at'] = item['computed_at'].isoformat()
+
+            return {
+                'statusCode': 200,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'body': json.dumps({'recommendations': recommendations}),
+                'isBase64Encoded': False
+            }
+
+        elif method == 'POST':
+            body = json.loads(event.get('body') or '{}')
+            lead_time_days = parse_positive_int(body.get('lead_time_days', DEFAULT_LEAD_TIME_DAYS), MAX_LEAD_TIME_DAYS)
+            service_level = parse_service_level(body.get('service_level', DEFAULT_SERVICE_LEVEL))
+            history_days = parse_positive_int(body.get('history_days', DEFAULT_HISTORY_DAYS), MAX_HISTORY_DAYS)
+
+            if not lead_time_days or not history_days or service_level is None:
+                return {
+                    'statusCode': 400,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'body': json.dumps({
+                        'error': f'lead_time_days - целое от 1 до {MAX_LEAD_TIME_DAYS}, '
+                                 f'history_days - целое от 1 до {MAX_HISTORY_DAYS}, service_level в [0.5, 1)'
+                    }),
+                    'isBase64Encoded': False
+                }
+
+            import numpy as np
+
+            started = time.perf_counter()
+            window_start = date.today() - timedelta(days=history_days - 1)
+
+            with conn.cursor() as cur:
+                history, products = load_history(cur, window_start)
+                loaded = time.perf_counter()
+
+                result = compute_recommendations(
+                    products['product_id'].astype(np.int64), products['day'].astype(np.int64),
+                    history['product_id'].astype(np.int64), history['day'].astype(np.int64),
+                    history['qty'].astype(np.float64), history_days, lead_time_days, service_level
+                )
+                computed = time.perf_counter()
+
+                save_recommendations(cur, result, lead_time_days, service_level)
+
+                applied = 0
+                if body.get('apply'):
+                    cur.execute('''
+                        UPDATE products p
+                        SET min_stock = ROUND(r.reorder_point, 3), updated_at = CURRENT_TIMESTAMP
+                        FROM stock_recommendations r
+                        WHERE r.product_id = p.id AND p.min_stock IS DISTINCT FROM ROUND(r.reorder_point, 3)
+                    ''')
+                    applied = cur.rowcount
+
+                conn.commit()
+
+            return {
+                'statusCode': 200,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'body': json.dumps({
+                    'success': True,
+                    'products': int(len(products)),
+                    'history_rows': int(len(history)),
+                    'applied': applied,
+                    'timings': {
+                        'load_seconds': round(loaded - started, 3),
+                        'compute_seconds': round(computed - loaded, 3),
+                        'save_seconds': round(time.perf_counter() - computed, 3)
+                    }
+                }),
+                'isBase64Encoded': False
+            }
+
+        return {
+            'statusCode': 405,
+            'headers': {'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Method not allowed'}),
+            'isBase64Encoded': False
+        }
+
+    finally:
+        conn.close()
@@ -0,0 +1,152 @@
+"""
+Business: Соединения с БД, живущие между вызовами тёплого контейнера, подготовленные операторы
+          и выбор реплики для чтения - общий модуль функций stock, movements и writeoff-acts
+          (в папки функций подключается симлинком, копия одна)
+Args: DATABASE_URL, DATABASE_REPLICA_URL, REPLICA_MAX_LAG_SECONDS - переменные окружения функции
+Returns: соединения, исполнитель запросов из реестра QUERIES функции, токен X-Read-After
+"""
+
+import os
+import re
+import time
+from typing import Any, Callable, Dict, Tuple
+
+
+CONNECTION_PING_AFTER_SECONDS = 60
+REPLICA_MAX_LAG_SECONDS = float(os.environ.get('REPLICA_MAX_LAG_SECONDS', '5'))
+# Простаивающий основной сервер шлёт keepalive раз в wal_sender_timeout / 2 (30 с по умолчанию),
+# поэтому молчание дольше этого порога значит, что поток WAL оборвался
+REPLICA_MAX_SILENCE_SECONDS = float(os.environ.get('REPLICA_MAX_SILENCE_SECONDS', '60'))
+REPLICA_CONNECT_TIMEOUT_SECONDS = int(os.environ.get('REPLICA_CONNECT_TIMEOUT_SECONDS', '2'))
+
+# Для реплики: отставание в секундах и догнала ли она LSN из токена X-Read-After (NULL в токене - проверка
+# не нужна). Равенство полученного и применённого LSN значит "свежая", только пока приёмник WAL подключён
+# и слышит основной сервер: после обрыва потока они тоже равны. Отставание NULL - свежесть неизвестна
+# (нет потока, давно нет сообщений или роли не хватает pg_read_all_stats, чтобы видеть pg_stat_wal_receiver)
+REPLICA_HEALTH_SQL = '''
+    SELECT CASE
+               WHEN NOT pg_is_in_recovery() THEN 0
+               WHEN r.status IS DISTINCT FROM 'streaming'
+                    OR r.last_msg_receipt_time IS NULL
+                    OR now() - r.last_msg_receipt_time > make_interval(secs => %s) THEN NULL
+               WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+               ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+           END,
+           %s::pg_lsn IS NULL OR COALESCE(pg_last_wal_replay_lsn(), pg_current_wal_lsn()) >= %s::pg_lsn
+    FROM (SELECT 1) AS one
+    LEFT JOIN pg_stat_wal_receiver r ON TRUE
+'''
+
+LSN_PATTERN = re.compile(r'^[0-9A-Fa-f]{1,8}/[0-9A-Fa-f]{1,8}$')
+
+_connections: Dict[str, Any] = {}
+_connection_used_at: Dict[str, float] = {}
+# id соединения -> {имя подготовленного оператора: его SQL}
+_prepared: Dict[int, Dict[str, str]] = {}
+
+
+def get_connection(env_name: str = 'DATABASE_URL'):
+    '''
+    Соединение переиспользуется между вызовами в тёплом контейнере, чтобы подготовленные
+    операторы жили дольше одного запроса. После простоя соединение проверяется и при обрыве пересоздаётся.
+    '''
+    import psycopg2
+
+    conn = _connections.get(env_name)
+
+    if conn is not None and not conn.closed and time.monotonic() - _connection_used_at[env_name] > CONNECTION_PING_AFTER_SECONDS:
+        try:
+            with conn.cursor() as cur:
+                cur.execute('SELECT 1')
+            conn.rollback()
+        except psycopg2.Error:
+            conn.close()
+
+    if conn is None or conn.closed:
+        if env_name == 'DATABASE_REPLICA_URL':
+            # Недоступная реплика не должна держать запрос дольше таймаута - чтение уйдёт на основную БД
+            conn = psycopg2.connect(os.environ.get(env_name), connect_timeout=REPLICA_CONNECT_TIMEOUT_SECONDS)
+        else:
+            conn = psycopg2.connect(os.environ.get(env_name))
+        _connections[env_name] = conn
+        _prepared[id(conn)] = {}
+
+    _connection_used_at[env_name] = time.monotonic()
+    return conn
+
+
+def get_read_connection(event: Dict[str, Any]) -> Tuple[Any, str]:
+    '''
+    Для чтения выбирает реплику DATABASE_REPLICA_URL, если она настроена, отстаёт не больше
+    REPLICA_MAX_LAG_SECONDS и уже применила запись из токена X-Read-After. Иначе - основная БД.
+    '''
+    if not os.environ.get('DATABASE_REPLICA_URL'):
+        return get_connection(), 'primary'
+
+    import psycopg2
+
+    headers = event.get('headers') or {}
+    read_after = headers.get('X-Read-After') or headers.get('x-read-after') or None
+
+    # Испорченный токен не проверить на реплике - читаем с основной БД, не трогая соединение реплики
+    if read_after is not None and not LSN_PATTERN.match(read_after):
+        return get_connection(), 'primary'
+
+    replica = None
+    try:
+        replica = get_connection('DATABASE_REPLICA_URL')
+        with replica.cursor() as cur:
+            cur.execute(REPLICA_HEALTH_SQL, (REPLICA_MAX_SILENCE_SECONDS, read_after, read_after))
+            lag, caught_up = cur.fetchone()
+        replica.rollback()
+        if caught_up and lag is not None and lag <= REPLICA_MAX_LAG_SECONDS:
+            return replica, 'replica'
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        # Закрывается только оборванное соединение; пересоздаст его следующий get_connection
+        if replica is not None:
+            replica.close()
+    except psycopg2.Error:
+        if replica is not None and not replica.closed:
+            replica.rollback()
+
+    return get_connection(), 'primary'
+
+
+def read_after_token(conn) -> Dict[str, str]:
+    '''Заголовки с LSN основной БД после коммита - клиент передаёт его в X-Read-After, чтобы читать свои записи.'''
+    if not os.environ.get('DATABASE_REPLICA_URL'):
+        return {}
+    with conn.cursor() as cur:
+        cur.execute('SELECT pg_current_wal_lsn()::text')
+        lsn = cur.fetchone()[0]
+    conn.rollback()
+    return {'X-Read-After': lsn, 'Access-Control-Expose-Headers': 'X-Read-After'}
+
+
+def release_connection(conn, broken: bool = False) -> None:
+    if broken:
+        conn.close()
+    elif not conn.closed:
+        conn.rollback()
+
+
+def prepared_executor(queries: Dict[str, str]) -> Callable[..., None]:
+    '''
+    Возвращает execute_prepared(cur, name, params) для реестра запросов функции: запрос готовится
+    через PREPARE один раз на соединение, дальше выполняется EXECUTE - без повторного разбора и планирования.
+    '''
+    def execute_prepared(cur, name: str, params: tuple = ()) -> None:
+        sql = queries[name]
+        prepared = _prepared.setdefault(id(cur.connection), {})
+        # Одноимённый запрос другой функции на том же соединении (общий процесс) готовится заново
+        if prepared.get(name) != sql:
+            if name in prepared:
+                cur.execute(f'DEALLOCATE {name}')
+            cur.execute(f'PREPARE {name} AS {sql}')
+            prepared[name] = sql
+        if params:
+            cur.execute(f'EXECUTE {name} ({", ".join(["%s"] * len(params))})', params)
+        else:
+            cur.execute(f'EXECUTE {name}')
+
+    return execute_prepared
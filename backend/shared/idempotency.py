@@ -0,0 +1,138 @@
+"""
+Business: Идемпотентные POST по заголовку Idempotency-Key - общий модуль функций movements и writeoff-acts
+          (в папки функций подключается симлинком, копия одна)
+Args: conn - соединение с открытой транзакцией записи, scope - имя функции, event - событие запроса
+Returns: сохранённый ответ повторного запроса или ошибку ключа; сохранение ответа вместе с записью
+"""
+
+import hashlib
+import json
+from typing import Dict, Any, Optional, Tuple
+
+
+IDEMPOTENCY_TTL_HOURS = 24
+IDEMPOTENCY_PURGE_BATCH = 100
+# Размер столбца idempotency_keys.idempotency_key
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+
+
+def get_idempotency_key(event: Dict[str, Any]) -> str:
+    headers = event.get('headers') or {}
+    for name, value in headers.items():
+        if name.lower() == 'idempotency-key':
+            return (value or '').strip()
+    return ''
+
+
+def find_idempotent_response(conn, scope: str, key: str, request_hash: str) -> Optional[Dict[str, Any]]:
+    '''Возвращает сохранённый ответ на запрос с этим ключом (один поиск по уникальному индексу).'''
+    with conn.cursor() as cur:
+        cur.execute('''
+            SELECT request_hash, status_code, response_body
+            FROM idempotency_keys
+            WHERE scope = %s AND idempotency_key = %s AND expires_at > NOW() AND status_code IS NOT NULL
+        ''', (scope, key))
+        row = cur.fetchone()
+
+    if not row:
+        return None
+
+    if row[0] != request_hash:
+        return {
+            'statusCode': 422,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': json.dumps({'error': 'Idempotency-Key уже использован с другим телом запроса'}),
+            'isBase64Encoded': False
+        }
+
+    return {
+        'statusCode': row[1],
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*',
+            'Idempotent-Replayed': 'true'
+        },
+        'body': row[2],
+        'isBase64Encoded': False
+    }
+
+
+def claim_idempotency_key(conn, scope: str, key: str, request_hash: str) -> bool:
+    '''
+    Занимает ключ в текущей транзакции. Параллельный запрос с тем же ключом ждёт на уникальном
+    индексе до коммита первого и затем получает False. Просроченный ключ занимается заново.
+    '''
+    with conn.cursor() as cur:
+        cur.execute('''
+            INSERT INTO idempotency_keys (scope, idempotency_key, request_hash, expires_at)
+            VALUES (%s, %s, %s, NOW() + make_interval(hours => %s))
+            ON CONFLICT (scope, idempotency_key) DO UPDATE
+            SET request_hash = EXCLUDED.request_hash, status_code = NULL, response_body = NULL,
+                created_at = NOW(), expires_at = EXCLUDED.expires_at
+            WHERE idempotency_keys.expires_at <= NOW()
+            RETURNING id
+        ''', (scope, key, request_hash, IDEMPOTENCY_TTL_HOURS))
+        return cur.fetchone() is not None
+
+
+def begin_idempotent_request(conn, scope: str, event: Dict[str, Any]) -> Tuple[str, Optional[Dict[str, Any]]]:
+    '''
+    Проверяет и занимает Idempotency-Key запроса. Возвращает (ключ, готовый ответ): ответ не None,
+    если ключ слишком длинный, запрос уже выполнен (повтор сохранённого ответа) или ещё выполняется.
+    Без заголовка - ('', None).
+    '''
+    key = get_idempotency_key(event)
+    if not key:
+        return '', None
+
+    if len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+        return key, {
+            'statusCode': 400,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': json.dumps({'error': f'Idempotency-Key длиннее {IDEMPOTENCY_KEY_MAX_LENGTH} символов'}),
+            'isBase64Encoded': False
+        }
+
+    request_hash = hashlib.sha256((event.get('body') or '').encode('utf-8')).hexdigest()
+
+    replay = find_idempotent_response(conn, scope, key, request_hash)
+    if replay:
+        return key, replay
+
+    if not claim_idempotency_key(conn, scope, key, request_hash):
+        conn.rollback()
+        replay = find_idempotent_response(conn, scope, key, request_hash)
+        if replay:
+            return key, replay
+        return key, {
+            'statusCode': 409,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': json.dumps({'error': 'Запрос с этим Idempotency-Key ещё выполняется'}),
+            'isBase64Encoded': False
+        }
+
+    return key, None
+
+
+def store_idempotent_response(conn, scope: str, key: str, response: Dict[str, Any]) -> None:
+    '''Сохраняет ответ в той же транзакции, что и запись, и удаляет порцию просроченных ключей.'''
+    with conn.cursor() as cur:
+        cur.execute('''
+            UPDATE idempotency_keys SET status_code = %s, response_body = %s
+            WHERE scope = %s AND idempotency_key = %s
+        ''', (response['statusCode'], response['body'], scope, key))
+        cur.execute('''
+            DELETE FROM idempotency_keys
+            WHERE id IN (
+                SELECT id FROM idempotency_keys WHERE expires_at < NOW() LIMIT %s
+            )
+        ''', (IDEMPOTENCY_PURGE_BATCH,))
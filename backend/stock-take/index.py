@@ -0,0 +1,507 @@
+"""
+Business: Инвентаризация склада - сессия пересчёта, загрузка подсчётов сканеров порциями,
+          предпросмотр расхождений и проведение корректировок одной транзакцией
+Args: event - dict с httpMethod, body (action: create | counts | commit | cancel, stock_take_id,
+      warehouse_id, counts - список {inventory_number, counted_qty}, user_name),
+      queryStringParameters (id - предпросмотр расхождений сессии, limit)
+      context - объект с request_id
+Returns: HTTP response со списком сессий, предпросмотром или результатом операции
+"""
+
+import json
+import math
+import os
+from typing import Dict, Any, Optional, Tuple
+
+
+DEFAULT_WAREHOUSE_ID = int(os.environ.get('DEFAULT_WAREHOUSE_ID', '1'))
+PREVIEW_LIMIT = 500
+# Границы столбцов stock_take_counts: counted_qty NUMERIC(10,3), inventory_number VARCHAR(100)
+MAX_COUNTED_QTY = 9999999.999
+MAX_INVENTORY_NUMBER_LENGTH = 100
+MAX_INTEGER = 2147483647
+
+# Подсчёты сессии против текущего остатка склада (с ещё не свёрнутыми дельтами горячих товаров).
+# Подставляется в запросы предпросмотра через psycopg2.sql
+DIFFERENCES_SQL = '''
+    SELECT c.inventory_number, p.id AS product_id, p.name, p.unit,
+           COALESCE(b.quantity, 0) + COALESCE(d.pending, 0) AS system_qty,
+           c.counted_qty
+    FROM stock_take_counts c
+    JOIN products p ON p.inventory_number = c.inventory_number
+    LEFT JOIN stock_balances b ON b.warehouse_id = %(warehouse_id)s AND b.product_id = p.id
+    LEFT JOIN (
+        SELECT product_id, SUM(delta) AS pending
+        FROM quantity_deltas
+        WHERE warehouse_id = %(warehouse_id)s
+        GROUP BY product_id
+    ) d ON d.product_id = p.id
+    WHERE c.stock_take_id = %(stock_take_id)s
+'''
+
+# Один оператор на всю сессию: движения на разницу и новые остатки склада.
+# Вызывается после компакции дельт и блокировки строк остатков, поэтому разница считается по актуальным данным
+APPLY_SQL = '''
+    WITH diff AS (
+        SELECT p.id AS product_id, c.counted_qty, c.counted_qty - COALESCE(b.quantity, 0) AS difference
+        FROM stock_take_counts c
+        JOIN products p ON p.inventory_number = c.inventory_number
+        LEFT JOIN stock_balances b ON b.warehouse_id = %(warehouse_id)s AND b.product_id = p.id
+        WHERE c.stock_take_id = %(stock_take_id)s
+          AND c.counted_qty <> COALESCE(b.quantity, 0)
+    ),
+    balances AS (
+        INSERT INTO stock_balances (warehouse_id, product_id, quantity)
+        SELECT %(warehouse_id)s, product_id, counted_qty FROM diff
+        ON CONFLICT (warehouse_id, product_id) DO UPDATE SET quantity = EXCLUDED.quantity
+        RETURNING product_id
+    ),
+    moved AS (
+        INSERT INTO movements (product_id, movement_type, quantity, user_name, supplier, reason, notes, warehouse_id)
+        SELECT product_id,
+               CASE WHEN difference > 0 THEN 'Поступление' ELSE 'Списание' END,
+               ABS(difference),
+               %(user_name)s,
+               CASE WHEN difference > 0 THEN 'Инвентаризация' END,
+               CASE WHEN difference < 0 THEN 'Недостача по инвентаризации' END,
+               %(notes)s,
+               %(warehouse_id)s
+        FROM diff
+        RETURNING id
+    )
+    SELECT (SELECT COUNT(*) FROM balances) AS adjusted_items,
+           (SELECT COUNT(*) FROM moved) AS movements,
+           COALESCE((SELECT SUM(difference) FROM diff WHERE difference > 0), 0) AS surplus_qty,
+           COALESCE((SELECT -SUM(difference) FROM diff WHERE difference < 0), 0) AS shortage_qty
+'''
+
+
+def parse_positive_int(raw: Any) -> Optional[int]:
+    '''Целое из строки запроса или тела в пределах INTEGER; None для пустого, нецелого или нулевого значения.'''
+    value = str(raw if raw is not None else '').strip()
+    if not (value.isascii() and value.isdigit()) or not 0 < int(value) <= MAX_INTEGER:
+        return None
+    return int(value)
+
+
+def parse_counts(raw: Any) -> Tuple[Dict[str, float], Optional[str]]:
+    '''
+    Проверяет подсчёты из тела запроса. Повтор инвентарного номера в одной порции
+    заменяет предыдущий подсчёт, как и повторная загрузка номера в сессию.
+    '''
+    if not isinstance(raw, list) or not raw:
+        return {}, 'Передайте подсчёты непустым списком counts'
+
+    counts: Dict[str, float] = {}
+    for index, item in enumerate(raw):
+        if not isinstance(item, dict) or not str(item.get('inventory_number') or '').strip():
+            return {}, f'counts[{index}]: укажите инвентарный номер'
+        inventory_number = str(item['inventory_number']).strip()
+        if len(inventory_number) > MAX_INVENTORY_NUMBER_LENGTH:
+            return {}, f'counts[{index}]: инвентарный номер длиннее {MAX_INVENTORY_NUMBER_LENGTH} символов'
+        try:
+            counted_qty = round(float(item.get('counted_qty')), 3)
+        except (TypeError, ValueError):
+            return {}, f'counts[{index}]: количество должно быть числом'
+        if not math.isfinite(counted_qty):
+            return {}, f'counts[{index}]: количество должно быть числом'
+        if counted_qty < 0:
+            return {}, f'counts[{index}]: количество не может быть отрицательным'
+        if counted_qty > MAX_COUNTED_QTY:
+            return {}, f'counts[{index}]: количество не может превышать {MAX_COUNTED_QTY}'
+        counts.pop(inventory_number, None)
+        counts[inventory_number] = counted_qty
+    return counts, None
+
+
+def load_counts(cur, stock_take_id: int, counts: Dict[str, float]) -> None:
+    from psycopg2.extras import execute_values
+
+    execute_values(
+        cur,
+        '''
+        INSERT INTO stock_take_counts (stock_take_id, inventory_number, counted_qty)
+        VALUES %s
+        ON CONFLICT (stock_take_id, inventory_number) DO UPDATE
+        SET counted_qty = EXCLUDED.counted_qty, counted_at = CURRENT_TIMESTAMP
+        ''',
+        [(stock_take_id, inventory_number, qty) for inventory_number, qty in counts.items()],
+        page_size=1000
+    )
+
+
+def preview(cur, stock_take: Dict[str, Any], limit: int) -> Dict[str, Any]:
+    '''Расхождения открытой сессии: итоги по всем подсчётам и первые limit строк по модулю разницы.'''
+    from psycopg2 import sql
+
+    differences = sql.SQL(DIFFERENCES_SQL)
+    params = {'stock_take_id': stock_take['id'], 'warehouse_id': stock_take['warehouse_id']}
+
+    cur.execute('SELECT COUNT(*) AS counted_items FROM stock_take_counts WHERE stock_take_id = %(stock_take_id)s', params)
+    stock_take['counted_items'] = cur.fetchone()['counted_items']
+
+    cur.execute(sql.SQL('''
+        SELECT COUNT(*) FILTER (WHERE counted_qty <> system_qty) AS differences,
+               COALESCE(SUM(counted_qty - system_qty) FILTER (WHERE counted_qty > system_qty), 0) AS surplus_qty,
+               COALESCE(SUM(system_qty - counted_qty) FILTER (WHERE counted_qty < system_qty), 0) AS shortage_qty,
+               COUNT(*) AS matched_items
+        FROM ({differences}) diff
+    ''').format(differences=differences), params)
+    summary = cur.fetchone()
+
+    cur.execute(sql.SQL('''
+        SELECT *, counted_qty - system_qty AS difference
+        FROM ({differences}) diff
+        WHERE counted_qty <> system_qty
+        ORDER BY ABS(counted_qty - system_qty) DESC, inventory_number
+        LIMIT %(limit)s
+    ''').format(differences=differences), {**params, 'limit': limit})
+    rows = cur.fetchall()
+
+    # Номера, которых нет в справочнике товаров: при проведении пропускаются
+    cur.execute('''
+        SELECT c.inventory_number, c.counted_qty
+        FROM stock_take_counts c
+        WHERE c.stock_take_id = %(stock_take_id)s
+          AND NOT EXISTS (SELECT 1 FROM products p WHERE p.inventory_number = c.inventory_number)
+        ORDER BY c.inventory_number
+        LIMIT %(limit)s
+    ''', {**params, 'limit': limit})
+    unknown = cur.fetchall()
+
+    for row in rows:
+        for key in ('system_qty', 'counted_qty', 'difference'):
+            row[key] = float(row[key])
+    for row in unknown:
+        row['counted_qty'] = float(row['counted_qty'])
+
+    return {
+        'differences': rows,
+        'unknown': unknown,
+        'summary': {
+            'counted_items': stock_take['counted_items'],
+            'matched_items': summary['matched_items'],
+            'unknown_items': stock_take['counted_items'] - summary['matched_items'],
+            'differences': summary['differences'],
+            'surplus_qty': float(summary['surplus_qty']),
+            'shortage_qty': float(summary['shortage_qty'])
+        }
+    }
+
+
+def apply_stock_take(cur, stock_take: Dict[str, Any], user_name: str) -> Dict[str, Any]:
+    '''
+    Проводит сессию набором операторов, без цикла по строкам. Транзакцией управляет вызывающий код,
+    строка stock_takes должна быть заблокирована.
+    '''
+    params = {
+        'stock_take_id': stock_take['id'],
+        'warehouse_id': stock_take['warehouse_id'],
+        'user_name': user_name,
+        'notes': f'Инвентаризация №{stock_take["id"]}'
+    }
+
+    cur.execute('SELECT compact_quantity_deltas(TRUE)')
+    # Размер таблицы подсчётов скачет от пустой до десятков тысяч строк за сессию: без свежей статистики
+    # планировщик считает её пустой и соединяет с товарами вложенным циклом
+    cur.execute('ANALYZE stock_take_counts')
+    # Остатки блокируются раньше товаров, как при записи движения; недостающие строки создаются,
+    # чтобы параллельное движение не вставило остаток между чтением разницы и записью
+    cur.execute('''
+        INSERT INTO stock_balances (warehouse_id, product_id, quantity)
+        SELECT %(warehouse_id)s, p.id, 0
+        FROM stock_take_counts c
+        JOIN products p ON p.inventory_number = c.inventory_number
+        WHERE c.stock_take_id = %(stock_take_id)s
+        ON CONFLICT (warehouse_id, product_id) DO NOTHING
+    ''', params)
+    cur.execute('''
+        SELECT COUNT(*) FROM (
+            SELECT 1
+            FROM stock_balances b
+            JOIN products p ON p.id = b.product_id
+            JOIN stock_take_counts c ON c.inventory_number = p.inventory_number AND c.stock_take_id = %(stock_take_id)s
+            WHERE b.warehouse_id = %(warehouse_id)s
+            FOR UPDATE OF b
+        ) locked
+    ''', params)
+
+    cur.execute(APPLY_SQL, params)
+    applied = cur.fetchone()
+
+    cur.execute('''
+        UPDATE stock_takes
+        SET status = 'committed', adjusted_items = %s, committed_at = CURRENT_TIMESTAMP,
+            counted_items = (SELECT COUNT(*) FROM stock_take_counts WHERE stock_take_id = %s)
+        WHERE id = %s
+        RETURNING id, warehouse_id, status, created_by, counted_items, adjusted_items, created_at, committed_at
+    ''', (applied['adjusted_items'], stock_take['id'], stock_take['id']))
+
+    return {
+        'stock_take': cur.fetchone(),
+        'movements': applied['movements'],
+        'surplus_qty': float(applied['surplus_qty']),
+        'shortage_qty': float(applied['shortage_qty'])
+    }
+
+
+def serialize(stock_take: Dict[str, Any]) -> Dict[str, Any]:
+    for key in ('created_at', 'committed_at'):
+        if stock_take.get(key):
+            stock_take[key] = stock_take[key].isoformat()
+    return stock_take
+
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    method: str = event.get('httpMethod', 'GET')
+
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id',
+                'Access-Control-Max-Age': '86400'
+            },
+            'body': '',
+            'isBase64Encoded': False
+        }
+
+    if method not in ('GET', 'POST'):
+        return {
+            'statusCode': 405,
+            'headers': {'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Method not allowed'}),
+            'isBase64Encoded': False
+        }
+
+    import psycopg2
+    from psycopg2.extras import RealDictCursor
+
+    db_url = os.environ.get('DATABASE_URL')
+    conn = psycopg2.connect(db_url)
+
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            if method == 'GET':
+                params = event.get('queryStringParameters') or {}
+                stock_take_id = params.get('id')
+                limit = parse_positive_int(params.get('limit') or PREVIEW_LIMIT)
+
+                if (stock_take_id and not parse_positive_int(stock_take_id)) or not limit:
+                    return {
+                        'statusCode': 400,
+                        'headers': {
+                            'Content-Type': 'application/json',
+                            'Access-Control-Allow-Origin': '*'
+                        },
+                        'body': json.dumps({'error': 'Номер инвентаризации и limit должны быть положительными целыми числами'}),
+                        'isBase64Encoded': False
+                    }
+
+                if not stock_take_id:
+                    # Открытая сессия считает подсчёты на лету: загрузки порций не пишут в строку сессии
+                    cur.execute('''
+                        SELECT t.id, t.warehouse_id, w.name AS warehouse_name, t.status, t.created_by,
+                               CASE WHEN t.status = 'open'
+                                    THEN (SELECT COUNT(*) FROM stock_take_counts c WHERE c.stock_take_id = t.id)::INTEGER
+                                    ELSE t.counted_items END AS counted_items,
+                               t.adjusted_items, t.created_at, t.committed_at
+                        FROM stock_takes t
+                        JOIN warehouses w ON w.id = t.warehouse_id
+                        ORDER BY t.created_at DESC
+                        LIMIT 100
+                    ''')
+                    stock_takes = [serialize(row) for row in cur.fetchall()]
+
+                    return {
+                        'statusCode': 200,
+                        'headers': {
+                            'Content-Type': 'application/json',
+                            'Access-Control-Allow-Origin': '*'
+                        },
+                        'body': json.dumps({'stock_takes': stock_takes}),
+                        'isBase64Encoded': False
+                    }
+
+                cur.execute('''
+                    SELECT id, warehouse_id, status, created_by, counted_items, adjusted_items, created_at, committed_at
+                    FROM stock_takes
+                    WHERE id = %s
+                ''', (parse_positive_int(stock_take_id),))
+                stock_take = cur.fetchone()
+
+                if not stock_take:
+                    return {
+                        'statusCode': 404,
+                        'headers': {
+                            'Content-Type': 'application/json',
+                            'Access-Control-Allow-Origin': '*'
+                        },
+                        'body': json.dumps({'error': 'Инвентаризация не найдена'}),
+                        'isBase64Encoded': False
+                    }
+
+                # Проведённая или отменённая сессия показывается без сравнения с уже изменившимися остатками
+                result = {'stock_take': serialize(stock_take)}
+                if stock_take['status'] == 'open':
+                    result.update(preview(cur, stock_take, limit))
+
+                return {
+                    'statusCode': 200,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'body': json.dumps(result),
+                    'isBase64Encoded': False
+                }
+
+            body = json.loads(event.get('body') or '{}')
+            action = body.get('action', 'create')
+
+            if action == 'create':
+                warehouse_id = parse_positive_int(body.get('warehouse_id') or DEFAULT_WAREHOUSE_ID)
+
+                if not warehouse_id:
+                    return {
+                        'statusCode': 400,
+                        'headers': {
+                            'Content-Type': 'application/json',
+                            'Access-Control-Allow-Origin': '*'
+                        },
+                        'body': json.dumps({'error': 'Некорректный склад'}),
+                        'isBase64Encoded': False
+                    }
+
+                try:
+                    cur.execute('''
+                        INSERT INTO stock_takes (warehouse_id, created_by)
+                        VALUES (%s, %s)
+                        RETURNING id, warehouse_id, status, created_by, counted_items, adjusted_items, created_at, committed_at
+                    ''', (warehouse_id, body.get('user_name') or 'Пользователь'))
+                except psycopg2.IntegrityError:
+                    conn.rollback()
+                    return {
+                        'statusCode': 400,
+                        'headers': {
+                            'Content-Type': 'application/json',
+                            'Access-Control-Allow-Origin': '*'
+                        },
+                        'body': json.dumps({'error': 'Склад не найден'}),
+                        'isBase64Encoded': False
+                    }
+
+                stock_take = serialize(cur.fetchone())
+                conn.commit()
+
+                return {
+                    'statusCode': 201,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'body': json.dumps({'stock_take': stock_take}),
+                    'isBase64Encoded': False
+                }
+
+            if action not in ('counts', 'commit', 'cancel'):
+                return {
+                    'statusCode': 400,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'body': json.dumps({'error': 'Неизвестное действие'}),
+                    'isBase64Encoded': False
+                }
+
+            stock_take_id = parse_positive_int(body.get('stock_take_id'))
+            if not stock_take_id:
+                return {
+                    'statusCode': 400,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'body': json.dumps({'error': 'Укажите номер инвентаризации'}),
+                    'isBase64Encoded': False
+                }
+
+            counts: Dict[str, float] = {}
+            if action == 'counts':
+                counts, error = parse_counts(body.get('counts'))
+                if error:
+                    return {
+                        'statusCode': 400,
+                        'headers': {
+                            'Content-Type': 'application/json',
+                            'Access-Control-Allow-Origin': '*'
+                        },
+                        'body': json.dumps({'error': error}),
+                        'isBase64Encoded': False
+                    }
+
+            # Загрузки порций держат FOR SHARE и идут параллельно; проведение и отмена ждут их завершения
+            if action == 'counts':
+                cur.execute('''
+                    SELECT id, warehouse_id, status
+                    FROM stock_takes
+                    WHERE id = %s
+                    FOR SHARE
+                ''', (stock_take_id,))
+            else:
+                cur.execute('''
+                    SELECT id, warehouse_id, status
+                    FROM stock_takes
+                    WHERE id = %s
+                    FOR UPDATE
+                ''', (stock_take_id,))
+            stock_take = cur.fetchone()
+
+            if not stock_take or stock_take['status'] != 'open':
+                conn.rollback()
+                return {
+                    'statusCode': 404 if not stock_take else 409,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'body': json.dumps({
+                        'error': 'Инвентаризация не найдена' if not stock_take
+                        else f'Инвентаризация уже в статусе {stock_take["status"]}'
+                    }),
+                    'isBase64Encoded': False
+                }
+
+            if action == 'counts':
+                load_counts(cur, stock_take['id'], counts)
+                cur.execute('SELECT COUNT(*) AS counted_items FROM stock_take_counts WHERE stock_take_id = %s', (stock_take['id'],))
+                result = {'received': len(counts), 'counted_items': cur.fetchone()['counted_items']}
+            elif action == 'commit':
+                result = apply_stock_take(cur, stock_take, body.get('user_name') or 'Инвентаризация')
+                result['stock_take'] = serialize(result['stock_take'])
+            else:
+                cur.execute('DELETE FROM stock_take_counts WHERE stock_take_id = %s', (stock_take['id'],))
+                cur.execute('''
+                    UPDATE stock_takes SET status = 'cancelled'
+                    WHERE id = %s
+                    RETURNING id, warehouse_id, status, created_by, counted_items, adjusted_items, created_at, committed_at
+                ''', (stock_take['id'],))
+                result = {'stock_take': serialize(cur.fetchone())}
+
+            conn.commit()
+
+            return {
+                'statusCode': 200,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'body': json.dumps(result),
+                'isBase64Encoded': False
+            }
+
+    finally:
+        conn.close()
@@ -0,0 +1 @@
+../shared/db_pool.py
\ No newline at end of file
@@ -1,13 +1,63 @@
 import json
 import os
-from typing import Dict, Any
-import psycopg2
-from psycopg2.extras import RealDictCursor
+from typing import Dict, Any, Optional
+
+from db_pool import get_connection, get_read_connection, read_after_token, release_connection, prepared_executor
+
+
+# Склад для запросов без warehouse_id (основной склад из миграции V0018)
+DEFAULT_WAREHOUSE_ID = int(os.environ.get('DEFAULT_WAREHOUSE_ID', '1'))
+
+# Реестр горячих запросов: имя -> SQL с параметрами $n, готовится один раз на соединение
+QUERIES: Dict[str, str] = {
+    'stock_list': '''
+        SELECT p.id, p.name, p.inventory_number, p.quantity + COALESCE(d.pending, 0) AS quantity,
+               p.min_stock, p.price, p.batch, p.unit, p.created_at, p.updated_at
+        FROM products p
+        LEFT JOIN (
+            SELECT product_id, SUM(delta) AS pending FROM quantity_deltas GROUP BY product_id
+        ) d ON d.product_id = p.id
+        ORDER BY p.created_at DESC
+    ''',
+    # Остаток одного склада: строки stock_balances и дельты читаются по индексам, начинающимся с warehouse_id
+    'stock_list_warehouse': '''
+        SELECT p.id, p.name, p.inventory_number, COALESCE(b.quantity, 0) + COALESCE(d.pending, 0) AS quantity,
+               p.min_stock, p.price, p.batch, p.unit, p.created_at, p.updated_at
+        FROM products p
+        LEFT JOIN stock_balances b ON b.warehouse_id = $1 AND b.product_id = p.id
+        LEFT JOIN (
+            SELECT product_id, SUM(delta) AS pending FROM quantity_deltas WHERE warehouse_id = $1 GROUP BY product_id
+        ) d ON d.product_id = p.id
+        ORDER BY p.created_at DESC
+    ''',
+    # Остаток нового товара задаётся через stock_balances - итог в products.quantity ведёт триггер
+    'stock_insert': '''
+        INSERT INTO products (name, inventory_number, quantity, min_stock, price, batch, unit)
+        VALUES ($1, $2, 0, $3, $4, $5, $6)
+        RETURNING id, name, inventory_number, quantity, min_stock, price, batch, unit, created_at
+    ''',
+    'balance_set': '''
+        INSERT INTO stock_balances (warehouse_id, product_id, quantity) VALUES ($1, $2, $3)
+        ON CONFLICT (warehouse_id, product_id) DO UPDATE SET quantity = EXCLUDED.quantity
+    '''
+}
+
+execute_prepared = prepared_executor(QUERIES)
+
+
+def parse_warehouse_id(raw: Any) -> Optional[int]:
+    '''Номер склада в пределах INTEGER; None для нецелого или нулевого значения.'''
+    value = str(raw).strip()
+    if not (value.isascii() and value.isdigit()) or not 0 < int(value) <= 2147483647:
+        return None
+    return int(value)
+
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
     Business: API для управления товарами на складе
-    Args: event - dict с httpMethod, body, queryStringParameters
+    Args: event - dict с httpMethod, body, queryStringParameters; warehouse_id - остатки одного склада
+          вместо итога по компании (GET) и склад, к которому относится количество (POST, PUT)
           context - объект с request_id
     Returns: HTTP response с данными товаров
     '''
@@ -19,25 +69,43 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id',
+                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, X-Read-After',
                 'Access-Control-Max-Age': '86400'
             },
             'body': '',
             'isBase64Encoded': False
         }
     
-    db_url = os.environ.get('DATABASE_URL')
-    conn = psycopg2.connect(db_url)
+    import psycopg2
+    from psycopg2.extras import RealDictCursor
+    
+    conn = get_connection()
+    read_conn = conn
+    broken = False
     
     try:
         if method == 'GET':
-            with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute('''
-                    SELECT id, name, inventory_number, quantity, min_stock, price, batch, unit,
-                           created_at, updated_at
-                    FROM products
-                    ORDER BY created_at DESC
-                ''')
+            # Дельты режима append компактирует movements по порогу - чтение остаётся чтением и может идти на реплику
+            warehouse_id = (event.get('queryStringParameters') or {}).get('warehouse_id')
+            
+            if warehouse_id and not parse_warehouse_id(warehouse_id):
+                return {
+                    'statusCode': 400,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'body': json.dumps({'error': 'Некорректный склад'}),
+                    'isBase64Encoded': False
+                }
+            
+            read_conn, read_source = get_read_connection(event)
+            with read_conn.cursor(cursor_factory=RealDictCursor) as cur:
+                # Остаток = компактированное значение + ещё не перенесённые дельты
+                if warehouse_id:
+                    execute_prepared(cur, 'stock_list_warehouse', (parse_warehouse_id(warehouse_id),))
+                else:
+                    execute_prepared(cur, 'stock_list')
                 products = cur.fetchall()
                 
                 for product in products:
@@ -53,7 +121,8 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'statusCode': 200,
                     'headers': {
                         'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*'
+                        'Access-Control-Allow-Origin': '*',
+                        'X-Read-Source': read_source
                     },
                     'body': json.dumps({'products': products}),
                     'isBase64Encoded': False
@@ -68,6 +137,18 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             price = float(body.get('price', 0))
             batch = body.get('batch', '')
             unit = body.get('unit', 'шт')
+            warehouse_id = parse_warehouse_id(body.get('warehouse_id') or DEFAULT_WAREHOUSE_ID)
+            
+            if not warehouse_id:
+                return {
+                    'statusCode': 400,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'body': json.dumps({'error': 'Некорректный склад'}),
+                    'isBase64Encoded': False
+                }
             
             if not name or not inventory_number:
                 return {
@@ -82,20 +163,15 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             
             try:
                 with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                    cur.execute(
-                        "INSERT INTO products (name, inventory_number, quantity, min_stock, price, batch, unit) VALUES ('" + 
-                        str(name).replace("'", "''") + "', '" + 
-                        str(inventory_number).replace("'", "''") + "', " + 
-                        str(quantity) + ", " + 
-                        str(min_stock) + ", " + 
-                        str(price) + ", '" + 
-                        str(batch).replace("'", "''") + "', '" +
-                        str(unit).replace("'", "''") + "') " +
-                        "RETURNING id, name, inventory_number, quantity, min_stock, price, batch, unit, created_at"
+                    execute_prepared(
+                        cur, 'stock_insert',
+                        (name, inventory_number, min_stock, price, batch, unit)
                     )
                     
                     product = cur.fetchone()
-                    product['quantity'] = float(product['quantity']) if product['quantity'] is not None else 0
+                    if quantity:
+                        execute_prepared(cur, 'balance_set', (warehouse_id, product['id'], quantity))
+                    product['quantity'] = float(quantity)
                     product['min_stock'] = float(product['min_stock']) if product['min_stock'] is not None else 0
                     product['price'] = float(product['price']) if product['price'] is not None else 0
                     if product['created_at']:
@@ -107,7 +183,8 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                         'statusCode': 201,
                         'headers': {
                             'Content-Type': 'application/json',
-                            'Access-Control-Allow-Origin': '*'
+                            'Access-Control-Allow-Origin': '*',
+                            **read_after_token(conn)
                         },
                         'body': json.dumps({'product': product}),
                         'isBase64Encoded': False
@@ -117,6 +194,8 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 error_msg = 'Товар с таким инвентарным номером уже существует'
                 if 'unique' in str(e).lower():
                     error_msg = 'Товар с таким инвентарным номером уже существует'
+                elif 'foreign key' in str(e).lower():
+                    error_msg = 'Склад не найден'
                 return {
                     'statusCode': 400,
                     'headers': {
@@ -131,23 +210,47 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             body = json.loads(event.get('body', '{}'))
             product_id = body.get('id')
             quantity = body.get('quantity')
+            warehouse_id = parse_warehouse_id(body.get('warehouse_id') or DEFAULT_WAREHOUSE_ID)
             
-            with conn.cursor() as cur:
-                cur.execute(
-                    f"UPDATE products SET quantity = {int(quantity)}, updated_at = CURRENT_TIMESTAMP WHERE id = {int(product_id)}"
-                )
-                
-                conn.commit()
-                
+            if not warehouse_id:
                 return {
-                    'statusCode': 200,
+                    'statusCode': 400,
                     'headers': {
                         'Content-Type': 'application/json',
                         'Access-Control-Allow-Origin': '*'
                     },
-                    'body': json.dumps({'success': True}),
+                    'body': json.dumps({'error': 'Некорректный склад'}),
                     'isBase64Encoded': False
                 }
+            
+            try:
+                with conn.cursor() as cur:
+                    cur.execute('SELECT compact_quantity_deltas(TRUE)')
+                    execute_prepared(cur, 'balance_set', (warehouse_id, int(product_id), int(quantity)))
+                    
+                    conn.commit()
+            except psycopg2.IntegrityError:
+                conn.rollback()
+                return {
+                    'statusCode': 400,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'body': json.dumps({'error': 'Товар или склад не найден'}),
+                    'isBase64Encoded': False
+                }
+            
+            return {
+                'statusCode': 200,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*',
+                    **read_after_token(conn)
+                },
+                'body': json.dumps({'success': True}),
+                'isBase64Encoded': False
+            }
         
         return {
             'statusCode': 405,
@@ -156,5 +259,11 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'isBase64Encoded': False
         }
     
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        broken = True
+        raise
+    
     finally:
-        conn.close()
\ No newline at end of file
+        if read_conn is not conn:
+            release_connection(read_conn, broken)
+        release_connection(conn, broken)
\ No newline at end of file
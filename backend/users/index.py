@@ -1,15 +1,165 @@
 """
-Business: API для управления пользователями (CRUD операции)
-Args: event - dict с httpMethod, body, pathParams
+Business: API для управления пользователями (CRUD операции), вход и проверка сессии.
+          Управление пользователями доступно только администратору с действующим токеном
+Args: event - dict с httpMethod, body, pathParams / queryStringParameters (id, action=login|session),
+      headers (X-Auth-Token)
       context - объект с request_id
 Returns: HTTP response с данными пользователей
 """
 
+import base64
+import hashlib
+import hmac
 import json
 import os
-from typing import Dict, Any
-import psycopg2
-from psycopg2.extras import RealDictCursor
+import secrets
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+
+
+SCRYPT_N = 2 ** 14
+SCRYPT_R = 8
+SCRYPT_P = 1
+SESSION_TTL_SECONDS = 12 * 3600
+TOKEN_CACHE_SIZE = 1024
+TOKEN_CACHE_TTL_SECONDS = 300
+USER_ROLES = ('admin', 'user')
+
+
+def hash_password(password: str) -> str:
+    salt = secrets.token_bytes(16)
+    digest = hashlib.scrypt(password.encode('utf-8'), salt=salt, n=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P, dklen=32)
+    return 'scrypt${}${}${}${}${}'.format(
+        SCRYPT_N, SCRYPT_R, SCRYPT_P,
+        base64.b64encode(salt).decode('ascii'), base64.b64encode(digest).decode('ascii')
+    )
+
+
+def verify_password(password: str, stored: str) -> bool:
+    try:
+        scheme, n, r, p, salt, digest = stored.split('$')
+    except ValueError:
+        return False
+    if scheme != 'scrypt':
+        return False
+    expected = base64.b64decode(digest)
+    actual = hashlib.scrypt(
+        password.encode('utf-8'), salt=base64.b64decode(salt),
+        n=int(n), r=int(r), p=int(p), dklen=len(expected)
+    )
+    return hmac.compare_digest(actual, expected)
+
+
+# Хэш, проверяемый для несуществующего логина, чтобы время ответа не выдавало наличие пользователя
+_DUMMY_HASH = 'scrypt$16384$8$1$tkrV6zAmRMwgxQSWHTFEDQ==$HH44a9fLJ9LLR4u5/W4CQK3EXE2zPBKWCdGMPJ5CqOM='
+
+
+class TokenCache:
+    '''
+    Ограниченный LRU-кэш проверенных токенов: token -> (user_id, role).
+    Запись живёт не дольше TOKEN_CACHE_TTL_SECONDS и не дольше срока действия токена,
+    поэтому удалённый пользователь или сменённая роль подхватываются не позже чем через TTL.
+    '''
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries: 'OrderedDict[str, Tuple[float, Tuple[int, str]]]' = OrderedDict()
+
+    def get(self, token: str) -> Optional[Tuple[int, str]]:
+        entry = self.entries.get(token)
+        if entry is None:
+            return None
+        if entry[0] <= time.time():
+            del self.entries[token]
+            return None
+        self.entries.move_to_end(token)
+        return entry[1]
+
+    def put(self, token: str, value: Tuple[int, str], token_expires_at: float) -> None:
+        self.entries[token] = (min(time.time() + self.ttl, token_expires_at), value)
+        self.entries.move_to_end(token)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self.entries.clear()
+
+
+_token_cache = TokenCache(TOKEN_CACHE_SIZE, TOKEN_CACHE_TTL_SECONDS)
+
+
+def _b64url(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def _b64url_decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+
+
+def issue_token(secret: bytes, user_id: int, role: str) -> Tuple[str, int]:
+    expires_at = int(time.time()) + SESSION_TTL_SECONDS
+    payload = _b64url(json.dumps([user_id, role, expires_at, secrets.token_hex(8)]).encode('utf-8'))
+    signature = _b64url(hmac.new(secret, payload.encode('ascii'), hashlib.sha256).digest())
+    return f'{payload}.{signature}', expires_at
+
+
+def decode_token(secret: bytes, token: str) -> Optional[Tuple[int, str, int]]:
+    '''Проверяет подпись и срок действия токена без обращения к БД.'''
+    try:
+        payload, signature = token.split('.')
+        expected = _b64url(hmac.new(secret, payload.encode('ascii'), hashlib.sha256).digest())
+        # Подпись сравнивается как байты: compare_digest не принимает str с не-ASCII символами
+        if not hmac.compare_digest(signature.encode('utf-8'), expected.encode('ascii')):
+            return None
+        user_id, role, expires_at, _ = json.loads(_b64url_decode(payload))
+    except (ValueError, UnicodeError):
+        return None
+    if expires_at <= time.time():
+        return None
+    return user_id, role, expires_at
+
+
+def parse_positive_int(raw: Any) -> Optional[int]:
+    '''Целое из строки запроса или пути в пределах INTEGER; None для нецелого или нулевого значения.'''
+    value = str(raw if raw is not None else '').strip()
+    if not (value.isascii() and value.isdigit()) or not 0 < int(value) <= 2147483647:
+        return None
+    return int(value)
+
+
+def get_auth_token(event: Dict[str, Any]) -> str:
+    headers = event.get('headers') or {}
+    return headers.get('X-Auth-Token') or headers.get('x-auth-token') or ''
+
+
+def authenticate(conn, secret: bytes, token: str) -> Optional[Tuple[int, str]]:
+    '''Возвращает (user_id, role) владельца токена: из кэша или по подписи и текущей роли в БД.'''
+    if not token:
+        return None
+
+    cached = _token_cache.get(token)
+    if cached:
+        return cached
+
+    decoded = decode_token(secret, token)
+    if not decoded:
+        return None
+
+    user_id, _, expires_at = decoded
+    with conn.cursor() as cur:
+        cur.execute('''
+            SELECT role FROM t_p72161094_stock_management_exc.users WHERE id = %s
+        ''', (user_id,))
+        row = cur.fetchone()
+
+    if not row:
+        return None
+
+    _token_cache.put(token, (user_id, row[0]), expires_at)
+    return user_id, row[0]
+
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
@@ -27,13 +177,199 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'isBase64Encoded': False
         }
     
+    params = event.get('queryStringParameters') or {}
+    action = params.get('action')
+    
+    session_secret = os.environ.get('SESSION_SECRET')
+    if not session_secret:
+        return {
+            'statusCode': 500,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': json.dumps({'error': 'SESSION_SECRET not configured'}),
+            'isBase64Encoded': False
+        }
+    secret = session_secret.encode('utf-8')
+    
+    # Без токена доступен только сам вход; остальные методы с action=login не обходят проверку
+    is_login = action == 'login' and method == 'POST'
+    if action == 'login' and not is_login:
+        return {
+            'statusCode': 405,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': json.dumps({'error': 'Method not allowed'}),
+            'isBase64Encoded': False
+        }
+    
+    if action == 'session' and method == 'GET':
+        token = get_auth_token(event)
+        cached = _token_cache.get(token) if token else None
+        
+        if cached:
+            return {
+                'statusCode': 200,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'body': json.dumps({'user_id': cached[0], 'role': cached[1]}),
+                'isBase64Encoded': False
+            }
+        
+        decoded = decode_token(secret, token) if token else None
+        if not decoded:
+            return {
+                'statusCode': 401,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'body': json.dumps({'error': 'Invalid or expired token'}),
+                'isBase64Encoded': False
+            }
+    
+    import psycopg2
+    from psycopg2.extras import RealDictCursor
+    
     db_url = os.environ.get('DATABASE_URL')
     conn = psycopg2.connect(db_url)
     
     try:
-        if method == 'GET':
-            user_id = event.get('pathParams', {}).get('id')
+        if action == 'session' and method == 'GET':
+            user_id, _, expires_at = decoded
+            
+            with conn.cursor() as cur:
+                cur.execute('''
+                    SELECT role FROM t_p72161094_stock_management_exc.users WHERE id = %s
+                ''', (user_id,))
+                row = cur.fetchone()
+            
+            if not row:
+                return {
+                    'statusCode': 401,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'body': json.dumps({'error': 'Invalid or expired token'}),
+                    'isBase64Encoded': False
+                }
+            
+            _token_cache.put(token, (user_id, row[0]), expires_at)
+            
+            return {
+                'statusCode': 200,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'body': json.dumps({'user_id': user_id, 'role': row[0]}),
+                'isBase64Encoded': False
+            }
+        
+        if not is_login:
+            current = authenticate(conn, secret, get_auth_token(event))
+            if not current:
+                return {
+                    'statusCode': 401,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'body': json.dumps({'error': 'Invalid or expired token'}),
+                    'isBase64Encoded': False
+                }
+            if current[1] != 'admin':
+                return {
+                    'statusCode': 403,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'body': json.dumps({'error': 'Управление пользователями доступно только администратору'}),
+                    'isBase64Encoded': False
+                }
+        
+        raw_user_id = (event.get('pathParams') or {}).get('id') or params.get('id')
+        user_id = parse_positive_int(raw_user_id)
+        if raw_user_id is not None and not user_id:
+            return {
+                'statusCode': 400,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'body': json.dumps({'error': 'Invalid user ID'}),
+                'isBase64Encoded': False
+            }
+        
+        if is_login:
+            body = json.loads(event.get('body') or '{}')
+            username = body.get('username') or ''
+            password = body.get('password') or ''
             
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute('''
+                    SELECT id, username, name, role, password, password_hash
+                    FROM t_p72161094_stock_management_exc.users
+                    WHERE username = %s
+                ''', (username,))
+                user = cur.fetchone()
+                
+                if user and user['password_hash']:
+                    authenticated = verify_password(password, user['password_hash'])
+                elif user and user['password'] is not None:
+                    authenticated = hmac.compare_digest(user['password'].encode('utf-8'), password.encode('utf-8'))
+                    if authenticated:
+                        cur.execute('''
+                            UPDATE t_p72161094_stock_management_exc.users
+                            SET password_hash = %s, password = NULL
+                            WHERE id = %s
+                        ''', (hash_password(password), user['id']))
+                        conn.commit()
+                else:
+                    verify_password(password, _DUMMY_HASH)
+                    authenticated = False
+            
+            if not authenticated:
+                return {
+                    'statusCode': 401,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'body': json.dumps({'error': 'Неверный логин или пароль'}),
+                    'isBase64Encoded': False
+                }
+            
+            token, expires_at = issue_token(secret, user['id'], user['role'])
+            _token_cache.put(token, (user['id'], user['role']), expires_at)
+            
+            return {
+                'statusCode': 200,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'body': json.dumps({
+                    'token': token,
+                    'expires_at': expires_at,
+                    'user': {
+                        'id': user['id'],
+                        'username': user['username'],
+                        'name': user['name'],
+                        'role': user['role']
+                    }
+                }),
+                'isBase64Encoded': False
+            }
+        
+        elif method == 'GET':
             with conn.cursor(cursor_factory=RealDictCursor) as cur:
                 if user_id:
                     cur.execute('''
@@ -95,7 +431,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             name = body.get('name')
             role = body.get('role', 'user')
             
-            if not username or not password or not name:
+            if not username or not password or not name or role not in USER_ROLES:
                 return {
                     'statusCode': 400,
                     'headers': {
@@ -107,12 +443,24 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 }
             
             with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute('''
-                    INSERT INTO t_p72161094_stock_management_exc.users 
-                    (username, password, name, role)
-                    VALUES (%s, %s, %s, %s)
-                    RETURNING id, username, name, role, created_at
-                ''', (username, password, name, role))
+                try:
+                    cur.execute('''
+                        INSERT INTO t_p72161094_stock_management_exc.users 
+                        (username, password_hash, name, role)
+                        VALUES (%s, %s, %s, %s)
+                        RETURNING id, username, name, role, created_at
+                    ''', (username, hash_password(password), name, role))
+                except psycopg2.IntegrityError:
+                    conn.rollback()
+                    return {
+                        'statusCode': 409,
+                        'headers': {
+                            'Content-Type': 'application/json',
+                            'Access-Control-Allow-Origin': '*'
+                        },
+                        'body': json.dumps({'error': 'Пользователь с таким логином уже существует'}),
+                        'isBase64Encoded': False
+                    }
                 
                 user = cur.fetchone()
                 if user['created_at']:
@@ -131,7 +479,6 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 }
         
         elif method == 'PUT':
-            user_id = event.get('pathParams', {}).get('id')
             if not user_id:
                 return {
                     'statusCode': 400,
@@ -157,12 +504,22 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     update_fields.append('username = %s')
                     params.append(username)
                 if password:
-                    update_fields.append('password = %s')
-                    params.append(password)
+                    update_fields.append('password_hash = %s, password = NULL')
+                    params.append(hash_password(password))
                 if name:
                     update_fields.append('name = %s')
                     params.append(name)
                 if role:
+                    if role not in USER_ROLES:
+                        return {
+                            'statusCode': 400,
+                            'headers': {
+                                'Content-Type': 'application/json',
+                                'Access-Control-Allow-Origin': '*'
+                            },
+                            'body': json.dumps({'error': 'Unknown role'}),
+                            'isBase64Encoded': False
+                        }
                     update_fields.append('role = %s')
                     params.append(role)
                 
@@ -185,7 +542,19 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     RETURNING id, username, name, role, created_at
                 '''
                 
-                cur.execute(query, params)
+                try:
+                    cur.execute(query, params)
+                except psycopg2.IntegrityError:
+                    conn.rollback()
+                    return {
+                        'statusCode': 409,
+                        'headers': {
+                            'Content-Type': 'application/json',
+                            'Access-Control-Allow-Origin': '*'
+                        },
+                        'body': json.dumps({'error': 'Пользователь с таким логином уже существует'}),
+                        'isBase64Encoded': False
+                    }
                 user = cur.fetchone()
                 
                 if not user:
@@ -203,6 +572,8 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     user['created_at'] = user['created_at'].isoformat()
                 
                 conn.commit()
+                # Кэш токенов сбрасывается только после коммита: откат изменения не должен его трогать
+                _token_cache.clear()
                 
                 return {
                     'statusCode': 200,
@@ -215,7 +586,6 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 }
         
         elif method == 'DELETE':
-            user_id = event.get('pathParams', {}).get('id')
             if not user_id:
                 return {
                     'statusCode': 400,
@@ -227,6 +597,18 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'isBase64Encoded': False
                 }
             
+            # Администратор не может удалить сам себя и остаться без доступа к управлению
+            if user_id == current[0]:
+                return {
+                    'statusCode': 400,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'body': json.dumps({'error': 'Нельзя удалить собственную учётную запись'}),
+                    'isBase64Encoded': False
+                }
+            
             with conn.cursor() as cur:
                 cur.execute('''
                     DELETE FROM t_p72161094_stock_management_exc.users
@@ -234,6 +616,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 ''', (user_id,))
                 
                 conn.commit()
+                _token_cache.clear()
                 
                 return {
                     'statusCode': 200,
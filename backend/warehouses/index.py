@@ -0,0 +1,176 @@
+"""
+Business: Справочник складов и остатки товара в разрезе складов
+Args: event - dict с httpMethod, body (code, name для создания склада),
+      queryStringParameters (product_id - остатки товара по складам)
+      context - объект с request_id
+Returns: HTTP response со списком складов, остатками товара или созданным складом
+"""
+
+import json
+import os
+from typing import Dict, Any, Optional
+
+
+def parse_positive_int(raw: Any) -> Optional[int]:
+    '''Целое из строки запроса в пределах INTEGER; None для нецелого или нулевого значения.'''
+    value = str(raw).strip()
+    if not (value.isascii() and value.isdigit()) or not 0 < int(value) <= 2147483647:
+        return None
+    return int(value)
+
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    method: str = event.get('httpMethod', 'GET')
+
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id',
+                'Access-Control-Max-Age': '86400'
+            },
+            'body': '',
+            'isBase64Encoded': False
+        }
+
+    if method not in ('GET', 'POST'):
+        return {
+            'statusCode': 405,
+            'headers': {'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Method not allowed'}),
+            'isBase64Encoded': False
+        }
+
+    import psycopg2
+    from psycopg2.extras import RealDictCursor
+
+    db_url = os.environ.get('DATABASE_URL')
+    conn = psycopg2.connect(db_url)
+
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            if method == 'POST':
+                body = json.loads(event.get('body', '{}'))
+                code = (body.get('code') or '').strip()
+                name = (body.get('name') or '').strip()
+
+                if not code or not name:
+                    return {
+                        'statusCode': 400,
+                        'headers': {
+                            'Content-Type': 'application/json',
+                            'Access-Control-Allow-Origin': '*'
+                        },
+                        'body': json.dumps({'error': 'Укажите код и название склада'}),
+                        'isBase64Encoded': False
+                    }
+
+                try:
+                    cur.execute('''
+                        INSERT INTO warehouses (code, name)
+                        VALUES (%s, %s)
+                        RETURNING id, code, name, created_at
+                    ''', (code, name))
+                except psycopg2.IntegrityError:
+                    conn.rollback()
+                    return {
+                        'statusCode': 409,
+                        'headers': {
+                            'Content-Type': 'application/json',
+                            'Access-Control-Allow-Origin': '*'
+                        },
+                        'body': json.dumps({'error': 'Склад с таким кодом уже существует'}),
+                        'isBase64Encoded': False
+                    }
+
+                warehouse = cur.fetchone()
+                conn.commit()
+                warehouse['created_at'] = warehouse['created_at'].isoformat()
+
+                return {
+                    'statusCode': 201,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'body': json.dumps({'warehouse': warehouse}),
+                    'isBase64Encoded': False
+                }
+
+            params = event.get('queryStringParameters') or {}
+            product_id = params.get('product_id')
+
+            if product_id and not parse_positive_int(product_id):
+                return {
+                    'statusCode': 400,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'body': json.dumps({'error': 'Некорректный товар'}),
+                    'isBase64Encoded': False
+                }
+
+            if product_id:
+                # Остаток склада вместе с ещё не свёрнутыми дельтами горячих товаров
+                cur.execute('''
+                    SELECT w.id AS warehouse_id, w.code, w.name,
+                           COALESCE(b.quantity, 0) + COALESCE(d.pending, 0) AS quantity
+                    FROM warehouses w
+                    LEFT JOIN stock_balances b ON b.warehouse_id = w.id AND b.product_id = %s
+                    LEFT JOIN (
+                        SELECT warehouse_id, SUM(delta) AS pending
+                        FROM quantity_deltas
+                        WHERE product_id = %s
+                        GROUP BY warehouse_id
+                    ) d ON d.warehouse_id = w.id
+                    WHERE b.product_id IS NOT NULL OR d.warehouse_id IS NOT NULL
+                    ORDER BY w.id
+                ''', (parse_positive_int(product_id), parse_positive_int(product_id)))
+                balances = cur.fetchall()
+
+                for balance in balances:
+                    balance['quantity'] = float(balance['quantity'])
+
+                return {
+                    'statusCode': 200,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'body': json.dumps({
+                        'balances': balances,
+                        'total': sum(balance['quantity'] for balance in balances)
+                    }),
+                    'isBase64Encoded': False
+                }
+
+            cur.execute('''
+                SELECT w.id, w.code, w.name, w.created_at,
+                       COUNT(b.product_id) FILTER (WHERE b.quantity <> 0) AS products_count,
+                       COALESCE(SUM(b.quantity), 0) AS total_quantity
+                FROM warehouses w
+                LEFT JOIN stock_balances b ON b.warehouse_id = w.id
+                GROUP BY w.id
+                ORDER BY w.id
+            ''')
+            warehouses = cur.fetchall()
+
+            for warehouse in warehouses:
+                warehouse['total_quantity'] = float(warehouse['total_quantity'])
+                warehouse['created_at'] = warehouse['created_at'].isoformat()
+
+            return {
+                'statusCode': 200,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'body': json.dumps({'warehouses': warehouses}),
+                'isBase64Encoded': False
+            }
+
+    finally:
+        conn.close()
@@ -1,15 +1,37 @@
 """
 Business: API для управления актами списания
-Args: event - dict с httpMethod, body
+Args: event - dict с httpMethod, body (warehouse_id - склад акта), queryStringParameters (warehouse_id - акты одного склада)
       context - объект с request_id
 Returns: HTTP response с данными актов списания
 """
 
 import json
 import os
-from typing import Dict, Any
-import psycopg2
-from psycopg2.extras import RealDictCursor
+from typing import Dict, Any, List, Optional
+
+from db_pool import get_connection, get_read_connection, read_after_token, release_connection
+from idempotency import begin_idempotent_request, store_idempotent_response
+
+
+IDEMPOTENCY_SCOPE = 'writeoff-acts'
+
+DEFAULT_WAREHOUSE_ID = int(os.environ.get('DEFAULT_WAREHOUSE_ID', '1'))
+
+
+def parse_positive_int(raw: Any) -> Optional[int]:
+    '''Номер склада, товара или акта в пределах INTEGER; None для нецелого или нулевого значения.'''
+    value = str(raw).strip()
+    if not (value.isascii() and value.isdigit()) or not 0 < int(value) <= 2147483647:
+        return None
+    return int(value)
+
+
+def notify_writeoff_act(cur, act_id: int, action: str, product_ids: List[int]) -> None:
+    '''Публикует акт в канал stock_changes (подписчики получат его после коммита) и товары из его строк.'''
+    cur.execute("SELECT pg_notify('stock_changes', %s)", (json.dumps({'writeoff_act': act_id, 'action': action}),))
+    if product_ids:
+        cur.execute('SELECT publish_stock_changes(%s)', (product_ids,))
+
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
@@ -20,25 +42,48 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, POST, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id',
+                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, Idempotency-Key, X-Read-After',
                 'Access-Control-Max-Age': '86400'
             },
             'body': '',
             'isBase64Encoded': False
         }
     
-    db_url = os.environ.get('DATABASE_URL')
-    conn = psycopg2.connect(db_url)
+    import psycopg2
+    from psycopg2.extras import RealDictCursor
+    
+    conn = get_connection()
+    read_conn = conn
+    broken = False
     
     try:
         if method == 'GET':
-            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            warehouse_id = (event.get('queryStringParameters') or {}).get('warehouse_id')
+            
+            if warehouse_id and not parse_positive_int(warehouse_id):
+                return {
+                    'statusCode': 400,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'body': json.dumps({'error': 'Некорректный склад'}),
+                    'isBase64Encoded': False
+                }
+            
+            warehouse_id = parse_positive_int(warehouse_id) if warehouse_id else None
+            
+            read_conn, read_source = get_read_connection(event)
+            with read_conn.cursor(cursor_factory=RealDictCursor) as cur:
                 cur.execute('''
-                    SELECT id, act_number, act_date, responsible_person, 
-                           reason, items, created_at, created_by, is_draft
-                    FROM writeoff_acts
-                    ORDER BY act_date DESC, created_at DESC
-                ''')
+                    SELECT a.id, a.act_number, a.act_date, a.responsible_person, 
+                           a.reason, a.items, a.created_at, a.created_by, a.is_draft,
+                           a.warehouse_id, w.name AS warehouse_name
+                    FROM writeoff_acts a
+                    JOIN warehouses w ON w.id = a.warehouse_id
+                    WHERE %s::INTEGER IS NULL OR a.warehouse_id = %s::INTEGER
+                    ORDER BY a.act_date DESC, a.created_at DESC
+                ''', (warehouse_id, warehouse_id))
                 acts = cur.fetchall()
                 
                 for act in acts:
@@ -51,7 +96,8 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'statusCode': 200,
                     'headers': {
                         'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*'
+                        'Access-Control-Allow-Origin': '*',
+                        'X-Read-Source': read_source
                     },
                     'body': json.dumps({'acts': acts}),
                     'isBase64Encoded': False
@@ -66,14 +112,56 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             items = body.get('items', [])
             created_by = body.get('created_by', 'Пользователь')
             is_draft = body.get('is_draft', False)
+            warehouse_id = parse_positive_int(body.get('warehouse_id') or DEFAULT_WAREHOUSE_ID)
+            
+            if not warehouse_id:
+                return {
+                    'statusCode': 400,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'body': json.dumps({'error': 'Некорректный склад'}),
+                    'isBase64Encoded': False
+                }
+            
+            # Строки проверяются до транзакции: номер товара каждой строки уходит в уведомление об остатках
+            if not isinstance(items, list) or not all(
+                isinstance(item, dict) and parse_positive_int(item.get('product_id')) for item in items
+            ):
+                return {
+                    'statusCode': 400,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'body': json.dumps({'error': 'У каждой строки акта должен быть указан товар'}),
+                    'isBase64Encoded': False
+                }
+            
+            idempotency_key, early_response = begin_idempotent_request(conn, IDEMPOTENCY_SCOPE, event)
+            if early_response:
+                return early_response
             
             with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute('''
-                    INSERT INTO writeoff_acts 
-                    (act_number, act_date, responsible_person, reason, items, created_by, is_draft)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s)
-                    RETURNING id, act_number, act_date, created_at
-                ''', (act_number, act_date, responsible_person, reason, json.dumps(items), created_by, is_draft))
+                try:
+                    cur.execute('''
+                        INSERT INTO writeoff_acts 
+                        (act_number, act_date, responsible_person, reason, items, created_by, is_draft, warehouse_id)
+                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                        RETURNING id, act_number, act_date, created_at, warehouse_id
+                    ''', (act_number, act_date, responsible_person, reason, json.dumps(items), created_by, is_draft, warehouse_id))
+                except psycopg2.IntegrityError:
+                    conn.rollback()
+                    return {
+                        'statusCode': 400,
+                        'headers': {
+                            'Content-Type': 'application/json',
+                            'Access-Control-Allow-Origin': '*'
+                        },
+                        'body': json.dumps({'error': 'Склад не найден'}),
+                        'isBase64Encoded': False
+                    }
                 
                 act = cur.fetchone()
                 if act['act_date']:
@@ -81,9 +169,10 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 if act['created_at']:
                     act['created_at'] = act['created_at'].isoformat()
                 
-                conn.commit()
+                product_ids = [] if is_draft else sorted({parse_positive_int(item['product_id']) for item in items})
+                notify_writeoff_act(cur, act['id'], 'created', product_ids)
                 
-                return {
+                response = {
                     'statusCode': 201,
                     'headers': {
                         'Content-Type': 'application/json',
@@ -92,10 +181,18 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'body': json.dumps({'act': act}),
                     'isBase64Encoded': False
                 }
+                
+                if idempotency_key:
+                    store_idempotent_response(conn, IDEMPOTENCY_SCOPE, idempotency_key, response)
+                
+                conn.commit()
+                
+                response['headers'].update(read_after_token(conn))
+                return response
         
         elif method == 'DELETE':
-            params = event.get('queryStringParameters', {})
-            act_id = params.get('id')
+            params = event.get('queryStringParameters') or {}
+            act_id = parse_positive_int(params.get('id'))
             
             if not act_id:
                 return {
@@ -110,13 +207,16 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             
             with conn.cursor() as cur:
                 cur.execute('DELETE FROM writeoff_acts WHERE id = %s', (act_id,))
+                if cur.rowcount:
+                    notify_writeoff_act(cur, act_id, 'deleted', [])
                 conn.commit()
                 
                 return {
                     'statusCode': 200,
                     'headers': {
                         'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*'
+                        'Access-Control-Allow-Origin': '*',
+                        **read_after_token(conn)
                     },
                     'body': json.dumps({'success': True}),
                     'isBase64Encoded': False
@@ -132,5 +232,11 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'isBase64Encoded': False
         }
     
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        broken = True
+        raise
+    
     finally:
-        conn.close()
\ No newline at end of file
+        if read_conn is not conn:
+            release_connection(read_conn, broken)
+        release_connection(conn, broken)
\ No newline at end of file
@@ -0,0 +1,106 @@
+"""
+Business: Бенчмарк конкурентных движений по одному товару - прямое изменение остатка против журнала дельт.
+          Поступления и списания меряются отдельно: списание и в режиме append забирает остаток
+          из лотов по FIFO под FOR UPDATE всех открытых лотов товара, поэтому списания одного товара
+          по-прежнему идут друг за другом - журнал дельт снимает только блокировку строки остатка
+Args: --writers, --seconds; DATABASE_URL - БД с применёнными миграциями (создаётся и удаляется тестовый товар)
+Returns: транзакций в секунду и задержки для режимов direct и append, отдельно для поступлений и списаний
+"""
+
+import argparse
+import os
+import threading
+import time
+
+import psycopg2
+
+
+INSERT_MOVEMENT = '''
+    INSERT INTO movements (product_id, movement_type, quantity, user_name, reason, supplier, notes)
+    VALUES (%s, %s, 1, 'bench', '', '', '')
+'''
+# Остаток склада и, через триггер свёртки, строка товара - как в режиме direct функции movements
+DIRECT_UPDATE = '''
+    INSERT INTO stock_balances (warehouse_id, product_id, quantity) VALUES (1, %s, %s)
+    ON CONFLICT (warehouse_id, product_id) DO UPDATE SET quantity = stock_balances.quantity + EXCLUDED.quantity
+'''
+APPEND_DELTA = '''
+    INSERT INTO quantity_deltas (product_id, delta) VALUES (%s, %s)
+'''
+
+
+def run_mode(db_url: str, product_id: int, writers: int, seconds: float, mode: str, movement_type: str) -> None:
+    delta = 1 if movement_type == 'Поступление' else -1
+    latencies = [[] for _ in range(writers)]
+    stop_at = time.perf_counter() + seconds
+    barrier = threading.Barrier(writers)
+
+    def writer(index: int) -> None:
+        conn = psycopg2.connect(db_url)
+        cur = conn.cursor()
+        barrier.wait()
+        while time.perf_counter() < stop_at:
+            started = time.perf_counter()
+            cur.execute(INSERT_MOVEMENT, (product_id, movement_type))
+            cur.execute(DIRECT_UPDATE if mode == 'direct' else APPEND_DELTA, (product_id, delta))
+            conn.commit()
+            latencies[index].append(time.perf_counter() - started)
+        conn.close()
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    samples = sorted(x for per_writer in latencies for x in per_writer)
+    print(
+        f'{"receipt" if delta > 0 else "writeoff":<8} {mode:<7} writers={writers}  {len(samples) / seconds:8.1f} tx/s  '
+        f'p50={samples[len(samples) // 2] * 1000:6.2f} ms  p99={samples[int(len(samples) * 0.99)] * 1000:7.2f} ms'
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--writers', type=int, default=50)
+    parser.add_argument('--seconds', type=float, default=10)
+    args = parser.parse_args()
+
+    db_url = os.environ['DATABASE_URL']
+    conn = psycopg2.connect(db_url)
+    cur = conn.cursor()
+    cur.execute('''
+        INSERT INTO products (name, inventory_number, quantity, price)
+        VALUES ('bench hot sku', 'BENCH-HOT-SKU', 0, 1) RETURNING id
+    ''')
+    product_id = cur.fetchone()[0]
+    # Несколько открытых лотов, чтобы списаниям было что забирать по FIFO, как у рабочего товара
+    for _ in range(5):
+        cur.execute('''
+            INSERT INTO movements (product_id, movement_type, quantity, user_name, reason, supplier, notes)
+            VALUES (%s, 'Поступление', 1000000, 'bench', '', '', '')
+        ''', (product_id,))
+    conn.commit()
+
+    try:
+        for movement_type in ('Поступление', 'Списание'):
+            for mode in ('direct', 'append'):
+                run_mode(db_url, product_id, args.writers, args.seconds, mode, movement_type)
+
+        started = time.perf_counter()
+        cur.execute('SELECT compact_quantity_deltas(TRUE)')
+        conn.commit()
+        print(f'compaction of pending deltas: {(time.perf_counter() - started) * 1000:.1f} ms')
+    finally:
+        cur.execute('DELETE FROM quantity_deltas WHERE product_id = %s', (product_id,))
+        cur.execute('DELETE FROM stock_balances WHERE product_id = %s', (product_id,))
+        cur.execute('DELETE FROM lot_consumptions WHERE product_id = %s', (product_id,))
+        cur.execute('DELETE FROM lots WHERE product_id = %s', (product_id,))
+        cur.execute('DELETE FROM movements WHERE product_id = %s', (product_id,))
+        cur.execute('DELETE FROM products WHERE id = %s', (product_id,))
+        conn.commit()
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
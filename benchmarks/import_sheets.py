@@ -0,0 +1,62 @@
+"""
+Business: Бенчмарк параллельного разбора многолистовой книги в import-excel
+Args: --sheets, --rows - размер сгенерированной книги; --max-workers - верхняя граница числа процессов
+Returns: время разбора для 1..N процессов и ускорение относительно одного процесса
+"""
+
+import argparse
+import importlib.util
+import os
+import sys
+import time
+from io import BytesIO
+from pathlib import Path
+
+from openpyxl import Workbook
+
+
+def load_handler_module():
+    path = Path(__file__).resolve().parent.parent / 'backend' / 'import-excel' / 'index.py'
+    spec = importlib.util.spec_from_file_location('import_excel', path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules['import_excel'] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def build_workbook(sheets: int, rows: int) -> bytes:
+    wb = Workbook(write_only=True)
+    for s in range(sheets):
+        ws = wb.create_sheet(f'Категория {s + 1}')
+        ws.append(['Название', 'Инвентарный номер', 'Количество', 'Ед.', 'Мин. остаток', 'Цена', 'Партия'])
+        for r in range(rows):
+            ws.append([f'Товар {s}-{r}', f'INV-{s:02d}-{r:06d}', r % 100, 'шт', 5, 1000 + r, f'B{s}'])
+    buf = BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sheets', type=int, default=10)
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    module = load_handler_module()
+    file_bytes = build_workbook(args.sheets, args.rows)
+    sheet_names = [f'Категория {s + 1}' for s in range(args.sheets)]
+    print(f'workbook: {args.sheets} sheets x {args.rows} rows, {len(file_bytes) / 1e6:.1f} MB, cpu_count={os.cpu_count()}')
+
+    baseline = None
+    for workers in range(1, args.max_workers + 1):
+        started = time.perf_counter()
+        parsed = module.parse_sheets(file_bytes, sheet_names, max_workers=workers)
+        merged = module.merge_sheets(parsed)
+        elapsed = time.perf_counter() - started
+        baseline = baseline or elapsed
+        print(f'workers={workers:2d}  {elapsed:7.2f}s  rows={len(merged)}  speedup={baseline / elapsed:4.2f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""
+Business: Бенчмарк книги закрытия периода - память и время выгрузки месяца с большим числом движений
+Args: --movements, --products, --naive; DATABASE_URL - БД с применёнными миграциями
+      (тестовые товары и движения в январе 2001 создаются и удаляются)
+Returns: время выгрузки, размер файла и пик памяти процесса для потоковой книги (и для обычной при --naive)
+"""
+
+import argparse
+import importlib.util
+import os
+import resource
+import sys
+import time
+from datetime import date
+from io import BytesIO
+from pathlib import Path
+
+import psycopg2
+from openpyxl import Workbook
+
+
+ROOT = Path(__file__).resolve().parent.parent
+PERIOD_FROM = date(2001, 1, 1)
+PERIOD_TO = date(2001, 1, 31)
+
+
+def load_export_module():
+    spec = importlib.util.spec_from_file_location('export_excel', ROOT / 'backend' / 'export-excel' / 'index.py')
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def naive_ledger(module, db_url: str) -> bytes:
+    '''Для сравнения: обычная книга и fetchall - вся выгрузка целиком в памяти.'''
+    conn = psycopg2.connect(db_url)
+    wb = Workbook()
+    ws = wb.active
+    with conn.cursor() as cur:
+        cur.execute(module.MOVEMENTS_LEDGER_SQL, (PERIOD_FROM, date(2001, 2, 1)))
+        for row in cur.fetchall():
+            ws.append([module.excel_value('', value) for value in row])
+    conn.close()
+    out = BytesIO()
+    wb.save(out)
+    return out.getvalue()
+
+
+def measure(label: str, fn) -> None:
+    # maxrss процесса только растёт - потоковый вариант нужно запускать первым
+    started = time.perf_counter()
+    data = fn()
+    elapsed = time.perf_counter() - started
+    print(
+        f'{label:<9} {elapsed:7.1f} s  file={len(data) / 1e6:6.1f} MB  '
+        f'maxrss={resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3:7.1f} MB'
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--movements', type=int, default=1_000_000)
+    parser.add_argument('--products', type=int, default=1000)
+    parser.add_argument('--naive', action='store_true', help='also run the in-memory workbook for comparison')
+    args = parser.parse_args()
+
+    db_url = os.environ['DATABASE_URL']
+    conn = psycopg2.connect(db_url)
+    cur = conn.cursor()
+    cur.execute('''
+        INSERT INTO products (name, inventory_number, quantity, price)
+        SELECT 'bench ledger ' || g, 'BENCH-LEDGER-' || g, 0, 1 FROM generate_series(1, %s) g
+        RETURNING id
+    ''', (args.products,))
+    product_ids = [row[0] for row in cur.fetchall()]
+    # 'Перемещение' не трогает партии - триггер лотов для этих строк ничего не делает
+    cur.execute('''
+        INSERT INTO movements (product_id, movement_type, quantity, user_name, reason, supplier, notes, created_at)
+        SELECT (%s::INTEGER[])[1 + g %% %s], 'Перемещение', 1 + g %% 7, 'bench', 'month-end close', '', '',
+               TIMESTAMP '2001-01-01' + (g %% (30 * 86400)) * INTERVAL '1 second'
+        FROM generate_series(1, %s) g
+    ''', (product_ids, len(product_ids), args.movements))
+    conn.commit()
+    print(f'{args.movements} movements in {PERIOD_FROM:%Y-%m}')
+
+    module = load_export_module()
+    try:
+        measure('streaming', lambda: module.export_ledger(db_url, PERIOD_FROM, PERIOD_TO))
+        if args.naive:
+            measure('naive', lambda: naive_ledger(module, db_url))
+    finally:
+        cur.execute('DELETE FROM movements WHERE created_at >= %s AND created_at < %s', (PERIOD_FROM, date(2001, 2, 1)))
+        cur.execute('DELETE FROM products WHERE id = ANY(%s)', (product_ids,))
+        conn.commit()
+        conn.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,81 @@
+"""
+Business: Бенчмарк партионного учёта - FIFO-списание и оценка остатков на 1M лотов
+Args: --lots, --products, --consumptions; DATABASE_URL - БД с применёнными миграциями
+Returns: время генерации, оценки склада и FIFO-списаний; все изменения откатываются
+"""
+
+import argparse
+import os
+import random
+import time
+
+import psycopg2
+
+
+def timed(cur, sql, params=None):
+    started = time.perf_counter()
+    cur.execute(sql, params)
+    rows = cur.fetchall() if cur.description else None
+    return time.perf_counter() - started, rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--lots', type=int, default=1_000_000)
+    parser.add_argument('--products', type=int, default=10_000)
+    parser.add_argument('--consumptions', type=int, default=1_000)
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    cur = conn.cursor()
+
+    try:
+        elapsed, rows = timed(cur, '''
+            INSERT INTO products (name, inventory_number, quantity, price)
+            SELECT 'bench ' || g, 'BENCH-LOT-' || g, 0, 100
+            FROM generate_series(1, %s) g
+            RETURNING id
+        ''', (args.products,))
+        product_ids = [r[0] for r in rows]
+
+        elapsed, _ = timed(cur, '''
+            INSERT INTO lots (product_id, batch, received_qty, remaining_qty, unit_cost, received_at)
+            SELECT ids[1 + (g %% array_length(ids, 1))], 'B' || (g %% 97), 10, 10,
+                   50 + (g %% 200), TIMESTAMP '2024-01-01' + (g || ' seconds')::INTERVAL
+            FROM generate_series(1, %s) g, (SELECT %s::INTEGER[] AS ids) p
+        ''', (args.lots, product_ids))
+        print(f'generate {args.lots} lots over {args.products} products: {elapsed:.2f}s')
+        cur.execute('ANALYZE lots')
+
+        elapsed, rows = timed(cur, '''
+            SELECT SUM(remaining_value) FROM lots WHERE remaining_qty > 0
+        ''')
+        print(f'total valuation (index-only over open lots): {elapsed * 1000:.1f} ms, value={rows[0][0]}')
+
+        elapsed, rows = timed(cur, '''
+            SELECT product_id, SUM(remaining_qty), SUM(remaining_value)
+            FROM lots WHERE remaining_qty > 0 GROUP BY product_id
+        ''')
+        print(f'per-product valuation: {elapsed * 1000:.1f} ms, {len(rows)} products')
+
+        lots_per_product = args.lots // args.products
+        random.seed(42)
+        durations = []
+        for _ in range(args.consumptions):
+            qty = random.randint(5, 10 * min(lots_per_product, 30))
+            elapsed, _ = timed(cur, 'SELECT consume_lots_fifo(%s, %s)', (random.choice(product_ids), qty))
+            durations.append(elapsed)
+        durations.sort()
+        print(
+            f'FIFO consume x{args.consumptions} (~{lots_per_product} lots/product): '
+            f'p50={durations[len(durations) // 2] * 1000:.2f} ms '
+            f'p99={durations[int(len(durations) * 0.99)] * 1000:.2f} ms '
+            f'total={sum(durations):.2f}s'
+        )
+    finally:
+        conn.rollback()
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+"""
+Business: Бенчмарк подготовленных операторов для горячих запросов stock и movements
+Args: --iterations; DATABASE_URL - БД с применёнными миграциями (все изменения откатываются)
+Returns: время на запрос без подготовки и с PREPARE/EXECUTE и таблицу до/после из pg_stat_statements
+         (pg_stat_statements.track_planning = on): число планирований, время плана и выполнения на вызов
+         по каждому запросу; без расширения - код выхода 1
+"""
+
+import argparse
+import importlib.util
+import os
+import re
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Tuple
+
+import psycopg2
+
+
+def load_queries(function_name: str):
+    path = Path(__file__).resolve().parent.parent / 'backend' / function_name / 'index.py'
+    # Общие модули (idempotency.py и др.) лежат рядом с index.py, как при развёртывании функции
+    sys.path.insert(0, str(path.parent))
+    spec = importlib.util.spec_from_file_location(function_name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.QUERIES
+
+
+def to_psycopg(sql: str) -> str:
+    return re.sub(r'\$\d+', '%s', sql)
+
+
+def stat_statements_available(cur) -> bool:
+    cur.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_stat_statements'")
+    if cur.fetchone() is None:
+        return False
+    cur.execute("SELECT current_setting('pg_stat_statements.track_planning', true)")
+    if cur.fetchone()[0] != 'on':
+        print('pg_stat_statements.track_planning is off: plans and plan time will read as zero')
+    return True
+
+
+def tagged(name: str, sql: str) -> str:
+    # Комментарий сохраняется в тексте pg_stat_statements и связывает строку статистики с запросом реестра
+    return f'/* bench:{name} */ {sql}'
+
+
+def collect_stats(cur) -> Dict[str, Tuple[int, int, float, float]]:
+    '''Имя запроса -> (calls, plans, total_plan_time мс, total_exec_time мс) по данным сервера.'''
+    cur.execute(r'''
+        SELECT substring(query FROM '/\* bench:(\w+) \*/') AS name,
+               SUM(calls), SUM(plans), SUM(total_plan_time), SUM(total_exec_time)
+        FROM pg_stat_statements
+        WHERE dbid = (SELECT oid FROM pg_database WHERE datname = current_database())
+          AND query LIKE '%/* bench:%'
+        GROUP BY 1
+    ''')
+    return {row[0]: (int(row[1]), int(row[2]), float(row[3]), float(row[4])) for row in cur.fetchall()}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--iterations', type=int, default=2000)
+    args = parser.parse_args()
+
+    queries = {**load_queries('stock'), **load_queries('movements')}
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    cur = conn.cursor()
+    with_stats = stat_statements_available(cur)
+
+    cur.execute('''
+        INSERT INTO products (name, inventory_number, quantity, price)
+        VALUES ('bench prepared', 'BENCH-PREPARED', 0, 1) RETURNING id
+    ''')
+    product_id = cur.fetchone()[0]
+
+    workload = [
+        ('movement_insert', (product_id, 'Поступление', 1, 'bench', '', '', '', None, None, 1)),
+        ('balance_add', (1, product_id, 1)),
+        ('movement_lot_cost', (1,)),
+        ('balance_set', (1, product_id, 5)),
+    ]
+    stats = {}
+
+    try:
+        for mode in ('plain', 'prepared'):
+            if with_stats:
+                cur.execute('SELECT pg_stat_statements_reset()')
+            for name, _ in workload:
+                if mode == 'prepared':
+                    cur.execute(f'PREPARE {name} AS {tagged(name, queries[name])}')
+
+            started = time.perf_counter()
+            for _ in range(args.iterations):
+                for name, params in workload:
+                    if mode == 'plain':
+                        cur.execute(tagged(name, to_psycopg(queries[name])), params)
+                    else:
+                        cur.execute(f'EXECUTE {name} ({", ".join(["%s"] * len(params))})', params)
+            elapsed = time.perf_counter() - started
+            statements = args.iterations * len(workload)
+            print(f'{mode:<9} {statements} statements  {elapsed / statements * 1e6:7.1f} us/statement (client wall clock)')
+
+            if with_stats:
+                stats[mode] = collect_stats(cur)
+
+            if mode == 'prepared':
+                cur.execute('DEALLOCATE ALL')
+    finally:
+        conn.rollback()
+        conn.close()
+
+    if not with_stats:
+        print('pg_stat_statements is not installed in this database; only client-side timings are shown.')
+        print('Enable it with shared_preload_libraries = pg_stat_statements, pg_stat_statements.track_planning = on')
+        print('and CREATE EXTENSION pg_stat_statements to get the before/after server numbers.')
+        return 1
+
+    # До (plain) и после (prepared) по каждому запросу: число планирований и время плана/выполнения на вызов
+    print()
+    print(f'{"statement":<20} {"mode":<9} {"calls":>7} {"plans":>7} {"plan ms/call":>13} {"exec ms/call":>13}')
+    for name, _ in workload:
+        for mode in ('plain', 'prepared'):
+            calls, plans, plan_ms, exec_ms = stats[mode].get(name, (0, 0, 0.0, 0.0))
+            per_call = max(calls, 1)
+            print(f'{name:<20} {mode:<9} {calls:>7} {plans:>7} {plan_ms / per_call:>13.4f} {exec_ms / per_call:>13.4f}')
+    for mode in ('plain', 'prepared'):
+        plans = sum(row[1] for row in stats[mode].values())
+        plan_ms = sum(row[2] for row in stats[mode].values())
+        exec_ms = sum(row[3] for row in stats[mode].values())
+        print(f'{"total":<20} {mode:<9} {"":>7} {plans:>7} {"plan " + format(plan_ms, ".1f") + " ms":>13} {"exec " + format(exec_ms, ".1f") + " ms":>13}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
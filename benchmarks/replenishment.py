@@ -0,0 +1,149 @@
+"""
+Business: Бенчмарк расчёта точек заказа - векторный NumPy против цикла Python по товарам
+Args: --skus, --days, --density, --loop-sample; с --db N дополнительно полный прогон функции replenishment
+      на N товарах в DATABASE_URL (тестовые товары и движения создаются и удаляются)
+Returns: время расчёта для синтетической истории и время этапов полного прогона
+"""
+
+import argparse
+import importlib.util
+import json
+import math
+import os
+import sys
+import time
+from pathlib import Path
+from statistics import NormalDist
+
+import numpy as np
+
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def load_module():
+    spec = importlib.util.spec_from_file_location('replenishment', ROOT / 'backend' / 'replenishment' / 'index.py')
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def synthetic_history(skus: int, days: int, density: float, rng: np.random.Generator):
+    '''Строки (товар, день, списано) в том виде, в каком их отдаёт агрегирующий запрос.'''
+    rows = int(skus * days * density)
+    product_ids = rng.integers(1, skus + 1, rows, dtype=np.int64)
+    day = rng.integers(0, days, rows, dtype=np.int64)
+    # Повторы (товар, день) схлопываются, как GROUP BY в БД
+    key = np.unique(product_ids * days + day)
+    return key // days, key % days, rng.gamma(2.0, 3.0, len(key))
+
+
+def loop_recommendations(product_ids, history_product_ids, history_qty, window_days, lead_time_days, service_level):
+    '''Для сравнения: словарь товар -> список дневных списаний и расчёт по одному товару.'''
+    per_product = {}
+    for product_id, qty in zip(history_product_ids.tolist(), history_qty.tolist()):
+        per_product.setdefault(product_id, []).append(qty)
+    z = NormalDist().inv_cdf(service_level)
+    result = {}
+    for product_id in product_ids.tolist():
+        values = per_product.get(product_id, [])
+        mean = sum(values) / window_days
+        variance = max(sum(v * v for v in values) / window_days - mean * mean, 0.0)
+        safety = z * math.sqrt(variance) * math.sqrt(lead_time_days)
+        result[product_id] = mean * lead_time_days + safety
+    return result
+
+
+def run_db(module, skus: int, days: int, density: float) -> None:
+    import psycopg2
+
+    db_url = os.environ['DATABASE_URL']
+    conn = psycopg2.connect(db_url)
+    cur = conn.cursor()
+    cur.execute('''
+        INSERT INTO products (name, inventory_number, quantity, price, created_at)
+        SELECT 'bench demand ' || g, 'BENCH-DEMAND-' || g, 0, 1, NOW() - make_interval(days => %s)
+        FROM generate_series(1, %s) g
+        RETURNING id
+    ''', (days, skus))
+    product_ids = [row[0] for row in cur.fetchall()]
+    started = time.perf_counter()
+    # 'Перемещение' с последующей сменой типа: списания без FIFO-триггера партий
+    cur.execute('''
+        INSERT INTO movements (product_id, movement_type, quantity, user_name, created_at)
+        SELECT (%s::INTEGER[])[1 + (random() * (%s - 1))::INTEGER], 'Перемещение', 1 + (random() * 10)::INTEGER,
+               'bench', NOW() - make_interval(days => (random() * (%s - 1))::INTEGER)
+        FROM generate_series(1, %s)
+    ''', (product_ids, skus, days, int(skus * days * density)))
+    cur.execute("UPDATE movements SET movement_type = 'Списание' WHERE user_name = 'bench' AND movement_type = 'Перемещение'")
+    conn.commit()
+    print(f'seeded {skus} SKUs x {days} days ({int(skus * days * density)} movements) in {time.perf_counter() - started:.1f} s')
+
+    try:
+        started = time.perf_counter()
+        response = module.handler({'httpMethod': 'POST', 'body': json.dumps({'history_days': days})}, None)
+        body = json.loads(response['body'])
+        print(
+            f'replenishment POST: {time.perf_counter() - started:.2f} s total, '
+            f'{body["history_rows"]} history rows, timings {body["timings"]}'
+        )
+    finally:
+        cur.execute('DELETE FROM stock_recommendations WHERE product_id = ANY(%s)', (product_ids,))
+        cur.execute('DELETE FROM movements WHERE product_id = ANY(%s)', (product_ids,))
+        cur.execute('DELETE FROM products WHERE id = ANY(%s)', (product_ids,))
+        conn.commit()
+        conn.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--skus', type=int, default=100_000)
+    parser.add_argument('--days', type=int, default=730)
+    parser.add_argument('--density', type=float, default=0.3, help='share of (SKU, day) cells with consumption')
+    parser.add_argument('--loop-sample', type=int, default=10_000, help='SKUs for the per-SKU Python loop baseline')
+    parser.add_argument('--db', type=int, default=0, help='SKUs for an end-to-end run against DATABASE_URL')
+    args = parser.parse_args()
+
+    module = load_module()
+    rng = np.random.default_rng(42)
+    history_ids, history_days, history_qty = synthetic_history(args.skus, args.days, args.density, rng)
+    product_ids = np.arange(1, args.skus + 1, dtype=np.int64)
+    first_day = np.zeros(args.skus, dtype=np.int64)
+    print(f'{args.skus} SKUs x {args.days} days: {len(history_ids)} (SKU, day) rows')
+
+    # Полный разбор бинарного COPY-потока того же размера
+    rows = np.zeros(len(history_ids), dtype=module.HISTORY_ROW)
+    rows['fields'], rows['product_id_len'], rows['day_len'], rows['qty_len'] = 3, 4, 4, 8
+    rows['product_id'], rows['day'], rows['qty'] = history_ids, history_days, history_qty
+    payload = module.COPY_HEADER + rows.tobytes() + module.COPY_TRAILER
+    started = time.perf_counter()
+    parsed = np.frombuffer(payload[len(module.COPY_HEADER):len(payload) - len(module.COPY_TRAILER)], dtype=module.HISTORY_ROW)
+    parsed_ids, parsed_days, parsed_qty = (
+        parsed['product_id'].astype(np.int64), parsed['day'].astype(np.int64), parsed['qty'].astype(np.float64)
+    )
+    print(f'parse binary COPY ({len(payload) / 1e6:.0f} MB): {(time.perf_counter() - started) * 1000:8.1f} ms')
+    del rows, parsed, payload
+
+    started = time.perf_counter()
+    result = module.compute_recommendations(
+        product_ids, first_day, parsed_ids, parsed_days, parsed_qty, args.days, 7, 0.95
+    )
+    vectorized = time.perf_counter() - started
+    print(f'vectorized compute:         {vectorized * 1000:8.1f} ms')
+
+    sample = product_ids[:args.loop_sample]
+    in_sample = history_ids <= args.loop_sample
+    started = time.perf_counter()
+    loop = loop_recommendations(sample, history_ids[in_sample], history_qty[in_sample], args.days, 7, 0.95)
+    loop_seconds = (time.perf_counter() - started) * args.skus / args.loop_sample
+    print(f'python loop (extrapolated): {loop_seconds * 1000:8.1f} ms  ({loop_seconds / vectorized:.0f}x slower)')
+
+    expected = np.array([loop[p] for p in sample.tolist()])
+    assert np.allclose(result['reorder_point'][:args.loop_sample], expected)
+
+    if args.db:
+        run_db(module, args.db, args.days, args.density)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
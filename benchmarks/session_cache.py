@@ -0,0 +1,70 @@
+"""
+Business: Бенчмарк проверки сессии в users - пропускная способность с тёплым и холодным кэшем токенов
+Args: --requests; DATABASE_URL и SESSION_SECRET, в БД должен быть пользователь admin (миграция V0009)
+Returns: запросов в секунду для входа, холодной и тёплой проверки токена
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import time
+from pathlib import Path
+
+
+def load_handler_module():
+    path = Path(__file__).resolve().parent.parent / 'backend' / 'users' / 'index.py'
+    spec = importlib.util.spec_from_file_location('users', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def rate(label: str, count: int, fn) -> None:
+    started = time.perf_counter()
+    for _ in range(count):
+        fn()
+    elapsed = time.perf_counter() - started
+    print(f'{label:<40} {count / elapsed:10.1f} req/s  ({elapsed / count * 1000:.3f} ms/req)')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--username', default='admin')
+    parser.add_argument('--password', default='admin123')
+    args = parser.parse_args()
+
+    module = load_handler_module()
+    login_event = {
+        'httpMethod': 'POST',
+        'queryStringParameters': {'action': 'login'},
+        'body': json.dumps({'username': args.username, 'password': args.password})
+    }
+    response = module.handler(login_event, None)
+    assert response['statusCode'] == 200, response['body']
+    token = json.loads(response['body'])['token']
+    session_event = {
+        'httpMethod': 'GET',
+        'queryStringParameters': {'action': 'session'},
+        'headers': {'X-Auth-Token': token}
+    }
+
+    def login():
+        assert module.handler(login_event, None)['statusCode'] == 200
+
+    def cold_session():
+        module._token_cache.clear()
+        assert module.handler(session_event, None)['statusCode'] == 200
+
+    def warm_session():
+        assert module.handler(session_event, None)['statusCode'] == 200
+
+    rate('login (scrypt verify)', max(args.requests // 100, 10), login)
+    rate('session, cold cache (HMAC + users lookup)', args.requests, cold_session)
+    module.handler(session_event, None)
+    rate('session, warm cache', args.requests * 10, warm_session)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,193 @@
+"""
+Business: Бенчмарк раздачи изменений остатков через SSE - много подписчиков на одно LISTEN-соединение
+Args: --subscribers, --writes, --rate, --products, --debounce-ms; DATABASE_URL - БД с применёнными миграциями
+      (создаются и удаляются тестовые товары); сервер scripts/stock_events.py запускается отдельным процессом
+Returns: задержка от коммита до доставки каждому подписчику и сравнение с опросом полного списка
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import psycopg2
+
+
+ROOT = Path(__file__).resolve().parent.parent
+# Запись идёт в остаток склада, как у функции movements: products.quantity и событие обновляет триггер свёртки
+BALANCE_ADD = '''
+    INSERT INTO stock_balances (warehouse_id, product_id, quantity) VALUES (1, %s, 1)
+    ON CONFLICT (warehouse_id, product_id) DO UPDATE SET quantity = stock_balances.quantity + EXCLUDED.quantity
+'''
+STOCK_LIST_SQL = '''
+    SELECT p.id, p.name, p.inventory_number, p.quantity + COALESCE(d.pending, 0) AS quantity,
+           p.min_stock, p.price, p.batch, p.unit, p.created_at, p.updated_at
+    FROM products p
+    LEFT JOIN (
+        SELECT product_id, SUM(delta) AS pending FROM quantity_deltas GROUP BY product_id
+    ) d ON d.product_id = p.id
+    ORDER BY p.created_at DESC
+'''
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+async def subscriber(port: int, received: Dict[int, float], ready: asyncio.Event, done: asyncio.Event,
+                     connected: List[int]) -> None:
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(b'GET /events HTTP/1.1\r\nHost: bench\r\nAccept: text/event-stream\r\n\r\n')
+    await reader.readuntil(b'\r\n\r\n')
+    connected[0] += 1
+    if connected[0] == connected[1]:
+        ready.set()
+
+    event = None
+    while not done.is_set():
+        try:
+            line = await asyncio.wait_for(reader.readline(), timeout=0.5)
+        except asyncio.TimeoutError:
+            continue
+        if not line:
+            break
+        if line.startswith(b'event: '):
+            event = line[7:].strip()
+        elif line.startswith(b'data: ') and event == b'stock':
+            now = time.perf_counter()
+            for change in json.loads(line[6:])['changes']:
+                received.setdefault(change['product_id'], now)
+    writer.close()
+
+
+def writer_thread(db_url: str, product_ids: List[int], writes: int, rate: float,
+                  committed: Dict[int, float], started: threading.Event) -> None:
+    conn = psycopg2.connect(db_url)
+    cur = conn.cursor()
+    started.wait()
+    interval = 1 / rate
+    next_at = time.perf_counter()
+    for i in range(writes):
+        product_id = product_ids[i % len(product_ids)]
+        cur.execute(BALANCE_ADD, (product_id,))
+        conn.commit()
+        # Для каждого товара считается задержка первой записи - дальше события схлопываются
+        committed.setdefault(product_id, time.perf_counter())
+        next_at += interval
+        time.sleep(max(0.0, next_at - time.perf_counter()))
+    conn.close()
+
+
+async def run(args, db_url: str, port: int, product_ids: List[int]) -> None:
+    ready, done = asyncio.Event(), asyncio.Event()
+    connected = [0, args.subscribers]
+    received: List[Dict[int, float]] = [{} for _ in range(args.subscribers)]
+
+    connect_started = time.perf_counter()
+    tasks = [
+        asyncio.ensure_future(subscriber(port, received[i], ready, done, connected))
+        for i in range(args.subscribers)
+    ]
+    await asyncio.wait_for(ready.wait(), timeout=60)
+    print(f'{args.subscribers} subscribers connected in {(time.perf_counter() - connect_started) * 1000:.0f} ms')
+
+    committed: Dict[int, float] = {}
+    started = threading.Event()
+    thread = threading.Thread(target=writer_thread, args=(db_url, product_ids, args.writes, args.rate, committed, started))
+    thread.start()
+    write_started = time.perf_counter()
+    started.set()
+    while thread.is_alive():
+        await asyncio.sleep(0.05)
+    write_seconds = time.perf_counter() - write_started
+
+    deadline = time.perf_counter() + 10
+    while time.perf_counter() < deadline and any(len(r) < len(committed) for r in received):
+        await asyncio.sleep(0.05)
+    done.set()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    latencies = sorted(
+        r[product_id] - committed_at
+        for r in received
+        for product_id, committed_at in committed.items()
+        if product_id in r
+    )
+    expected = len(committed) * args.subscribers
+    print(
+        f'{args.writes} writes in {write_seconds:.1f} s ({args.writes / write_seconds:.0f}/s) -> '
+        f'{len(latencies)}/{expected} deliveries'
+    )
+    if latencies:
+        print(
+            f'commit-to-client latency  p50={latencies[len(latencies) // 2] * 1000:6.1f} ms  '
+            f'p99={latencies[int(len(latencies) * 0.99)] * 1000:6.1f} ms  '
+            f'max={latencies[-1] * 1000:6.1f} ms'
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--subscribers', type=int, default=500)
+    parser.add_argument('--writes', type=int, default=500)
+    parser.add_argument('--rate', type=float, default=100, help='writes per second')
+    parser.add_argument('--products', type=int, default=5000)
+    parser.add_argument('--debounce-ms', type=int, default=100)
+    parser.add_argument('--poll-interval', type=float, default=10, help='seconds, for the polling comparison')
+    args = parser.parse_args()
+
+    db_url = os.environ['DATABASE_URL']
+    conn = psycopg2.connect(db_url)
+    cur = conn.cursor()
+    cur.execute('''
+        INSERT INTO products (name, inventory_number, quantity, price)
+        SELECT 'bench sse ' || g, 'BENCH-SSE-' || g, 0, 1 FROM generate_series(1, %s) g
+        RETURNING id
+    ''', (args.products,))
+    product_ids = [row[0] for row in cur.fetchall()]
+    conn.commit()
+
+    # Цена одного опроса полного списка - так сейчас клиент узнаёт об изменениях
+    samples = []
+    for _ in range(5):
+        started = time.perf_counter()
+        cur.execute(STOCK_LIST_SQL)
+        cur.fetchall()
+        samples.append(time.perf_counter() - started)
+    conn.rollback()
+    poll_ms = sorted(samples)[len(samples) // 2] * 1000
+    polls_per_second = args.subscribers / args.poll_interval
+    print(
+        f'polling: {args.subscribers} clients every {args.poll_interval:g} s = {polls_per_second:.0f} full-list queries/s '
+        f'x {poll_ms:.1f} ms = {polls_per_second * poll_ms / 1000:.2f} s of DB time per second'
+    )
+
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, str(ROOT / 'scripts' / 'stock_events.py'), '--host', '127.0.0.1', '--port', str(port),
+         '--debounce-ms', str(args.debounce_ms)],
+        stdout=subprocess.PIPE, env=os.environ
+    )
+    try:
+        server.stdout.readline()
+        asyncio.run(run(args, db_url, port, product_ids[:args.writes]))
+    finally:
+        server.terminate()
+        server.wait()
+        cur.execute('DELETE FROM stock_balances WHERE product_id = ANY(%s)', (product_ids,))
+        cur.execute('DELETE FROM products WHERE id = ANY(%s)', (product_ids,))
+        conn.commit()
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""
+Business: Бенчмарк инвентаризации - проведение сессии одним набором операторов против построчного stock PUT
+Args: --items, --batch, --put-sample; DATABASE_URL - БД с применёнными миграциями
+      (тестовые товары, остатки, движения и сессия создаются и удаляются)
+Returns: время загрузки подсчётов, предпросмотра и проведения, оценку построчного варианта
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+import psycopg2
+
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def load_module(name: str):
+    # Общие модули (db_pool.py и др.) лежат рядом с index.py, как при развёртывании функции
+    sys.path.insert(0, str(ROOT / 'backend' / name))
+    spec = importlib.util.spec_from_file_location(name.replace('-', '_'), ROOT / 'backend' / name / 'index.py')
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def call(module, method: str, body=None, params=None):
+    event = {'httpMethod': method, 'headers': {}, 'queryStringParameters': params}
+    if body is not None:
+        event['body'] = json.dumps(body)
+    response = module.handler(event, None)
+    assert response['statusCode'] in (200, 201), response['body']
+    return json.loads(response['body'])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--items', type=int, default=50_000)
+    parser.add_argument('--batch', type=int, default=10_000, help='counts per upload request')
+    parser.add_argument('--put-sample', type=int, default=500, help='items for the row-by-row stock PUT baseline')
+    args = parser.parse_args()
+
+    stock_take = load_module('stock-take')
+    stock = load_module('stock')
+
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    cur = conn.cursor()
+    cur.execute('''
+        INSERT INTO products (name, inventory_number, quantity, price)
+        SELECT 'bench count ' || g, 'BENCH-COUNT-' || g, 0, 1
+        FROM generate_series(1, %s) g
+        RETURNING id
+    ''', (args.items,))
+    product_ids = [row[0] for row in cur.fetchall()]
+    conn.commit()
+    # Статистика как у рабочего справочника, а не у только что заполненной таблицы:
+    # иначе триггер свёртки остатков соединяет с товарами вложенным циклом
+    cur.execute('ANALYZE products')
+    cur.execute('''
+        INSERT INTO stock_balances (warehouse_id, product_id, quantity)
+        SELECT 1, id, 100 FROM unnest(%s::INTEGER[]) id
+    ''', (product_ids,))
+    # Остаток каждого товара - один открытый лот, как после начальной загрузки лотов в V0012:
+    # недостачи списываются по FIFO
+    cur.execute('''
+        INSERT INTO lots (product_id, received_qty, remaining_qty, unit_cost)
+        SELECT id, 100, 100, 1 FROM unnest(%s::INTEGER[]) id
+    ''', (product_ids,))
+    cur.execute('ANALYZE stock_balances')
+    cur.execute('ANALYZE lots')
+    conn.commit()
+
+    # Примерно треть позиций расходится с учётом в обе стороны
+    rng = random.Random(42)
+    counts = [
+        {'inventory_number': f'BENCH-COUNT-{i}', 'counted_qty': 100 + rng.choice((-3, -1, 0, 0, 0, 0, 2))}
+        for i in range(1, args.items + 1)
+    ]
+    take_id = None
+
+    try:
+        take_id = call(stock_take, 'POST', {'action': 'create', 'user_name': 'bench'})['stock_take']['id']
+
+        started = time.perf_counter()
+        for offset in range(0, len(counts), args.batch):
+            call(stock_take, 'POST', {'action': 'counts', 'stock_take_id': take_id, 'counts': counts[offset:offset + args.batch]})
+        print(f'upload {args.items} counts in batches of {args.batch}: {time.perf_counter() - started:6.2f} s')
+
+        started = time.perf_counter()
+        summary = call(stock_take, 'GET', params={'id': str(take_id), 'limit': '100'})['summary']
+        print(f'preview:                                {time.perf_counter() - started:6.2f} s  {summary}')
+
+        started = time.perf_counter()
+        result = call(stock_take, 'POST', {'action': 'commit', 'stock_take_id': take_id, 'user_name': 'bench'})
+        commit_seconds = time.perf_counter() - started
+        print(f'commit (one transaction):               {commit_seconds:6.2f} s  '
+              f'{result["stock_take"]["adjusted_items"]} adjusted, {result["movements"]} movements')
+
+        sample = product_ids[:args.put_sample]
+        started = time.perf_counter()
+        for product_id in sample:
+            call(stock, 'PUT', {'id': product_id, 'quantity': 100})
+        put_seconds = (time.perf_counter() - started) * args.items / len(sample)
+        print(f'stock PUT per item (extrapolated):      {put_seconds:6.2f} s  '
+              f'({put_seconds / commit_seconds:.0f}x slower, no movements written)')
+    finally:
+        if take_id:
+            cur.execute('DELETE FROM stock_takes WHERE id = %s', (take_id,))
+        cur.execute('DELETE FROM lot_consumptions WHERE product_id = ANY(%s)', (product_ids,))
+        cur.execute('DELETE FROM lots WHERE product_id = ANY(%s)', (product_ids,))
+        cur.execute('DELETE FROM movements WHERE product_id = ANY(%s)', (product_ids,))
+        cur.execute('DELETE FROM stock_balances WHERE product_id = ANY(%s)', (product_ids,))
+        cur.execute('DELETE FROM products WHERE id = ANY(%s)', (product_ids,))
+        conn.commit()
+        conn.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,21 @@
+-- Фоновые задания импорта Excel: файл хранится в БД, обработка идёт порциями
+CREATE TABLE IF NOT EXISTS t_p72161094_stock_management_exc.import_jobs (
+    id SERIAL PRIMARY KEY,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending',
+    file_data BYTEA,
+    chunk_size INTEGER NOT NULL DEFAULT 500,
+    total_rows INTEGER NOT NULL DEFAULT 0,
+    row_offset INTEGER NOT NULL DEFAULT 0,
+    inserted INTEGER NOT NULL DEFAULT 0,
+    updated INTEGER NOT NULL DEFAULT 0,
+    elapsed_seconds NUMERIC(12,3) NOT NULL DEFAULT 0,
+    error TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    finished_at TIMESTAMP
+);
+
+COMMENT ON COLUMN t_p72161094_stock_management_exc.import_jobs.row_offset IS 'Количество строк листа, обработанных в закоммиченных порциях';
+
+CREATE INDEX IF NOT EXISTS idx_import_jobs_status ON t_p72161094_stock_management_exc.import_jobs(status);
@@ -0,0 +1,124 @@
+-- Перевод таблицы movements на помесячное секционирование по created_at.
+-- Архивирование старых месяцев становится DETACH/DROP секции вместо DELETE.
+
+ALTER TABLE t_p72161094_stock_management_exc.movements RENAME TO movements_legacy;
+ALTER TABLE t_p72161094_stock_management_exc.movements_legacy RENAME CONSTRAINT movements_pkey TO movements_legacy_pkey;
+ALTER TABLE t_p72161094_stock_management_exc.movements_legacy RENAME CONSTRAINT movements_product_id_fkey TO movements_legacy_product_id_fkey;
+ALTER INDEX t_p72161094_stock_management_exc.idx_movements_product_id RENAME TO idx_movements_legacy_product_id;
+ALTER INDEX t_p72161094_stock_management_exc.idx_movements_created_at RENAME TO idx_movements_legacy_created_at;
+ALTER SEQUENCE t_p72161094_stock_management_exc.movements_id_seq OWNED BY NONE;
+
+CREATE TABLE t_p72161094_stock_management_exc.movements (
+    id INTEGER NOT NULL DEFAULT nextval('t_p72161094_stock_management_exc.movements_id_seq'),
+    product_id INTEGER REFERENCES t_p72161094_stock_management_exc.products(id),
+    movement_type VARCHAR(50) NOT NULL,
+    quantity INTEGER NOT NULL,
+    user_name VARCHAR(255) NOT NULL,
+    reason VARCHAR(255),
+    supplier VARCHAR(255),
+    notes TEXT,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+ALTER SEQUENCE t_p72161094_stock_management_exc.movements_id_seq OWNED BY t_p72161094_stock_management_exc.movements.id;
+
+CREATE INDEX idx_movements_product_id ON t_p72161094_stock_management_exc.movements(product_id);
+CREATE INDEX idx_movements_created_at ON t_p72161094_stock_management_exc.movements(created_at DESC);
+
+-- Секция по умолчанию принимает строки вне созданных месяцев, чтобы вставка никогда не падала
+CREATE TABLE t_p72161094_stock_management_exc.movements_default
+    PARTITION OF t_p72161094_stock_management_exc.movements DEFAULT;
+
+-- Создаёт секцию movements_YYYY_MM для месяца month_start.
+-- Строки этого месяца, уже попавшие в секцию по умолчанию, переносятся в новую секцию.
+CREATE OR REPLACE FUNCTION t_p72161094_stock_management_exc.create_movement_partition(month_start DATE)
+RETURNS BOOLEAN AS $$
+DECLARE
+    range_start DATE := date_trunc('month', month_start)::DATE;
+    range_end DATE := (date_trunc('month', month_start) + INTERVAL '1 month')::DATE;
+    partition_name TEXT := 'movements_' || to_char(month_start, 'YYYY_MM');
+BEGIN
+    IF to_regclass(partition_name) IS NOT NULL THEN
+        RETURN FALSE;
+    END IF;
+
+    EXECUTE format('CREATE TABLE %I (LIKE movements INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', partition_name);
+    EXECUTE format(
+        'WITH moved AS (DELETE FROM movements_default WHERE created_at >= %L AND created_at < %L RETURNING *) '
+        'INSERT INTO %I SELECT * FROM moved',
+        range_start, range_end, partition_name
+    );
+    EXECUTE format(
+        'ALTER TABLE movements ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+        partition_name, range_start, range_end
+    );
+
+    RETURN TRUE;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Создаёт секции на текущий месяц и months_ahead месяцев вперёд. Возвращает число созданных секций.
+CREATE OR REPLACE FUNCTION t_p72161094_stock_management_exc.ensure_movement_partitions(months_ahead INTEGER DEFAULT 3)
+RETURNS INTEGER AS $$
+DECLARE
+    created INTEGER := 0;
+BEGIN
+    FOR i IN 0..months_ahead LOOP
+        IF create_movement_partition((date_trunc('month', CURRENT_DATE) + make_interval(months => i))::DATE) THEN
+            created := created + 1;
+        END IF;
+    END LOOP;
+
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Отсоединяет (и при drop_tables удаляет) секции месяцев, целиком лежащих раньше before_date.
+CREATE OR REPLACE FUNCTION t_p72161094_stock_management_exc.archive_movement_partitions(before_date DATE, drop_tables BOOLEAN DEFAULT TRUE)
+RETURNS SETOF TEXT AS $$
+DECLARE
+    partition_name TEXT;
+    fk_name TEXT;
+BEGIN
+    FOR partition_name IN
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'movements'::regclass
+          AND c.relname ~ '^movements_\d{4}_\d{2}$'
+          AND to_date(substring(c.relname FROM 11), 'YYYY_MM') + INTERVAL '1 month' <= before_date
+        ORDER BY c.relname
+    LOOP
+        EXECUTE format('ALTER TABLE movements DETACH PARTITION %I', partition_name);
+        IF drop_tables THEN
+            EXECUTE format('DROP TABLE %I', partition_name);
+        ELSE
+            -- Отсоединённая секция не должна мешать TRUNCATE products
+            FOR fk_name IN
+                SELECT conname FROM pg_constraint WHERE conrelid = partition_name::regclass AND contype = 'f'
+            LOOP
+                EXECUTE format('ALTER TABLE %I DROP CONSTRAINT %I', partition_name, fk_name);
+            END LOOP;
+        END IF;
+        RETURN NEXT partition_name;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Секции для всей существующей истории и ближайших месяцев, затем перенос данных
+SELECT t_p72161094_stock_management_exc.create_movement_partition(month_start::DATE)
+FROM generate_series(
+    date_trunc('month', COALESCE((SELECT MIN(created_at) FROM t_p72161094_stock_management_exc.movements_legacy), CURRENT_DATE)),
+    date_trunc('month', CURRENT_DATE),
+    INTERVAL '1 month'
+) AS month_start;
+
+SELECT t_p72161094_stock_management_exc.ensure_movement_partitions(3);
+
+INSERT INTO t_p72161094_stock_management_exc.movements
+    (id, product_id, movement_type, quantity, user_name, reason, supplier, notes, created_at)
+SELECT id, product_id, movement_type, quantity, user_name, reason, supplier, notes, COALESCE(created_at, CURRENT_TIMESTAMP)
+FROM t_p72161094_stock_management_exc.movements_legacy;
+
+DROP TABLE t_p72161094_stock_management_exc.movements_legacy;
@@ -0,0 +1,105 @@
+-- Партионный (лотовый) учёт остатков: поступления создают лоты, списания расходуют их по FIFO
+CREATE TABLE IF NOT EXISTS t_p72161094_stock_management_exc.lots (
+    id SERIAL PRIMARY KEY,
+    product_id INTEGER NOT NULL REFERENCES t_p72161094_stock_management_exc.products(id),
+    batch VARCHAR(50),
+    received_qty NUMERIC(12,3) NOT NULL,
+    remaining_qty NUMERIC(12,3) NOT NULL,
+    unit_cost NUMERIC(12,2) NOT NULL DEFAULT 0,
+    remaining_value NUMERIC(16,2) GENERATED ALWAYS AS (remaining_qty * unit_cost) STORED,
+    received_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    movement_id INTEGER,
+    CHECK (remaining_qty >= 0 AND remaining_qty <= received_qty)
+);
+
+COMMENT ON COLUMN t_p72161094_stock_management_exc.lots.remaining_value IS 'Стоимость остатка лота, пересчитывается при каждом изменении remaining_qty';
+
+-- Открытые лоты в порядке FIFO; INCLUDE позволяет считать оценку остатков по index-only scan
+CREATE INDEX idx_lots_open_fifo ON t_p72161094_stock_management_exc.lots(product_id, received_at, id)
+    INCLUDE (remaining_qty, unit_cost, remaining_value)
+    WHERE remaining_qty > 0;
+CREATE INDEX idx_lots_product_id ON t_p72161094_stock_management_exc.lots(product_id);
+
+CREATE TABLE IF NOT EXISTS t_p72161094_stock_management_exc.lot_consumptions (
+    id BIGSERIAL PRIMARY KEY,
+    lot_id INTEGER NOT NULL REFERENCES t_p72161094_stock_management_exc.lots(id) ON DELETE CASCADE,
+    product_id INTEGER NOT NULL,
+    movement_id INTEGER,
+    quantity NUMERIC(12,3) NOT NULL,
+    unit_cost NUMERIC(12,2) NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX idx_lot_consumptions_movement_id ON t_p72161094_stock_management_exc.lot_consumptions(movement_id);
+CREATE INDEX idx_lot_consumptions_lot_id ON t_p72161094_stock_management_exc.lot_consumptions(lot_id);
+
+-- Себестоимость и партия поступления; если не заданы - берутся из карточки товара
+ALTER TABLE t_p72161094_stock_management_exc.movements ADD COLUMN unit_cost NUMERIC(12,2);
+ALTER TABLE t_p72161094_stock_management_exc.movements ADD COLUMN batch VARCHAR(50);
+
+-- Списывает qty с открытых лотов товара в порядке FIFO одним set-based запросом:
+-- нарастающий итог остатков по лотам определяет, сколько взять с каждого.
+-- Возвращает списанное количество (меньше qty, если лотов не хватило).
+CREATE OR REPLACE FUNCTION t_p72161094_stock_management_exc.consume_lots_fifo(
+    p_product_id INTEGER, p_qty NUMERIC, p_movement_id INTEGER DEFAULT NULL
+)
+RETURNS NUMERIC AS $$
+DECLARE
+    allocated NUMERIC;
+BEGIN
+    WITH locked AS (
+        SELECT id, remaining_qty, unit_cost, received_at
+        FROM lots
+        WHERE product_id = p_product_id AND remaining_qty > 0
+        FOR UPDATE
+    ),
+    allocation AS (
+        SELECT id, unit_cost,
+               LEAST(remaining_qty, GREATEST(p_qty - (SUM(remaining_qty) OVER fifo - remaining_qty), 0)) AS take
+        FROM locked
+        WINDOW fifo AS (ORDER BY received_at, id)
+    ),
+    consumed AS (
+        UPDATE lots l
+        SET remaining_qty = l.remaining_qty - a.take
+        FROM allocation a
+        WHERE l.id = a.id AND a.take > 0
+        RETURNING l.id, a.take, a.unit_cost
+    ),
+    recorded AS (
+        INSERT INTO lot_consumptions (lot_id, product_id, movement_id, quantity, unit_cost)
+        SELECT id, p_product_id, p_movement_id, take, unit_cost FROM consumed
+        RETURNING quantity
+    )
+    SELECT COALESCE(SUM(quantity), 0) INTO allocated FROM recorded;
+
+    RETURN allocated;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION t_p72161094_stock_management_exc.apply_movement_to_lots()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF NEW.quantity > 0 AND NEW.movement_type = 'Поступление' THEN
+        INSERT INTO lots (product_id, batch, received_qty, remaining_qty, unit_cost, received_at, movement_id)
+        SELECT p.id, COALESCE(NEW.batch, NULLIF(p.batch, '')), NEW.quantity, NEW.quantity,
+               COALESCE(NEW.unit_cost, p.price, 0), NEW.created_at, NEW.id
+        FROM products p
+        WHERE p.id = NEW.product_id;
+    ELSIF NEW.quantity > 0 AND NEW.movement_type = 'Списание' THEN
+        PERFORM consume_lots_fifo(NEW.product_id, NEW.quantity, NEW.id);
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_movements_lots
+    AFTER INSERT ON t_p72161094_stock_management_exc.movements
+    FOR EACH ROW EXECUTE FUNCTION t_p72161094_stock_management_exc.apply_movement_to_lots();
+
+-- Начальные лоты для текущих остатков
+INSERT INTO t_p72161094_stock_management_exc.lots (product_id, batch, received_qty, remaining_qty, unit_cost, received_at)
+SELECT id, NULLIF(batch, ''), quantity, quantity, COALESCE(price, 0), COALESCE(updated_at, created_at, CURRENT_TIMESTAMP)
+FROM t_p72161094_stock_management_exc.products
+WHERE quantity > 0;
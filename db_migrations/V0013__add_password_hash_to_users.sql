@@ -0,0 +1,3 @@
+-- Хэш пароля (scrypt). Открытые пароли заменяются хэшем при первом успешном входе
+ALTER TABLE t_p72161094_stock_management_exc.users ADD COLUMN password_hash VARCHAR(255);
+ALTER TABLE t_p72161094_stock_management_exc.users ALTER COLUMN password DROP NOT NULL;
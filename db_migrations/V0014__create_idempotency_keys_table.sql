@@ -0,0 +1,16 @@
+-- Ключи идемпотентности POST-запросов с сохранённым ответом для повторов
+CREATE TABLE IF NOT EXISTS t_p72161094_stock_management_exc.idempotency_keys (
+    id BIGSERIAL PRIMARY KEY,
+    scope VARCHAR(50) NOT NULL,
+    idempotency_key VARCHAR(255) NOT NULL,
+    request_hash VARCHAR(64) NOT NULL,
+    status_code INTEGER,
+    response_body TEXT,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    expires_at TIMESTAMP NOT NULL
+);
+
+CREATE UNIQUE INDEX idx_idempotency_keys_scope_key
+    ON t_p72161094_stock_management_exc.idempotency_keys(scope, idempotency_key)
+    INCLUDE (request_hash, status_code, expires_at);
+CREATE INDEX idx_idempotency_keys_expires_at ON t_p72161094_stock_management_exc.idempotency_keys(expires_at);
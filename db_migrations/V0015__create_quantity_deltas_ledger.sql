@@ -0,0 +1,42 @@
+-- Журнал изменений остатков для режима QUANTITY_LEDGER_MODE=append: движения только добавляют дельту,
+-- а products.quantity догоняется компакцией. Без внешнего ключа, чтобы вставка не блокировала строку товара.
+CREATE TABLE IF NOT EXISTS t_p72161094_stock_management_exc.quantity_deltas (
+    id BIGSERIAL PRIMARY KEY,
+    product_id INTEGER NOT NULL,
+    delta NUMERIC(12,3) NOT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX idx_quantity_deltas_product_id ON t_p72161094_stock_management_exc.quantity_deltas(product_id) INCLUDE (delta);
+
+-- Переносит все видимые дельты в products.quantity одной транзакцией и возвращает число обновлённых товаров.
+-- Без wait при уже идущей компакции сразу возвращает 0.
+CREATE OR REPLACE FUNCTION t_p72161094_stock_management_exc.compact_quantity_deltas(wait BOOLEAN DEFAULT FALSE)
+RETURNS INTEGER AS $$
+DECLARE
+    compacted INTEGER;
+BEGIN
+    IF wait THEN
+        PERFORM pg_advisory_xact_lock(hashtext('compact_quantity_deltas'));
+    ELSIF NOT pg_try_advisory_xact_lock(hashtext('compact_quantity_deltas')) THEN
+        RETURN 0;
+    END IF;
+
+    WITH moved AS (
+        DELETE FROM quantity_deltas RETURNING product_id, delta
+    ),
+    totals AS (
+        SELECT product_id, SUM(delta) AS delta FROM moved GROUP BY product_id
+    ),
+    applied AS (
+        UPDATE products p
+        SET quantity = p.quantity + t.delta, updated_at = CURRENT_TIMESTAMP
+        FROM totals t
+        WHERE p.id = t.product_id
+        RETURNING p.id
+    )
+    SELECT COUNT(*) INTO compacted FROM applied;
+
+    RETURN compacted;
+END;
+$$ LANGUAGE plpgsql;
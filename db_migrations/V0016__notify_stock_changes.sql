@@ -0,0 +1,85 @@
+-- Поток изменений остатков через LISTEN/NOTIFY: любая запись, меняющая остаток товара, публикует
+-- в канал stock_changes JSON {"product_ids": [..]}. Актуальный остаток (с учётом некомпактированных
+-- дельт) досчитывает слушатель одним запросом на пачку уведомлений - в триггере это стоило бы
+-- суммирования дельт на каждой записи горячего товара.
+-- Триггеры уровня оператора с таблицами переходов: массовый импорт даёт одно уведомление на порцию
+-- из 500 товаров, а не на строку; одинаковые уведомления в транзакции PostgreSQL схлопывает сам.
+
+CREATE OR REPLACE FUNCTION t_p72161094_stock_management_exc.publish_stock_changes(product_ids INTEGER[])
+RETURNS VOID AS $$
+DECLARE
+    payload TEXT;
+BEGIN
+    -- Порции по 500 идентификаторов держат payload ниже лимита NOTIFY в 8000 байт
+    FOR payload IN
+        SELECT jsonb_build_object('product_ids', jsonb_agg(c.id ORDER BY c.id))::TEXT
+        FROM (
+            SELECT id, (row_number() OVER (ORDER BY id) - 1) / 500 AS chunk
+            FROM unnest(product_ids) AS id
+        ) c
+        GROUP BY c.chunk
+    LOOP
+        PERFORM pg_notify('stock_changes', payload);
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION t_p72161094_stock_management_exc.notify_products_quantity()
+RETURNS TRIGGER AS $$
+DECLARE
+    product_ids INTEGER[];
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        SELECT array_agg(id) INTO product_ids FROM new_rows;
+    ELSE
+        SELECT array_agg(n.id) INTO product_ids
+        FROM new_rows n
+        JOIN old_rows o ON o.id = n.id
+        WHERE n.quantity IS DISTINCT FROM o.quantity;
+    END IF;
+
+    IF product_ids IS NOT NULL THEN
+        PERFORM publish_stock_changes(product_ids);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION t_p72161094_stock_management_exc.notify_quantity_deltas()
+RETURNS TRIGGER AS $$
+DECLARE
+    product_ids INTEGER[];
+BEGIN
+    SELECT array_agg(DISTINCT product_id) INTO product_ids FROM new_rows;
+    PERFORM publish_stock_changes(product_ids);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION t_p72161094_stock_management_exc.notify_products_reset()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_notify('stock_changes', '{"reset": true}');
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_products_notify_insert
+    AFTER INSERT ON t_p72161094_stock_management_exc.products
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION t_p72161094_stock_management_exc.notify_products_quantity();
+
+CREATE TRIGGER trg_products_notify_update
+    AFTER UPDATE ON t_p72161094_stock_management_exc.products
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION t_p72161094_stock_management_exc.notify_products_quantity();
+
+CREATE TRIGGER trg_products_notify_truncate
+    AFTER TRUNCATE ON t_p72161094_stock_management_exc.products
+    FOR EACH STATEMENT EXECUTE FUNCTION t_p72161094_stock_management_exc.notify_products_reset();
+
+-- Режим QUANTITY_LEDGER_MODE=append: движение не трогает products, остаток меняется вставкой дельты
+CREATE TRIGGER trg_quantity_deltas_notify
+    AFTER INSERT ON t_p72161094_stock_management_exc.quantity_deltas
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION t_p72161094_stock_management_exc.notify_quantity_deltas();
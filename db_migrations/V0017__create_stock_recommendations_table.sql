@@ -0,0 +1,13 @@
+-- Рекомендации по точке заказа: пересчитываются целиком функцией replenishment по истории списаний
+CREATE TABLE IF NOT EXISTS t_p72161094_stock_management_exc.stock_recommendations (
+    product_id INTEGER PRIMARY KEY REFERENCES t_p72161094_stock_management_exc.products(id) ON DELETE CASCADE,
+    avg_daily_demand NUMERIC(14,4) NOT NULL,
+    demand_std NUMERIC(14,4) NOT NULL,
+    safety_stock NUMERIC(12,3) NOT NULL,
+    reorder_point NUMERIC(12,3) NOT NULL,
+    lead_time_days INTEGER NOT NULL,
+    service_level NUMERIC(5,4) NOT NULL,
+    history_days INTEGER NOT NULL,
+    computed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
@@ -0,0 +1,127 @@
+-- Несколько складов: остатки хранятся по складам в stock_balances, а products.quantity становится
+-- поддерживаемым триггером итогом по компании - его по-прежнему читают список товаров, выгрузки и уведомления.
+CREATE TABLE IF NOT EXISTS t_p72161094_stock_management_exc.warehouses (
+    id SERIAL PRIMARY KEY,
+    code VARCHAR(20) UNIQUE NOT NULL,
+    name VARCHAR(255) NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Склад по умолчанию получает id = 1: на него ссылаются значения по умолчанию ниже
+INSERT INTO t_p72161094_stock_management_exc.warehouses (code, name) VALUES ('MAIN', 'Основной склад');
+
+-- Первичный ключ начинается со склада: список остатков склада читается диапазоном индекса
+CREATE TABLE IF NOT EXISTS t_p72161094_stock_management_exc.stock_balances (
+    warehouse_id INTEGER NOT NULL REFERENCES t_p72161094_stock_management_exc.warehouses(id),
+    product_id INTEGER NOT NULL REFERENCES t_p72161094_stock_management_exc.products(id),
+    quantity NUMERIC(10,3) NOT NULL DEFAULT 0,
+    PRIMARY KEY (warehouse_id, product_id)
+);
+
+CREATE INDEX idx_stock_balances_product_id ON t_p72161094_stock_management_exc.stock_balances(product_id) INCLUDE (quantity);
+
+-- Текущие остатки целиком относятся к основному складу
+INSERT INTO t_p72161094_stock_management_exc.stock_balances (warehouse_id, product_id, quantity)
+SELECT 1, id, quantity FROM t_p72161094_stock_management_exc.products WHERE quantity <> 0;
+
+ALTER TABLE t_p72161094_stock_management_exc.movements
+    ADD COLUMN warehouse_id INTEGER NOT NULL DEFAULT 1 REFERENCES t_p72161094_stock_management_exc.warehouses(id);
+-- Общий номер двух строк перемещения: расход со склада-отправителя и приход на склад-получатель
+ALTER TABLE t_p72161094_stock_management_exc.movements ADD COLUMN transfer_id BIGINT;
+
+CREATE INDEX idx_movements_warehouse_created_at ON t_p72161094_stock_management_exc.movements(warehouse_id, created_at DESC);
+CREATE INDEX idx_movements_transfer_id ON t_p72161094_stock_management_exc.movements(transfer_id) WHERE transfer_id IS NOT NULL;
+
+CREATE SEQUENCE IF NOT EXISTS t_p72161094_stock_management_exc.movement_transfer_seq;
+
+ALTER TABLE t_p72161094_stock_management_exc.quantity_deltas ADD COLUMN warehouse_id INTEGER NOT NULL DEFAULT 1;
+CREATE INDEX idx_quantity_deltas_warehouse_product ON t_p72161094_stock_management_exc.quantity_deltas(warehouse_id, product_id) INCLUDE (delta);
+
+ALTER TABLE t_p72161094_stock_management_exc.writeoff_acts
+    ADD COLUMN warehouse_id INTEGER NOT NULL DEFAULT 1 REFERENCES t_p72161094_stock_management_exc.warehouses(id);
+
+ALTER TABLE t_p72161094_stock_management_exc.import_jobs
+    ADD COLUMN warehouse_id INTEGER NOT NULL DEFAULT 1 REFERENCES t_p72161094_stock_management_exc.warehouses(id);
+
+-- Переносит изменения остатков складов в products.quantity: одна строка товара на оператор,
+-- сколько бы складов он ни затронул. Перемещение между складами не меняет итог и товар не трогает.
+CREATE OR REPLACE FUNCTION t_p72161094_stock_management_exc.rollup_stock_balances()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        UPDATE products p
+        SET quantity = p.quantity + d.delta, updated_at = CURRENT_TIMESTAMP
+        FROM (SELECT product_id, SUM(quantity) AS delta FROM new_rows GROUP BY product_id) d
+        WHERE p.id = d.product_id AND d.delta <> 0;
+    ELSIF TG_OP = 'UPDATE' THEN
+        UPDATE products p
+        SET quantity = p.quantity + d.delta, updated_at = CURRENT_TIMESTAMP
+        FROM (
+            SELECT product_id, SUM(quantity) AS delta
+            FROM (
+                SELECT product_id, quantity FROM new_rows
+                UNION ALL
+                SELECT product_id, -quantity FROM old_rows
+            ) changes
+            GROUP BY product_id
+        ) d
+        WHERE p.id = d.product_id AND d.delta <> 0;
+    ELSE
+        UPDATE products p
+        SET quantity = p.quantity - d.delta, updated_at = CURRENT_TIMESTAMP
+        FROM (SELECT product_id, SUM(quantity) AS delta FROM old_rows GROUP BY product_id) d
+        WHERE p.id = d.product_id AND d.delta <> 0;
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_stock_balances_rollup_insert
+    AFTER INSERT ON t_p72161094_stock_management_exc.stock_balances
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION t_p72161094_stock_management_exc.rollup_stock_balances();
+
+CREATE TRIGGER trg_stock_balances_rollup_update
+    AFTER UPDATE ON t_p72161094_stock_management_exc.stock_balances
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION t_p72161094_stock_management_exc.rollup_stock_balances();
+
+CREATE TRIGGER trg_stock_balances_rollup_delete
+    AFTER DELETE ON t_p72161094_stock_management_exc.stock_balances
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION t_p72161094_stock_management_exc.rollup_stock_balances();
+
+-- Компакция дельт теперь переносит их в остатки складов; итог товара догоняет триггер выше
+CREATE OR REPLACE FUNCTION t_p72161094_stock_management_exc.compact_quantity_deltas(wait BOOLEAN DEFAULT FALSE)
+RETURNS INTEGER AS $$
+DECLARE
+    compacted INTEGER;
+BEGIN
+    IF wait THEN
+        PERFORM pg_advisory_xact_lock(hashtext('compact_quantity_deltas'));
+    ELSIF NOT pg_try_advisory_xact_lock(hashtext('compact_quantity_deltas')) THEN
+        RETURN 0;
+    END IF;
+
+    WITH moved AS (
+        DELETE FROM quantity_deltas RETURNING product_id, warehouse_id, delta
+    ),
+    totals AS (
+        SELECT product_id, warehouse_id, SUM(delta) AS delta
+        FROM moved
+        WHERE product_id IN (SELECT id FROM products)
+        GROUP BY product_id, warehouse_id
+    ),
+    applied AS (
+        INSERT INTO stock_balances (warehouse_id, product_id, quantity)
+        SELECT warehouse_id, product_id, delta FROM totals
+        ON CONFLICT (warehouse_id, product_id) DO UPDATE
+        SET quantity = stock_balances.quantity + EXCLUDED.quantity
+        RETURNING product_id
+    )
+    SELECT COUNT(DISTINCT product_id) INTO compacted FROM applied;
+
+    RETURN compacted;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,23 @@
+-- Инвентаризация: сессия пересчёта склада и загруженные сканерами подсчёты
+CREATE TABLE IF NOT EXISTS t_p72161094_stock_management_exc.stock_takes (
+    id SERIAL PRIMARY KEY,
+    warehouse_id INTEGER NOT NULL DEFAULT 1 REFERENCES t_p72161094_stock_management_exc.warehouses(id),
+    status VARCHAR(20) NOT NULL DEFAULT 'open',
+    created_by VARCHAR(255),
+    counted_items INTEGER NOT NULL DEFAULT 0,
+    adjusted_items INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    committed_at TIMESTAMP
+);
+
+-- Подсчёты хранятся по инвентарному номеру, а не по товару: неизвестные номера показываются в предпросмотре.
+-- Повторный скан того же номера заменяет подсчёт
+CREATE TABLE IF NOT EXISTS t_p72161094_stock_management_exc.stock_take_counts (
+    stock_take_id INTEGER NOT NULL REFERENCES t_p72161094_stock_management_exc.stock_takes(id) ON DELETE CASCADE,
+    inventory_number VARCHAR(100) NOT NULL,
+    counted_qty NUMERIC(10,3) NOT NULL,
+    counted_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (stock_take_id, inventory_number)
+);
+
+CREATE INDEX idx_stock_takes_created_at ON t_p72161094_stock_management_exc.stock_takes(created_at DESC);
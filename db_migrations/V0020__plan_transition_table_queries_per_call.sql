@@ -0,0 +1,65 @@
+-- Запросы к таблицам переходов в триггерах уровня оператора планируются через EXECUTE на каждый вызов.
+-- Статический запрос plpgsql кэширует план первого вызова в сессии, а им часто оказывается оператор
+-- без затронутых строк (например, INSERT ... ON CONFLICT DO NOTHING): план под пустые таблицы переходов -
+-- вложенный цикл, и следующий оператор на десятки тысяч строк выполняется за квадратичное время.
+
+CREATE OR REPLACE FUNCTION t_p72161094_stock_management_exc.notify_products_quantity()
+RETURNS TRIGGER AS $$
+DECLARE
+    product_ids INTEGER[];
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        SELECT array_agg(id) INTO product_ids FROM new_rows;
+    ELSE
+        EXECUTE '
+            SELECT array_agg(n.id)
+            FROM new_rows n
+            JOIN old_rows o ON o.id = n.id
+            WHERE n.quantity IS DISTINCT FROM o.quantity
+        ' INTO product_ids;
+    END IF;
+
+    IF product_ids IS NOT NULL THEN
+        PERFORM publish_stock_changes(product_ids);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION t_p72161094_stock_management_exc.rollup_stock_balances()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        EXECUTE '
+            UPDATE products p
+            SET quantity = p.quantity + d.delta, updated_at = CURRENT_TIMESTAMP
+            FROM (SELECT product_id, SUM(quantity) AS delta FROM new_rows GROUP BY product_id) d
+            WHERE p.id = d.product_id AND d.delta <> 0
+        ';
+    ELSIF TG_OP = 'UPDATE' THEN
+        EXECUTE '
+            UPDATE products p
+            SET quantity = p.quantity + d.delta, updated_at = CURRENT_TIMESTAMP
+            FROM (
+                SELECT product_id, SUM(quantity) AS delta
+                FROM (
+                    SELECT product_id, quantity FROM new_rows
+                    UNION ALL
+                    SELECT product_id, -quantity FROM old_rows
+                ) changes
+                GROUP BY product_id
+            ) d
+            WHERE p.id = d.product_id AND d.delta <> 0
+        ';
+    ELSE
+        EXECUTE '
+            UPDATE products p
+            SET quantity = p.quantity - d.delta, updated_at = CURRENT_TIMESTAMP
+            FROM (SELECT product_id, SUM(quantity) AS delta FROM old_rows GROUP BY product_id) d
+            WHERE p.id = d.product_id AND d.delta <> 0
+        ';
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
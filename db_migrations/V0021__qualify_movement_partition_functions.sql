@@ -0,0 +1,93 @@
+-- Функции обслуживания секций movements из V0011 ссылались на таблицы без схемы и зависели от search_path.
+-- Имена секций и родительской таблицы теперь квалифицированы схемой, как и остальные объекты миграций.
+
+CREATE OR REPLACE FUNCTION t_p72161094_stock_management_exc.create_movement_partition(month_start DATE)
+RETURNS BOOLEAN AS $$
+DECLARE
+    range_start DATE := date_trunc('month', month_start)::DATE;
+    range_end DATE := (date_trunc('month', month_start) + INTERVAL '1 month')::DATE;
+    partition_name TEXT := 'movements_' || to_char(month_start, 'YYYY_MM');
+BEGIN
+    IF to_regclass(format('t_p72161094_stock_management_exc.%I', partition_name)) IS NOT NULL THEN
+        RETURN FALSE;
+    END IF;
+
+    EXECUTE format(
+        'CREATE TABLE t_p72161094_stock_management_exc.%I '
+        '(LIKE t_p72161094_stock_management_exc.movements INCLUDING DEFAULTS INCLUDING CONSTRAINTS)',
+        partition_name
+    );
+    EXECUTE format(
+        'WITH moved AS ('
+        'DELETE FROM t_p72161094_stock_management_exc.movements_default '
+        'WHERE created_at >= %L AND created_at < %L RETURNING *) '
+        'INSERT INTO t_p72161094_stock_management_exc.%I SELECT * FROM moved',
+        range_start, range_end, partition_name
+    );
+    EXECUTE format(
+        'ALTER TABLE t_p72161094_stock_management_exc.movements '
+        'ATTACH PARTITION t_p72161094_stock_management_exc.%I FOR VALUES FROM (%L) TO (%L)',
+        partition_name, range_start, range_end
+    );
+
+    RETURN TRUE;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION t_p72161094_stock_management_exc.ensure_movement_partitions(months_ahead INTEGER DEFAULT 3)
+RETURNS INTEGER AS $$
+DECLARE
+    created INTEGER := 0;
+BEGIN
+    FOR i IN 0..months_ahead LOOP
+        IF t_p72161094_stock_management_exc.create_movement_partition(
+            (date_trunc('month', CURRENT_DATE) + make_interval(months => i))::DATE
+        ) THEN
+            created := created + 1;
+        END IF;
+    END LOOP;
+
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION t_p72161094_stock_management_exc.archive_movement_partitions(before_date DATE, drop_tables BOOLEAN DEFAULT TRUE)
+RETURNS SETOF TEXT AS $$
+DECLARE
+    partition_name TEXT;
+    fk_name TEXT;
+BEGIN
+    FOR partition_name IN
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 't_p72161094_stock_management_exc.movements'::regclass
+          AND c.relname ~ '^movements_\d{4}_\d{2}$'
+          AND to_date(substring(c.relname FROM 11), 'YYYY_MM') + INTERVAL '1 month' <= before_date
+        ORDER BY c.relname
+    LOOP
+        EXECUTE format(
+            'ALTER TABLE t_p72161094_stock_management_exc.movements '
+            'DETACH PARTITION t_p72161094_stock_management_exc.%I',
+            partition_name
+        );
+        IF drop_tables THEN
+            EXECUTE format('DROP TABLE t_p72161094_stock_management_exc.%I', partition_name);
+        ELSE
+            -- Отсоединённая секция не должна мешать TRUNCATE products
+            FOR fk_name IN
+                SELECT conname
+                FROM pg_constraint
+                WHERE conrelid = format('t_p72161094_stock_management_exc.%I', partition_name)::regclass
+                  AND contype = 'f'
+            LOOP
+                EXECUTE format(
+                    'ALTER TABLE t_p72161094_stock_management_exc.%I DROP CONSTRAINT %I',
+                    partition_name, fk_name
+                );
+            END LOOP;
+        END IF;
+        RETURN NEXT partition_name;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,5 @@
+-- Количество движения в NUMERIC(10,3), как у остатков, подсчётов и лотов: дробная корректировка
+-- инвентаризации (например, недостача 0.3) иначе округляется до целого и журнал не сходится с остатком.
+-- На секционированной таблице изменение типа распространяется на все секции
+ALTER TABLE t_p72161094_stock_management_exc.movements
+  ALTER COLUMN quantity TYPE NUMERIC(10,3) USING quantity::NUMERIC(10,3);
@@ -0,0 +1,41 @@
+-- consume_lots_fifo из V0012 блокировала открытые лоты FOR UPDATE в порядке сканирования. После UPDATE
+-- версии строк переезжают, поэтому параллельные списания одного товара брали блокировки в разном порядке
+-- и ловили взаимоблокировку. Лоты теперь блокируются в порядке FIFO (received_at, id) — одинаковом для всех.
+
+CREATE OR REPLACE FUNCTION t_p72161094_stock_management_exc.consume_lots_fifo(
+    p_product_id INTEGER, p_qty NUMERIC, p_movement_id INTEGER DEFAULT NULL
+)
+RETURNS NUMERIC AS $$
+DECLARE
+    allocated NUMERIC;
+BEGIN
+    WITH locked AS (
+        SELECT id, remaining_qty, unit_cost, received_at
+        FROM t_p72161094_stock_management_exc.lots
+        WHERE product_id = p_product_id AND remaining_qty > 0
+        ORDER BY received_at, id
+        FOR UPDATE
+    ),
+    allocation AS (
+        SELECT id, unit_cost,
+               LEAST(remaining_qty, GREATEST(p_qty - (SUM(remaining_qty) OVER fifo - remaining_qty), 0)) AS take
+        FROM locked
+        WINDOW fifo AS (ORDER BY received_at, id)
+    ),
+    consumed AS (
+        UPDATE t_p72161094_stock_management_exc.lots l
+        SET remaining_qty = l.remaining_qty - a.take
+        FROM allocation a
+        WHERE l.id = a.id AND a.take > 0
+        RETURNING l.id, a.take, a.unit_cost
+    ),
+    recorded AS (
+        INSERT INTO t_p72161094_stock_management_exc.lot_consumptions (lot_id, product_id, movement_id, quantity, unit_cost)
+        SELECT id, p_product_id, p_movement_id, take, unit_cost FROM consumed
+        RETURNING quantity
+    )
+    SELECT COALESCE(SUM(quantity), 0) INTO allocated FROM recorded;
+
+    RETURN allocated;
+END;
+$$ LANGUAGE plpgsql;
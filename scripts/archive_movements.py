@@ -0,0 +1,324 @@
+"""
+Business: Холодное архивирование истории движений и поиск по архиву без загрузки обратно в БД
+Args: archive --before DATE --dir PATH - выгрузка движений старше даты в сжатые помесячные файлы
+      query --dir PATH [--from DATE] [--to DATE] [--product-id ID] - поиск по архиву, CSV в stdout
+      verify --dir PATH - проверка контрольных сумм архива
+Returns: код выхода 0 при успехе
+"""
+
+import argparse
+import csv
+import gzip
+import hashlib
+import io
+import json
+import os
+import re
+import sys
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+import psycopg2
+
+
+# Колонки новых файлов. Каждый файл записывает свой список в манифест: файлы, выгруженные до появления
+# лотов (unit_cost, batch) и складов (warehouse_id, transfer_id), читаются по списку манифеста
+COLUMNS = [
+    'id', 'product_id', 'movement_type', 'quantity', 'user_name', 'reason', 'supplier', 'notes', 'created_at',
+    'unit_cost', 'batch', 'warehouse_id', 'transfer_id'
+]
+MANIFEST_NAME = 'manifest.json'
+# created_at в файлах и манифесте: всегда с микросекундами и без смещения
+TIMESTAMP_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+# Файлы, выгруженные раньше, содержат текст Postgres: пробел вместо T, 0-6 знаков дробной части,
+# у timestamptz - смещение вроде +00, которые datetime.fromisoformat до Python 3.11 не разбирает
+POSTGRES_TIMESTAMP = re.compile(r'^(\d{4}-\d{2}-\d{2})[ T](\d{2}:\d{2}:\d{2})(?:\.(\d{1,6}))?(?:[+-]\d{2}(?::?\d{2})?)?$')
+# Выгружаемые выражения: created_at в фиксированном формате TIMESTAMP_FORMAT, а не в тексте Postgres
+SELECT_COLUMNS = [
+    f"to_char({column}, 'YYYY-MM-DD\"T\"HH24:MI:SS.US') AS {column}" if column == 'created_at' else column
+    for column in COLUMNS
+]
+
+
+class HashingWriter:
+    '''Пишет сжатые байты в файл, попутно считая sha256 и размер.'''
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data: bytes) -> int:
+        self.sha256.update(data)
+        self.size += len(data)
+        return self.raw.write(data)
+
+    def flush(self) -> None:
+        self.raw.flush()
+
+
+def load_manifest(archive_dir: Path) -> Dict[str, Any]:
+    path = archive_dir / MANIFEST_NAME
+    if not path.exists():
+        return {'columns': COLUMNS, 'files': []}
+    return json.loads(path.read_text(encoding='utf-8'))
+
+
+def save_manifest(archive_dir: Path, manifest: Dict[str, Any]) -> None:
+    tmp = archive_dir / (MANIFEST_NAME + '.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write(json.dumps(manifest, ensure_ascii=False, indent=2))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, archive_dir / MANIFEST_NAME)
+    # Переименование переживает сбой питания только после fsync каталога
+    dir_fd = os.open(archive_dir, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+
+def reconcile_pending(conn, archive_dir: Path, manifest: Dict[str, Any]) -> None:
+    '''
+    Разбирает записи, оставшиеся 'pending' после сбоя между сохранением манифеста и коммитом удаления.
+    Если строки файла ещё в БД - удаление не закоммичено: файл и запись убираются, месяц выгрузится заново.
+    Иначе удаление прошло и запись просто подтверждается.
+    '''
+    pending = [entry for entry in manifest['files'] if entry.get('pending')]
+    if not pending:
+        return
+
+    with conn.cursor() as cur:
+        for entry in pending:
+            cur.execute('''
+                SELECT EXISTS (
+                    SELECT 1 FROM movements
+                    WHERE created_at >= %s AND created_at <= %s AND id BETWEEN %s AND %s
+                )
+            ''', (entry['min_created_at'], entry['max_created_at'], entry['min_id'], entry['max_id']))
+            if cur.fetchone()[0]:
+                manifest['files'].remove(entry)
+                (archive_dir / entry['file']).unlink(missing_ok=True)
+            else:
+                del entry['pending']
+    conn.rollback()
+
+    save_manifest(archive_dir, manifest)
+
+
+def parse_timestamp(value: str) -> datetime:
+    '''Метка времени из архива в любом из двух форматов; смещение отбрасывается, остаётся время выгрузки.'''
+    match = POSTGRES_TIMESTAMP.match(value)
+    if not match:
+        raise ValueError(f'unsupported timestamp: {value!r}')
+    day, clock, fraction = match.groups()
+    return datetime.strptime(f'{day}T{clock}.{(fraction or "").ljust(6, "0")}', TIMESTAMP_FORMAT)
+
+
+def format_timestamp(value: datetime) -> str:
+    return value.strftime(TIMESTAMP_FORMAT)
+
+
+def next_month(month_start: date) -> date:
+    return date(month_start.year + month_start.month // 12, month_start.month % 12 + 1, 1)
+
+
+def archive(conn, archive_dir: Path, before: date) -> List[Dict[str, Any]]:
+    '''
+    Выгружает движения с created_at < before помесячно через COPY TO STDOUT в gzip-файлы,
+    затем удаляет их из БД. Каждый месяц - отдельная транзакция REPEATABLE READ,
+    поэтому подсчёт, выгрузка и удаление видят один и тот же снимок.
+    Полностью архивированные месяцы снимаются через archive_movement_partitions (DETACH + DROP).
+    Запись о файле попадает в манифест с пометкой pending до коммита удаления,
+    так что удалённые из БД строки всегда есть в манифесте.
+    '''
+    manifest = load_manifest(archive_dir)
+    conn.set_session(isolation_level='REPEATABLE READ')
+    reconcile_pending(conn, archive_dir, manifest)
+    archived = []
+
+    with conn.cursor() as cur:
+        cur.execute('SELECT MIN(created_at) FROM movements WHERE created_at < %s', (before,))
+        oldest = cur.fetchone()[0]
+    conn.rollback()
+
+    if oldest is None:
+        return archived
+
+    month_start = date(oldest.year, oldest.month, 1)
+    while month_start < before:
+        month_end = next_month(month_start)
+        range_end = min(month_end, before)
+
+        with conn.cursor() as cur:
+            cur.execute('''
+                SELECT COUNT(*), MIN(id), MAX(id), MIN(created_at), MAX(created_at)
+                FROM movements
+                WHERE created_at >= %s AND created_at < %s
+            ''', (month_start, range_end))
+            rows, min_id, max_id, min_created, max_created = cur.fetchone()
+
+            if rows:
+                month_dir = archive_dir / f'year={month_start.year}' / f'month={month_start.month:02d}'
+                month_dir.mkdir(parents=True, exist_ok=True)
+                part = sum(1 for f in manifest['files'] if f['month'] == month_start.strftime('%Y-%m'))
+                final_path = month_dir / f'movements_{month_start:%Y_%m}_part{part:04d}.csv.gz'
+                tmp_path = final_path.with_suffix('.gz.tmp')
+
+                copy_sql = cur.mogrify(f'''
+                    COPY (
+                        SELECT {', '.join(SELECT_COLUMNS)}
+                        FROM movements
+                        WHERE created_at >= %s AND created_at < %s
+                        ORDER BY created_at, id
+                    ) TO STDOUT WITH (FORMAT csv, HEADER true)
+                ''', (month_start, range_end)).decode()
+
+                with open(tmp_path, 'wb') as raw:
+                    writer = HashingWriter(raw)
+                    with gzip.GzipFile(fileobj=writer, mode='wb', compresslevel=6) as gz:
+                        cur.copy_expert(copy_sql, gz)
+                    raw.flush()
+                    os.fsync(raw.fileno())
+
+                if range_end == month_end:
+                    cur.execute('SELECT archive_movement_partitions(%s)', (month_end,))
+                cur.execute(
+                    'DELETE FROM movements WHERE created_at >= %s AND created_at < %s',
+                    (month_start, range_end)
+                )
+
+                os.replace(tmp_path, final_path)
+
+                entry = {
+                    'file': str(final_path.relative_to(archive_dir)),
+                    'month': month_start.strftime('%Y-%m'),
+                    'rows': rows,
+                    'min_id': min_id,
+                    'max_id': max_id,
+                    'min_created_at': format_timestamp(min_created),
+                    'max_created_at': format_timestamp(max_created),
+                    'bytes': writer.size,
+                    'sha256': writer.sha256.hexdigest(),
+                    'archived_at': datetime.now().isoformat(timespec='seconds'),
+                    'columns': COLUMNS,
+                    'pending': True
+                }
+                manifest['files'].append(entry)
+                save_manifest(archive_dir, manifest)
+
+                conn.commit()
+
+                del entry['pending']
+                save_manifest(archive_dir, manifest)
+                archived.append(entry)
+            else:
+                conn.rollback()
+
+        month_start = month_end
+
+    return archived
+
+
+def verify(archive_dir: Path) -> List[str]:
+    errors = []
+    for entry in load_manifest(archive_dir)['files']:
+        path = archive_dir / entry['file']
+        if not path.exists():
+            errors.append(f'{entry["file"]}: missing')
+            continue
+        sha256 = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                sha256.update(block)
+        if sha256.hexdigest() != entry['sha256']:
+            errors.append(f'{entry["file"]}: checksum mismatch')
+    return errors
+
+
+def query(archive_dir: Path, date_from: Optional[date], date_to: Optional[date],
+          product_id: Optional[int]) -> Iterator[List[str]]:
+    '''
+    Читает только файлы месяцев, пересекающих [date_from, date_to], потоково распаковывая их.
+    date_to включительно. Строки приводятся к COLUMNS по именам колонок файла; отсутствующие в старых
+    файлах колонки остаются пустыми.
+    '''
+    lower = datetime.combine(date_from, datetime.min.time()) if date_from else None
+    upper = datetime.combine(date_to, datetime.max.time()) if date_to else None
+    wanted_product = str(product_id) if product_id is not None else None
+
+    manifest = load_manifest(archive_dir)
+
+    for entry in sorted(manifest['files'], key=lambda e: (e['month'], e['file'])):
+        if upper and parse_timestamp(entry['min_created_at']) > upper:
+            continue
+        if lower and parse_timestamp(entry['max_created_at']) < lower:
+            continue
+
+        columns = entry.get('columns', manifest['columns'])
+        positions = [columns.index(column) if column in columns else None for column in COLUMNS]
+        product_position = columns.index('product_id')
+        created_position = columns.index('created_at')
+
+        with gzip.open(archive_dir / entry['file'], 'rt', encoding='utf-8', newline='') as f:
+            reader = csv.reader(f)
+            next(reader)
+            for row in reader:
+                if wanted_product is not None and row[product_position] != wanted_product:
+                    continue
+                if lower or upper:
+                    created_at = parse_timestamp(row[created_position])
+                    if (lower and created_at < lower) or (upper and created_at > upper):
+                        continue
+                yield [row[position] if position is not None else '' for position in positions]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Cold storage for movement history')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    archive_parser = sub.add_parser('archive')
+    archive_parser.add_argument('--before', type=date.fromisoformat, required=True)
+    archive_parser.add_argument('--dir', type=Path, required=True)
+
+    query_parser = sub.add_parser('query')
+    query_parser.add_argument('--dir', type=Path, required=True)
+    query_parser.add_argument('--from', dest='date_from', type=date.fromisoformat)
+    query_parser.add_argument('--to', dest='date_to', type=date.fromisoformat)
+    query_parser.add_argument('--product-id', type=int)
+
+    verify_parser = sub.add_parser('verify')
+    verify_parser.add_argument('--dir', type=Path, required=True)
+
+    args = parser.parse_args()
+
+    if args.command == 'archive':
+        args.dir.mkdir(parents=True, exist_ok=True)
+        conn = psycopg2.connect(os.environ['DATABASE_URL'])
+        try:
+            archived = archive(conn, args.dir, args.before)
+        finally:
+            conn.close()
+        for entry in archived:
+            print(f'{entry["file"]}: {entry["rows"]} rows, {entry["bytes"]} bytes')
+        print(f'archived {sum(e["rows"] for e in archived)} movements into {len(archived)} files')
+        return 0
+
+    if args.command == 'verify':
+        errors = verify(args.dir)
+        for error in errors:
+            print(error, file=sys.stderr)
+        return 1 if errors else 0
+
+    out = csv.writer(io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', newline=''))
+    out.writerow(COLUMNS)
+    for row in query(args.dir, args.date_from, args.date_to, args.product_id):
+        out.writerow(row)
+    sys.stdout.flush()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
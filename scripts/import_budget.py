@@ -0,0 +1,133 @@
+"""
+Business: Бюджет холодного старта функций - время импорта index.py и первого OPTIONS по данным python -X importtime
+Args: [functions ...] - папки backend/ (по умолчанию все), --repeat, --top, --budget-ms - общий бюджет вместо таблицы
+Returns: отчёт по функциям (время, самые тяжёлые импорты, лишние модули на пути OPTIONS);
+         код выхода 1, если бюджет превышен или OPTIONS подтянул тяжёлый модуль
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+
+ROOT = Path(__file__).resolve().parent.parent
+BACKEND = ROOT / 'backend'
+
+# Импорт index.py + обработка OPTIONS, мс. Примерно двойной запас к замерам, когда на уровне модуля
+# остаётся только стандартная библиотека: один psycopg2 с extras уже ~40 мс, openpyxl - ~220 мс
+DEFAULT_BUDGET_MS = 20
+BUDGETS_MS: Dict[str, float] = {
+    'export-excel': 25,
+    'replenishment': 25,
+    'users': 25
+}
+
+# Эти пакеты не должны загружаться на пути OPTIONS ни одной функции
+HEAVY_MODULES = ('psycopg2', 'openpyxl', 'numpy', 'concurrent.futures', 'multiprocessing')
+
+START_MARKER = '-- cold start --'
+
+CHILD = f'''
+import json, sys, time
+before = set(sys.modules)
+sys.stderr.write({START_MARKER!r} + '\\n')
+started = time.perf_counter()
+import index
+imported = time.perf_counter()
+response = index.handler({{'httpMethod': 'OPTIONS', 'headers': {{}}}}, None)
+finished = time.perf_counter()
+print(json.dumps({{
+    'import_ms': (imported - started) * 1000,
+    'options_ms': (finished - imported) * 1000,
+    'status': response['statusCode'],
+    'loaded': sorted(set(sys.modules) - before)
+}}))
+'''
+
+
+def parse_importtime(stderr: str) -> List[Tuple[int, int, str]]:
+    '''Строки "import time: self | cumulative | name" после маркера -> (глубина, cumulative мкс, модуль).'''
+    entries = []
+    lines = stderr.split('\n')
+    if START_MARKER in lines:
+        lines = lines[lines.index(START_MARKER) + 1:]
+    for line in lines:
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|', 2)
+        stripped = name.lstrip(' ')
+        entries.append(((len(name) - len(stripped) - 1) // 2, int(cumulative), stripped))
+    return entries
+
+
+def measure(function_dir: Path) -> Dict[str, Any]:
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', CHILD],
+        cwd=function_dir, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        return {'error': result.stderr.strip().split('\n')[-1]}
+    report = json.loads(result.stdout.strip().split('\n')[-1])
+    entries = parse_importtime(result.stderr)
+    report['importtime_ms'] = sum(cumulative for depth, cumulative, _ in entries if depth == 0) / 1000
+    # Прямые импорты index.py (глубина 1) - именно их можно отложить в код обработчика
+    report['heaviest'] = sorted(
+        ((cumulative / 1000, name) for depth, cumulative, name in entries if depth == 1),
+        reverse=True
+    )
+    return report
+
+
+def heavy_loaded(loaded: List[str]) -> List[str]:
+    return sorted({
+        heavy for heavy in HEAVY_MODULES
+        for name in loaded
+        if name == heavy or name.startswith(heavy + '.')
+    })
+
+
+def check_function(name: str, repeat: int, top: int, budget_override: Optional[float]) -> bool:
+    runs = [measure(BACKEND / name) for _ in range(repeat)]
+    failed = next((run for run in runs if 'error' in run), None)
+    if failed:
+        print(f'{name:<22} ERROR  {failed["error"]}')
+        return False
+
+    # Лучший из запусков: шум машины только добавляет время
+    best = min(runs, key=lambda run: run['import_ms'] + run['options_ms'])
+    total = best['import_ms'] + best['options_ms']
+    budget = budget_override if budget_override is not None else BUDGETS_MS.get(name, DEFAULT_BUDGET_MS)
+    heavy = heavy_loaded(best['loaded'])
+    ok = total <= budget and not heavy and best['status'] == 200
+
+    print(
+        f'{name:<22} {"ok" if ok else "FAIL":<5} {total:7.1f} ms / {budget:g} ms  '
+        f'(import {best["import_ms"]:.1f}, OPTIONS {best["options_ms"]:.2f}, importtime {best["importtime_ms"]:.1f})'
+    )
+    for ms, module in best['heaviest'][:top]:
+        print(f'{"":<28}{ms:7.1f} ms  {module}')
+    if heavy:
+        print(f'{"":<28}OPTIONS loaded: {", ".join(heavy)}')
+    if best['status'] != 200:
+        print(f'{"":<28}OPTIONS returned {best["status"]}')
+    return ok
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Cold-start import budget for backend functions')
+    parser.add_argument('functions', nargs='*', help='backend/<name> folders, default: all')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--top', type=int, default=5, help='heaviest direct imports to show')
+    parser.add_argument('--budget-ms', type=float, help='one budget for every function instead of BUDGETS_MS')
+    args = parser.parse_args()
+
+    names = args.functions or sorted(path.parent.name for path in BACKEND.glob('*/index.py'))
+    results = [check_function(name, args.repeat, args.top, args.budget_ms) for name in names]
+    return 0 if all(results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
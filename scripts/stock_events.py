@@ -0,0 +1,272 @@
+"""
+Business: Живой поток изменений остатков для клиентов через Server-Sent Events
+Args: --host, --port, --debounce-ms; DATABASE_URL - БД с каналом stock_changes (миграция V0016)
+Returns: HTTP-сервер: GET /events - поток событий stock/writeoff_act/reset, GET /health - число подписчиков
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+
+import psycopg2
+import psycopg2.extensions
+
+
+CHANNEL = 'stock_changes'
+HEARTBEAT_SECONDS = 15
+RECONNECT_DELAY_SECONDS = 2
+REPLAY_BUFFER_SIZE = 1000
+MAX_CLIENT_BUFFER_BYTES = 1 << 20
+CLIENT_RETRY_MS = 3000
+
+# Актуальный остаток с учётом ещё не компактированных дельт - один запрос на пачку уведомлений
+RESOLVE_QUANTITIES_SQL = '''
+    SELECT p.id, p.quantity + COALESCE(d.pending, 0)
+    FROM products p
+    LEFT JOIN (
+        SELECT product_id, SUM(delta) AS pending
+        FROM quantity_deltas
+        WHERE product_id = ANY(%s)
+        GROUP BY product_id
+    ) d ON d.product_id = p.id
+    WHERE p.id = ANY(%s)
+'''
+
+SSE_HEADERS = (
+    b'HTTP/1.1 200 OK\r\n'
+    b'Content-Type: text/event-stream\r\n'
+    b'Cache-Control: no-cache\r\n'
+    b'Connection: keep-alive\r\n'
+    b'Access-Control-Allow-Origin: *\r\n'
+    b'X-Accel-Buffering: no\r\n'
+    b'\r\n'
+)
+
+
+def http_response(status: str, body: bytes = b'', content_type: str = 'application/json') -> bytes:
+    return (
+        f'HTTP/1.1 {status}\r\n'
+        f'Content-Type: {content_type}\r\n'
+        f'Content-Length: {len(body)}\r\n'
+        'Access-Control-Allow-Origin: *\r\n'
+        'Access-Control-Allow-Methods: GET, OPTIONS\r\n'
+        'Access-Control-Allow-Headers: Last-Event-ID\r\n'
+        'Connection: close\r\n'
+        '\r\n'
+    ).encode() + body
+
+
+class StockEventHub:
+    '''
+    Держит одно LISTEN-соединение и раздаёт события всем подписчикам SSE.
+    Уведомления за debounce-интервал схлопываются: остатки изменённых товаров читаются одним
+    запросом, кадр события кодируется один раз и пишется в буфер каждого клиента без ожидания.
+    '''
+
+    def __init__(self, db_url: str, debounce_seconds: float):
+        self.db_url = db_url
+        self.debounce_seconds = debounce_seconds
+        self.clients: Set[asyncio.StreamWriter] = set()
+        self.history: Deque[Tuple[int, bytes]] = deque(maxlen=REPLAY_BUFFER_SIZE)
+        self.last_event_id = 0
+        self.dirty_products: Set[int] = set()
+        self.queued_events: List[Tuple[str, Dict[str, Any]]] = []
+        self.flush_scheduled = False
+        self.listen_conn = None
+        self.query_conn = None
+
+    def broadcast(self, event: str, data: Dict[str, Any]) -> None:
+        self.last_event_id += 1
+        frame = f'id: {self.last_event_id}\nevent: {event}\ndata: {json.dumps(data)}\n\n'.encode()
+        self.history.append((self.last_event_id, frame))
+        self.send_to_all(frame)
+
+    def send_to_all(self, frame: bytes) -> None:
+        for writer in list(self.clients):
+            # Клиент, который не успевает читать, отключается: переподключится с Last-Event-ID
+            if writer.transport.get_write_buffer_size() > MAX_CLIENT_BUFFER_BYTES:
+                self.clients.discard(writer)
+                writer.transport.abort()
+                continue
+            writer.write(frame)
+
+    def on_notify(self, lost: asyncio.Future) -> None:
+        try:
+            self.listen_conn.poll()
+        except psycopg2.Error as e:
+            if not lost.done():
+                lost.set_exception(e)
+            return
+
+        while self.listen_conn.notifies:
+            notify = self.listen_conn.notifies.pop(0)
+            try:
+                payload = json.loads(notify.payload)
+            except ValueError:
+                continue
+            if payload.get('reset'):
+                self.dirty_products.clear()
+                self.queued_events.append(('reset', {}))
+            if payload.get('writeoff_act'):
+                self.queued_events.append(('writeoff_act', {
+                    'id': payload['writeoff_act'],
+                    'action': payload.get('action')
+                }))
+            self.dirty_products.update(payload.get('product_ids') or ())
+
+        if not self.flush_scheduled and (self.dirty_products or self.queued_events):
+            self.flush_scheduled = True
+            asyncio.get_running_loop().call_later(
+                self.debounce_seconds, lambda: asyncio.ensure_future(self.flush())
+            )
+
+    def resolve_quantities(self, product_ids: List[int]) -> List[Dict[str, Any]]:
+        if self.query_conn is None or self.query_conn.closed:
+            self.query_conn = psycopg2.connect(self.db_url)
+        with self.query_conn.cursor() as cur:
+            cur.execute(RESOLVE_QUANTITIES_SQL, (product_ids, product_ids))
+            rows = cur.fetchall()
+        self.query_conn.rollback()
+        return [{'product_id': row[0], 'quantity': float(row[1])} for row in sorted(rows)]
+
+    async def flush(self) -> None:
+        self.flush_scheduled = False
+        events, self.queued_events = self.queued_events, []
+        product_ids, self.dirty_products = sorted(self.dirty_products), set()
+
+        for event, data in events:
+            self.broadcast(event, data)
+
+        if product_ids:
+            loop = asyncio.get_running_loop()
+            try:
+                changes = await loop.run_in_executor(None, self.resolve_quantities, product_ids)
+            except psycopg2.Error:
+                self.query_conn.close()
+                self.broadcast('reset', {})
+                return
+            # Удалённые товары не вернутся из запроса - клиенту достаточно перечитать список
+            if len(changes) < len(product_ids):
+                self.broadcast('reset', {})
+            if changes:
+                self.broadcast('stock', {'changes': changes})
+
+    async def listen(self) -> None:
+        '''LISTEN с переподключением; после обрыва клиенты получают reset, так как уведомления могли потеряться.'''
+        loop = asyncio.get_running_loop()
+        first = True
+        while True:
+            try:
+                self.listen_conn = psycopg2.connect(self.db_url)
+                self.listen_conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                with self.listen_conn.cursor() as cur:
+                    cur.execute(f'LISTEN {CHANNEL}')
+            except psycopg2.Error as e:
+                if self.listen_conn is not None:
+                    self.listen_conn.close()
+                print(f'listen connection failed: {e}', file=sys.stderr)
+                await asyncio.sleep(RECONNECT_DELAY_SECONDS)
+                continue
+
+            if not first:
+                self.broadcast('reset', {})
+            first = False
+
+            lost = loop.create_future()
+            fd = self.listen_conn.fileno()
+            loop.add_reader(fd, self.on_notify, lost)
+            try:
+                await lost
+            except psycopg2.Error as e:
+                print(f'listen connection lost: {e}', file=sys.stderr)
+            finally:
+                loop.remove_reader(fd)
+                self.listen_conn.close()
+            await asyncio.sleep(RECONNECT_DELAY_SECONDS)
+
+    async def heartbeat(self) -> None:
+        while True:
+            await asyncio.sleep(HEARTBEAT_SECONDS)
+            self.send_to_all(b': ping\n\n')
+
+    def replay_since(self, last_id: Optional[int]) -> List[bytes]:
+        if last_id is None or last_id >= self.last_event_id:
+            return []
+        if not self.history or self.history[0][0] > last_id + 1:
+            # Пропущенное уже вытеснено из буфера - клиент перечитает весь список
+            return [f'id: {self.last_event_id}\nevent: reset\ndata: {{}}\n\n'.encode()]
+        return [frame for event_id, frame in self.history if event_id > last_id]
+
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            request = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), timeout=10)
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            writer.close()
+            return
+
+        lines = request.decode('latin-1').split('\r\n')
+        parts = lines[0].split(' ')
+        method, path = parts[0], parts[1].split('?', 1)[0] if len(parts) > 1 else '/'
+        headers = {}
+        for line in lines[1:]:
+            if ':' in line:
+                name, value = line.split(':', 1)
+                headers[name.strip().lower()] = value.strip()
+
+        if method == 'OPTIONS':
+            writer.write(http_response('204 No Content'))
+        elif method == 'GET' and path == '/health':
+            body = json.dumps({'subscribers': len(self.clients), 'last_event_id': self.last_event_id}).encode()
+            writer.write(http_response('200 OK', body))
+        elif method == 'GET' and path == '/events':
+            last_id = headers.get('last-event-id')
+            writer.write(SSE_HEADERS + f'retry: {CLIENT_RETRY_MS}\n\n'.encode())
+            for frame in self.replay_since(int(last_id) if last_id and last_id.isdigit() else None):
+                writer.write(frame)
+            self.clients.add(writer)
+            try:
+                # Клиент ничего не присылает после запроса - ждём закрытия соединения
+                while await reader.read(1024):
+                    pass
+            except ConnectionError:
+                pass
+            finally:
+                self.clients.discard(writer)
+        else:
+            writer.write(http_response('404 Not Found', b'{"error": "Not found"}'))
+
+        try:
+            writer.close()
+            await writer.wait_closed()
+        except ConnectionError:
+            pass
+
+
+async def serve(host: str, port: int, db_url: str, debounce_seconds: float) -> None:
+    hub = StockEventHub(db_url, debounce_seconds)
+    server = await asyncio.start_server(hub.handle_client, host, port, backlog=1024)
+    print(f'stock events on http://{host}:{port}/events', flush=True)
+    async with server:
+        await asyncio.gather(server.serve_forever(), hub.listen(), hub.heartbeat())
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Server-Sent Events stream of stock changes')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8090)
+    parser.add_argument('--debounce-ms', type=int, default=100)
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args.host, args.port, os.environ['DATABASE_URL'], args.debounce_ms / 1000))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -47,6 +47,9 @@ export function Dashboard({ stockData, recentMovements, chartData }: DashboardPr
 
   const recentActivity = recentMovements.slice(0, 10);
 
+  // Части перемещения между складами показываются отдельно от поступлений и списаний
+  const isTransfer = (type: string) => type === 'Перемещение' || type === 'Перемещение (приём)';
+
   return (
     <div className="space-y-6">
       <div className="grid gap-4 md:grid-cols-2 lg:grid-cols-4">
@@ -146,13 +149,15 @@ export function Dashboard({ stockData, recentMovements, chartData }: DashboardPr
             <div key={index} className="flex items-center justify-between py-2 border-b last:border-0">
               <div className="flex items-center gap-3">
                 <div className={`h-8 w-8 rounded-full flex items-center justify-center ${
-                  movement.type === 'Поступление' 
-                    ? 'bg-green-100' 
-                    : 'bg-red-100'
+                  isTransfer(movement.type)
+                    ? 'bg-blue-100'
+                    : movement.type === 'Поступление' 
+                      ? 'bg-green-100' 
+                      : 'bg-red-100'
                 }`}>
                   <Icon 
-                    name={movement.type === 'Поступление' ? 'ArrowDown' : 'ArrowUp'} 
-                    className={movement.type === 'Поступление' ? 'text-green-600' : 'text-red-600'} 
+                    name={isTransfer(movement.type) ? 'ArrowLeftRight' : movement.type === 'Поступление' ? 'ArrowDown' : 'ArrowUp'} 
+                    className={isTransfer(movement.type) ? 'text-blue-600' : movement.type === 'Поступление' ? 'text-green-600' : 'text-red-600'} 
                     size={16} 
                   />
                 </div>
@@ -162,8 +167,8 @@ export function Dashboard({ stockData, recentMovements, chartData }: DashboardPr
                 </div>
               </div>
               <div className="text-right">
-                <Badge variant={movement.type === 'Поступление' ? 'default' : 'destructive'}>
-                  {movement.type === 'Поступление' ? '+' : '-'}{Math.abs(movement.quantity)}
+                <Badge variant={isTransfer(movement.type) ? 'secondary' : movement.type === 'Поступление' ? 'default' : 'destructive'}>
+                  {movement.quantity > 0 ? '+' : '-'}{Math.abs(movement.quantity)}
                 </Badge>
                 <p className="text-xs text-muted-foreground mt-1">{movement.date}</p>
               </div>
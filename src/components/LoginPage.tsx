@@ -11,11 +11,11 @@ export default function LoginPage() {
   const [error, setError] = useState('');
   const { login } = useAuth();
 
-  const handleSubmit = (e: React.FormEvent) => {
+  const handleSubmit = async (e: React.FormEvent) => {
     e.preventDefault();
     setError('');
 
-    if (login(username, password)) {
+    if (await login(username, password)) {
       setUsername('');
       setPassword('');
     } else {
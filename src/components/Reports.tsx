@@ -10,6 +10,7 @@ import { Badge } from "@/components/ui/badge";
 import { BarChart, Bar, LineChart, Line, XAxis, YAxis, CartesianGrid, Tooltip, ResponsiveContainer, Legend } from "recharts";
 import { useToast } from "@/hooks/use-toast";
 import { formatQuantity } from "@/utils/format";
+import { readAfterHeaders } from "@/lib/readAfter";
 
 const MOVEMENTS_API = 'https://functions.poehali.dev/178c4661-b69a-4921-8960-35d7db62c2d5';
 
@@ -58,7 +59,7 @@ export function Reports({ stockData }: ReportsProps) {
 
   const loadMovements = async () => {
     try {
-      const response = await fetch(MOVEMENTS_API);
+      const response = await fetch(MOVEMENTS_API, { headers: readAfterHeaders() });
       if (response.ok) {
         const data = await response.json();
         const formattedMovements = (data.movements || []).map((m: any) => ({
@@ -67,7 +68,7 @@ export function Reports({ stockData }: ReportsProps) {
           dateISO: m.created_at,
           product: m.product_name,
           type: m.movement_type,
-          quantity: m.movement_type === 'Поступление' ? m.quantity : -m.quantity,
+          quantity: m.movement_type === 'Поступление' || m.movement_type === 'Перемещение (приём)' ? m.quantity : -m.quantity,
           user: m.user_name,
           reason: m.reason || '',
           notes: m.notes || '',
@@ -114,6 +115,10 @@ export function Reports({ stockData }: ReportsProps) {
     setFilteredMovements(filtered);
   };
 
+  // Перемещение между складами не меняет общий остаток компании: обе его части не входят
+  // ни в поступления, ни в списания
+  const isTransfer = (type: string) => type === 'Перемещение' || type === 'Перемещение (приём)';
+
   const getChartData = () => {
     const groupedByDate: Record<string, { date: string; dateSort: string; incoming: number; outgoing: number }> = {};
 
@@ -125,6 +130,10 @@ export function Reports({ stockData }: ReportsProps) {
         groupedByDate[dateKey] = { date: dateKey, dateSort: dateSortKey, incoming: 0, outgoing: 0 };
       }
 
+      if (isTransfer(movement.type)) {
+        return;
+      }
+
       if (movement.type === 'Поступление') {
         groupedByDate[dateKey].incoming += Math.abs(movement.quantity);
       } else {
@@ -145,6 +154,10 @@ export function Reports({ stockData }: ReportsProps) {
     };
 
     filteredMovements.forEach(movement => {
+      if (isTransfer(movement.type)) {
+        return;
+      }
+
       if (movement.type === 'Поступление') {
         stats.totalIncoming += Math.abs(movement.quantity);
       } else {
@@ -252,6 +265,8 @@ export function Reports({ stockData }: ReportsProps) {
                 <SelectItem value="all">Все операции</SelectItem>
                 <SelectItem value="Поступление">Поступление</SelectItem>
                 <SelectItem value="Списание">Списание</SelectItem>
+                <SelectItem value="Перемещение">Перемещение</SelectItem>
+                <SelectItem value="Перемещение (приём)">Перемещение (приём)</SelectItem>
               </SelectContent>
             </Select>
           </div>
@@ -333,7 +348,7 @@ export function Reports({ stockData }: ReportsProps) {
                     <TableCell className="whitespace-nowrap">{movement.date}</TableCell>
                     <TableCell className="font-medium">{movement.product}</TableCell>
                     <TableCell>
-                      <Badge variant={movement.type === "Поступление" ? "default" : "destructive"}>
+                      <Badge variant={movement.type === "Поступление" ? "default" : isTransfer(movement.type) ? "secondary" : "destructive"}>
                         {movement.type}
                       </Badge>
                     </TableCell>
@@ -14,6 +14,9 @@ import { BarcodeScanner } from "./BarcodeScanner";
 import { useAuth } from "@/contexts/AuthContext";
 import { useToast } from "@/hooks/use-toast";
 import { formatQuantity } from "@/utils/format";
+import { rememberReadAfter } from "@/lib/readAfter";
+import { idempotentPost } from "@/lib/idempotentPost";
+import { useWarehouses, Warehouse } from "@/hooks/useWarehouses";
 
 const MOVEMENTS_API = 'https://functions.poehali.dev/178c4661-b69a-4921-8960-35d7db62c2d5';
 
@@ -58,37 +61,57 @@ interface StockTabsProps {
   onDataUpdate?: () => void;
 }
 
+// Без склада-получателя форма списания проводит обычное списание
+const NO_TRANSFER = 'none';
+
+function WarehouseSelect({ warehouses, value, onChange }: { warehouses: Warehouse[]; value: string; onChange: (value: string) => void }) {
+  return (
+    <Select value={value} onValueChange={onChange}>
+      <SelectTrigger>
+        <SelectValue placeholder="Выберите склад" />
+      </SelectTrigger>
+      <SelectContent>
+        {warehouses.map((warehouse) => (
+          <SelectItem key={warehouse.id} value={warehouse.id.toString()}>{warehouse.name}</SelectItem>
+        ))}
+      </SelectContent>
+    </Select>
+  );
+}
+
 export function StockTabs({ stockData, recentMovements, chartData, categoryData, isAdmin, onDataUpdate }: StockTabsProps) {
   const { user } = useAuth();
   const { toast } = useToast();
+  const warehouses = useWarehouses();
   const [incomingForm, setIncomingForm] = useState({
     product_id: '',
     quantity: 0,
-    supplier: ''
+    supplier: '',
+    warehouse_id: '1'
   });
   const [outgoingForm, setOutgoingForm] = useState({
     product_id: '',
     quantity: 0,
     reason: '',
-    notes: ''
+    notes: '',
+    warehouse_id: '1',
+    to_warehouse_id: NO_TRANSFER
   });
+  const isTransfer = outgoingForm.to_warehouse_id !== NO_TRANSFER;
 
   const handleBarcodeIncoming = async (inventory_number: string, quantity: number) => {
     const product = stockData?.find(item => item.inventory_number === inventory_number);
     if (!product?.id) return;
 
     try {
-      const response = await fetch(MOVEMENTS_API, {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({
-          product_id: product.id,
-          movement_type: 'Поступление',
-          quantity: quantity,
-          user_name: user?.name || 'Пользователь',
-          supplier: 'Сканирование штрих-кода'
-        })
+      const response = await idempotentPost(MOVEMENTS_API, {
+        product_id: product.id,
+        movement_type: 'Поступление',
+        quantity: quantity,
+        user_name: user?.name || 'Пользователь',
+        supplier: 'Сканирование штрих-кода'
       });
+      rememberReadAfter(response);
 
       if (response.ok) {
         onDataUpdate?.();
@@ -109,24 +132,22 @@ export function StockTabs({ stockData, recentMovements, chartData, categoryData,
     }
 
     try {
-      const response = await fetch(MOVEMENTS_API, {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({
-          product_id: parseInt(incomingForm.product_id),
-          movement_type: 'Поступление',
-          quantity: incomingForm.quantity,
-          user_name: user?.name || 'Пользователь',
-          supplier: incomingForm.supplier
-        })
+      const response = await idempotentPost(MOVEMENTS_API, {
+        product_id: parseInt(incomingForm.product_id),
+        movement_type: 'Поступление',
+        quantity: incomingForm.quantity,
+        user_name: user?.name || 'Пользователь',
+        supplier: incomingForm.supplier,
+        warehouse_id: parseInt(incomingForm.warehouse_id)
       });
+      rememberReadAfter(response);
 
       if (response.ok) {
         toast({
           title: "Успешно",
           description: `Поступление на ${incomingForm.quantity} шт проведено`
         });
-        setIncomingForm({ product_id: '', quantity: 0, supplier: '' });
+        setIncomingForm({ ...incomingForm, product_id: '', quantity: 0, supplier: '' });
         onDataUpdate?.();
       } else {
         toast({
@@ -154,31 +175,40 @@ export function StockTabs({ stockData, recentMovements, chartData, categoryData,
       return;
     }
 
+    if (isTransfer && outgoingForm.to_warehouse_id === outgoingForm.warehouse_id) {
+      toast({
+        title: "Ошибка",
+        description: "Склад-получатель должен отличаться от склада-отправителя",
+        variant: "destructive"
+      });
+      return;
+    }
+
     try {
-      const response = await fetch(MOVEMENTS_API, {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({
-          product_id: parseInt(outgoingForm.product_id),
-          movement_type: 'Списание',
-          quantity: outgoingForm.quantity,
-          user_name: user?.name || 'Пользователь',
-          reason: outgoingForm.reason,
-          notes: outgoingForm.notes
-        })
+      const response = await idempotentPost(MOVEMENTS_API, {
+        product_id: parseInt(outgoingForm.product_id),
+        ...(isTransfer
+          ? { to_warehouse_id: parseInt(outgoingForm.to_warehouse_id) }
+          : { movement_type: 'Списание' }),
+        quantity: outgoingForm.quantity,
+        user_name: user?.name || 'Пользователь',
+        reason: outgoingForm.reason,
+        notes: outgoingForm.notes,
+        warehouse_id: parseInt(outgoingForm.warehouse_id)
       });
+      rememberReadAfter(response);
 
       if (response.ok) {
         toast({
           title: "Успешно",
-          description: `Списание на ${outgoingForm.quantity} шт проведено`
+          description: `${isTransfer ? 'Перемещение' : 'Списание'} на ${outgoingForm.quantity} шт проведено`
         });
-        setOutgoingForm({ product_id: '', quantity: 0, reason: '', notes: '' });
+        setOutgoingForm({ ...outgoingForm, product_id: '', quantity: 0, reason: '', notes: '', to_warehouse_id: NO_TRANSFER });
         onDataUpdate?.();
       } else {
         toast({
           title: "Ошибка",
-          description: "Не удалось провести списание",
+          description: isTransfer ? "Не удалось провести перемещение" : "Не удалось провести списание",
           variant: "destructive"
         });
       }
@@ -225,7 +255,15 @@ export function StockTabs({ stockData, recentMovements, chartData, categoryData,
                   onChange={(e) => setIncomingForm({ ...incomingForm, quantity: parseFloat(e.target.value) || 0 })}
                 />
               </div>
-              <div className="md:col-span-2">
+              <div>
+                <Label>Склад</Label>
+                <WarehouseSelect
+                  warehouses={warehouses}
+                  value={incomingForm.warehouse_id}
+                  onChange={(val) => setIncomingForm({ ...incomingForm, warehouse_id: val })}
+                />
+              </div>
+              <div>
                 <Label>Поставщик</Label>
                 <Input 
                   placeholder="Название поставщика"
@@ -244,7 +282,7 @@ export function StockTabs({ stockData, recentMovements, chartData, categoryData,
 
       <TabsContent value="outgoing" className="space-y-6 animate-fade-in">
         <Card className="p-6">
-          <h3 className="text-lg font-semibold mb-4">Списание товаров</h3>
+          <h3 className="text-lg font-semibold mb-4">Списание и перемещение товаров</h3>
           <div className="space-y-4">
             <div className="grid gap-4 md:grid-cols-2">
               <div>
@@ -270,6 +308,34 @@ export function StockTabs({ stockData, recentMovements, chartData, categoryData,
                   onChange={(e) => setOutgoingForm({ ...outgoingForm, quantity: parseFloat(e.target.value) || 0 })}
                 />
               </div>
+              <div>
+                <Label>Склад</Label>
+                <WarehouseSelect
+                  warehouses={warehouses}
+                  value={outgoingForm.warehouse_id}
+                  onChange={(val) => setOutgoingForm({
+                    ...outgoingForm,
+                    warehouse_id: val,
+                    to_warehouse_id: outgoingForm.to_warehouse_id === val ? NO_TRANSFER : outgoingForm.to_warehouse_id
+                  })}
+                />
+              </div>
+              <div>
+                <Label>Переместить на склад</Label>
+                <Select value={outgoingForm.to_warehouse_id} onValueChange={(val) => setOutgoingForm({ ...outgoingForm, to_warehouse_id: val })}>
+                  <SelectTrigger>
+                    <SelectValue />
+                  </SelectTrigger>
+                  <SelectContent>
+                    <SelectItem value={NO_TRANSFER}>Не перемещать - списать</SelectItem>
+                    {warehouses
+                      .filter((warehouse) => warehouse.id.toString() !== outgoingForm.warehouse_id)
+                      .map((warehouse) => (
+                        <SelectItem key={warehouse.id} value={warehouse.id.toString()}>{warehouse.name}</SelectItem>
+                      ))}
+                  </SelectContent>
+                </Select>
+              </div>
               <div>
                 <Label>Причина</Label>
                 <Select value={outgoingForm.reason} onValueChange={(val) => setOutgoingForm({ ...outgoingForm, reason: val })}>
@@ -292,9 +358,9 @@ export function StockTabs({ stockData, recentMovements, chartData, categoryData,
                 />
               </div>
             </div>
-            <Button size="lg" variant="destructive" className="w-full gap-2" onClick={handleOutgoing}>
-              <Icon name="PackageMinus" size={20} />
-              Провести списание
+            <Button size="lg" variant={isTransfer ? "default" : "destructive"} className="w-full gap-2" onClick={handleOutgoing}>
+              <Icon name={isTransfer ? 'ArrowLeftRight' : 'PackageMinus'} size={20} />
+              {isTransfer ? 'Провести перемещение' : 'Провести списание'}
             </Button>
           </div>
         </Card>
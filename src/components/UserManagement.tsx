@@ -20,7 +20,7 @@ export function UserAddDialog() {
   });
   const [error, setError] = useState('');
 
-  const handleSubmit = (e: React.FormEvent) => {
+  const handleSubmit = async (e: React.FormEvent) => {
     e.preventDefault();
     setError('');
 
@@ -34,7 +34,7 @@ export function UserAddDialog() {
       return;
     }
 
-    const success = addUser(formData.username, formData.password, formData.name, formData.role);
+    const success = await addUser(formData.username, formData.password, formData.name, formData.role);
     
     if (success) {
       setFormData({ username: '', password: '', name: '', role: 'user' });
@@ -115,13 +115,13 @@ export function UserAddDialog() {
 }
 
 export function UsersTable() {
-  const { users, deleteUser } = useAuth();
+  const { user: currentUser, users, deleteUser } = useAuth();
   const [deleteConfirm, setDeleteConfirm] = useState<string | null>(null);
 
-  const handleDelete = (userId: string) => {
-    const success = deleteUser(userId);
+  const handleDelete = async (userId: string) => {
+    const success = await deleteUser(userId);
     if (!success) {
-      alert('Невозможно удалить главного администратора');
+      alert('Не удалось удалить пользователя');
     }
     setDeleteConfirm(null);
   };
@@ -150,7 +150,7 @@ export function UsersTable() {
               </Badge>
             </TableCell>
             <TableCell className="text-right">
-              {user.id !== '1' ? (
+              {user.id !== currentUser?.id ? (
                 <Dialog open={deleteConfirm === user.id} onOpenChange={(open) => setDeleteConfirm(open ? user.id : null)}>
                   <DialogTrigger asChild>
                     <Button variant="destructive" size="sm" className="gap-2">
@@ -176,7 +176,7 @@ export function UsersTable() {
                   </DialogContent>
                 </Dialog>
               ) : (
-                <Badge variant="outline">Системный</Badge>
+                <Badge variant="outline">Это вы</Badge>
               )}
             </TableCell>
           </TableRow>
@@ -9,6 +9,7 @@ import { Table, TableBody, TableCell, TableHead, TableHeader, TableRow } from "@
 import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from "@/components/ui/select";
 import Icon from "@/components/ui/icon";
 import { useToast } from "@/hooks/use-toast";
+import { authHeaders } from "@/lib/authToken";
 
 const USERS_API = 'https://functions.poehali.dev/e0ac19f1-ea5d-434d-b277-12401666c6ea';
 
@@ -48,7 +49,7 @@ export function UsersManagement() {
   const loadUsers = async () => {
     try {
       setLoading(true);
-      const response = await fetch(USERS_API);
+      const response = await fetch(USERS_API, { headers: authHeaders() });
       if (response.ok) {
         const data = await response.json();
         setUsers(data.users || []);
@@ -78,7 +79,7 @@ export function UsersManagement() {
     try {
       const response = await fetch(USERS_API, {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
+        headers: { 'Content-Type': 'application/json', ...authHeaders() },
         body: JSON.stringify(formData)
       });
 
@@ -120,7 +121,7 @@ export function UsersManagement() {
     try {
       const response = await fetch(`${USERS_API}?id=${editingUser.id}`, {
         method: 'PUT',
-        headers: { 'Content-Type': 'application/json' },
+        headers: { 'Content-Type': 'application/json', ...authHeaders() },
         body: JSON.stringify(updateData)
       });
 
@@ -158,7 +159,8 @@ export function UsersManagement() {
 
     try {
       const response = await fetch(`${USERS_API}?id=${userId}`, {
-        method: 'DELETE'
+        method: 'DELETE',
+        headers: authHeaders()
       });
 
       if (response.ok) {
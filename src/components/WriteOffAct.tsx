@@ -2,6 +2,9 @@ import { useState } from "react";
 import { Card } from "@/components/ui/card";
 import { useToast } from "@/hooks/use-toast";
 import { useAuth } from "@/contexts/AuthContext";
+import { rememberReadAfter } from "@/lib/readAfter";
+import { idempotentPost } from "@/lib/idempotentPost";
+import { DEFAULT_WAREHOUSE } from "@/hooks/useWarehouses";
 import { ActPreview } from "./WriteOffAct/ActPreview";
 import { ActForm } from "./WriteOffAct/ActForm";
 import { SavedActs } from "./WriteOffAct/SavedActs";
@@ -27,6 +30,7 @@ export function WriteOffAct({ stockData, onDataUpdate }: WriteOffActProps) {
     approvedBy: ['', '', '', '', '', '', ''],
     commission: '',
     commissionMembers: ['', '', ''],
+    warehouseId: DEFAULT_WAREHOUSE.id.toString(),
     signers: [
       { position: 'Председатель комиссии', name: '' },
       { position: 'Член комиссии', name: '' },
@@ -38,6 +42,8 @@ export function WriteOffAct({ stockData, onDataUpdate }: WriteOffActProps) {
   ]);
   const [isPreviewOpen, setIsPreviewOpen] = useState(false);
   const [isProcessing, setIsProcessing] = useState(false);
+  // Ключи идемпотентности строк акта: повторное проведение после сбоя не спишет уже проведённые строки
+  const [actKey] = useState(() => crypto.randomUUID());
 
   const addItem = () => {
     setItems([...items, { product: null, quantity: 0, reason: '' }]);
@@ -93,19 +99,17 @@ export function WriteOffAct({ stockData, onDataUpdate }: WriteOffActProps) {
     setIsProcessing(true);
 
     try {
-      for (const item of validItems) {
-        const response = await fetch(MOVEMENTS_API, {
-          method: 'POST',
-          headers: { 'Content-Type': 'application/json' },
-          body: JSON.stringify({
-            product_id: item.product?.id,
-            movement_type: 'Списание',
-            quantity: item.quantity,
-            user_name: user?.name || 'Администратор',
-            reason: item.reason,
-            notes: `Акт списания ${actData.actNumber}`
-          })
-        });
+      for (const [index, item] of validItems.entries()) {
+        const response = await idempotentPost(MOVEMENTS_API, {
+          product_id: item.product?.id,
+          movement_type: 'Списание',
+          quantity: item.quantity,
+          user_name: user?.name || 'Администратор',
+          reason: item.reason,
+          notes: `Акт списания ${actData.actNumber}`,
+          warehouse_id: parseInt(actData.warehouseId)
+        }, {}, `${actKey}:${index}`);
+        rememberReadAfter(response);
 
         if (!response.ok) {
           throw new Error(`Ошибка при списании ${item.product?.name}`);
@@ -145,19 +149,17 @@ export function WriteOffAct({ stockData, onDataUpdate }: WriteOffActProps) {
     }));
 
     try {
-      const response = await fetch(WRITEOFF_ACTS_API, {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({
-          act_number: actData.actNumber,
-          act_date: actData.date,
-          responsible_person: actData.responsible,
-          reason: actData.commission,
-          items: actItems,
-          created_by: user?.name || 'Администратор',
-          is_draft: isDraft
-        })
+      const response = await idempotentPost(WRITEOFF_ACTS_API, {
+        act_number: actData.actNumber,
+        act_date: actData.date,
+        responsible_person: actData.responsible,
+        reason: actData.commission,
+        items: actItems,
+        created_by: user?.name || 'Администратор',
+        is_draft: isDraft,
+        warehouse_id: parseInt(actData.warehouseId)
       });
+      rememberReadAfter(response);
 
       if (!response.ok) {
         throw new Error('Failed to save act');
@@ -198,6 +200,7 @@ export function WriteOffAct({ stockData, onDataUpdate }: WriteOffActProps) {
         approvedBy: ['', '', '', '', '', '', ''],
         commission: '',
         commissionMembers: ['', '', ''],
+        warehouseId: actData.warehouseId,
         signers: [
           { position: 'Председатель комиссии', name: '' },
           { position: 'Член комиссии', name: '' },
@@ -231,6 +234,7 @@ export function WriteOffAct({ stockData, onDataUpdate }: WriteOffActProps) {
       approvedBy: ['', '', '', '', '', '', ''],
       commission: '',
       commissionMembers: ['', '', ''],
+      warehouseId: actData.warehouseId,
       signers: [
         { position: 'Председатель комиссии', name: '' },
         { position: 'Член комиссии', name: '' },
@@ -249,6 +253,7 @@ export function WriteOffAct({ stockData, onDataUpdate }: WriteOffActProps) {
       approvedBy: ['', '', '', '', '', '', ''],
       commission: '',
       commissionMembers: ['', '', ''],
+      warehouseId: actData.warehouseId,
       signers: [
         { position: 'Председатель комиссии', name: '' },
         { position: 'Член комиссии', name: '' },
@@ -276,6 +281,7 @@ export function WriteOffAct({ stockData, onDataUpdate }: WriteOffActProps) {
       approvedBy: ['', '', '', '', '', '', ''],
       commission: act.reason,
       commissionMembers: ['', '', ''],
+      warehouseId: String(act.warehouse_id || DEFAULT_WAREHOUSE.id),
       signers: [
         { position: 'Председатель комиссии', name: '' },
         { position: 'Член комиссии', name: '' },
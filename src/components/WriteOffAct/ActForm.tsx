@@ -8,6 +8,7 @@ import Icon from "@/components/ui/icon";
 import { ActItem, ActData, StockItem } from "./types";
 import { CommissionTemplates } from "./CommissionTemplates";
 import { formatQuantity } from "@/utils/format";
+import { useWarehouses } from "@/hooks/useWarehouses";
 
 interface ActFormProps {
   actData: ActData;
@@ -38,6 +39,8 @@ export function ActForm({
   onSaveDraft,
   isProcessing
 }: ActFormProps) {
+  const warehouses = useWarehouses();
+
   return (
     <div className="space-y-6">
       {/* БЛОК 1: ШАПКА АКТА (заполняется пользователем) */}
@@ -96,6 +99,20 @@ export function ActForm({
             />
           </div>
           
+          <div>
+            <Label>Склад</Label>
+            <Select value={actData.warehouseId} onValueChange={(val) => onActDataChange({ ...actData, warehouseId: val })}>
+              <SelectTrigger>
+                <SelectValue placeholder="Выберите склад" />
+              </SelectTrigger>
+              <SelectContent>
+                {warehouses.map((warehouse) => (
+                  <SelectItem key={warehouse.id} value={warehouse.id.toString()}>{warehouse.name}</SelectItem>
+                ))}
+              </SelectContent>
+            </Select>
+          </div>
+          
           <div>
             <Label>Ответственное лицо</Label>
             <Input 
@@ -7,6 +7,7 @@ import { Table, TableBody, TableCell, TableHead, TableHeader, TableRow } from "@
 import { Dialog, DialogContent, DialogDescription, DialogHeader, DialogTitle } from "@/components/ui/dialog";
 import { formatQuantity } from "@/utils/format";
 import { useToast } from "@/hooks/use-toast";
+import { readAfterHeaders, rememberReadAfter } from "@/lib/readAfter";
 
 const WRITEOFF_ACTS_API = 'https://functions.poehali.dev/9cfbeb44-bbad-4db8-86a7-72ee7edc0283';
 
@@ -47,7 +48,7 @@ export function SavedActs({ onEditDraft }: SavedActsProps) {
   const loadActs = async () => {
     try {
       setLoading(true);
-      const response = await fetch(WRITEOFF_ACTS_API);
+      const response = await fetch(WRITEOFF_ACTS_API, { headers: readAfterHeaders() });
       if (response.ok) {
         const data = await response.json();
         setActs(data.acts || []);
@@ -73,6 +74,7 @@ export function SavedActs({ onEditDraft }: SavedActsProps) {
       const response = await fetch(`${WRITEOFF_ACTS_API}?id=${actId}`, {
         method: 'DELETE'
       });
+      rememberReadAfter(response);
 
       if (response.ok) {
         toast({
@@ -20,6 +20,8 @@ export interface ActData {
   approvedBy: string[];
   commission: string;
   commissionMembers: string[];
+  // Склад, с которого списываются строки акта
+  warehouseId: string;
   signers: Array<{
     position: string;
     name: string;
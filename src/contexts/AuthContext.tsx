@@ -1,94 +1,128 @@
 import React, { createContext, useContext, useState, useEffect } from 'react';
-import { User, UserWithPassword, AuthContextType, UserRole } from '@/types/auth';
+import { User, AuthContextType, UserRole } from '@/types/auth';
+import { authHeaders, saveAuthToken, clearAuthToken } from '@/lib/authToken';
 
 const AuthContext = createContext<AuthContextType | undefined>(undefined);
 
-const INITIAL_USERS: UserWithPassword[] = [
-  { id: '1', username: 'admin', password: 'admin123', role: 'admin', name: 'Администратор' },
-  { id: '2', username: 'user', password: 'user123', role: 'user', name: 'Пользователь' }
-];
+const USERS_API = 'https://functions.poehali.dev/e0ac19f1-ea5d-434d-b277-12401666c6ea';
+
+const toUser = (u: any): User => ({
+  id: String(u.id),
+  username: u.username,
+  role: u.role,
+  name: u.name
+});
 
 export function AuthProvider({ children }: { children: React.ReactNode }) {
   const [user, setUser] = useState<User | null>(null);
-  const [allUsers, setAllUsers] = useState<UserWithPassword[]>([]);
+  const [users, setUsers] = useState<User[]>([]);
 
   useEffect(() => {
     const savedUser = localStorage.getItem('currentUser');
-    const savedUsers = localStorage.getItem('allUsers');
-    
+
     if (savedUser) {
       setUser(JSON.parse(savedUser));
+
+      // Сохранённая сессия действительна, пока принимается её токен
+      fetch(`${USERS_API}?action=session`, { headers: authHeaders() })
+        .then((response) => {
+          if (response.status === 401) {
+            logout();
+          }
+        })
+        .catch(() => {});
     }
-    
-    if (savedUsers) {
-      setAllUsers(JSON.parse(savedUsers));
+  }, []);
+
+  useEffect(() => {
+    if (user?.role === 'admin') {
+      loadUsers();
     } else {
-      setAllUsers(INITIAL_USERS);
-      localStorage.setItem('allUsers', JSON.stringify(INITIAL_USERS));
+      setUsers([]);
     }
-  }, []);
+  }, [user]);
+
+  const loadUsers = async () => {
+    try {
+      const response = await fetch(USERS_API, { headers: authHeaders() });
+      if (response.ok) {
+        const data = await response.json();
+        setUsers((data.users || []).map(toUser));
+      }
+    } catch (error) {
+      console.error('Error loading users:', error);
+    }
+  };
+
+  const login = async (username: string, password: string): Promise<boolean> => {
+    try {
+      const response = await fetch(`${USERS_API}?action=login`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ username, password })
+      });
+
+      if (!response.ok) {
+        return false;
+      }
 
-  const login = (username: string, password: string): boolean => {
-    const foundUser = allUsers.find(
-      u => u.username === username && u.password === password
-    );
-
-    if (foundUser) {
-      const userData: User = {
-        id: foundUser.id,
-        username: foundUser.username,
-        role: foundUser.role,
-        name: foundUser.name
-      };
+      const result = await response.json();
+      const userData = toUser(result.user);
+      saveAuthToken(result.token);
       setUser(userData);
       localStorage.setItem('currentUser', JSON.stringify(userData));
       return true;
+    } catch (error) {
+      console.error('Login error:', error);
+      return false;
     }
-    return false;
   };
 
   const logout = () => {
     setUser(null);
     localStorage.removeItem('currentUser');
+    clearAuthToken();
   };
 
-  const addUser = (username: string, password: string, name: string, role: UserRole): boolean => {
-    if (allUsers.some(u => u.username === username)) {
-      return false;
-    }
+  const addUser = async (username: string, password: string, name: string, role: UserRole): Promise<boolean> => {
+    try {
+      const response = await fetch(USERS_API, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json', ...authHeaders() },
+        body: JSON.stringify({ username, password, name, role })
+      });
 
-    const newUser: UserWithPassword = {
-      id: Date.now().toString(),
-      username,
-      password,
-      name,
-      role
-    };
-
-    const updatedUsers = [...allUsers, newUser];
-    setAllUsers(updatedUsers);
-    localStorage.setItem('allUsers', JSON.stringify(updatedUsers));
-    return true;
-  };
+      if (!response.ok) {
+        return false;
+      }
 
-  const deleteUser = (userId: string): boolean => {
-    if (userId === '1') {
+      await loadUsers();
+      return true;
+    } catch (error) {
+      console.error('Error adding user:', error);
       return false;
     }
+  };
 
-    const updatedUsers = allUsers.filter(u => u.id !== userId);
-    setAllUsers(updatedUsers);
-    localStorage.setItem('allUsers', JSON.stringify(updatedUsers));
-    
-    if (user?.id === userId) {
-      logout();
+  const deleteUser = async (userId: string): Promise<boolean> => {
+    try {
+      const response = await fetch(`${USERS_API}?id=${userId}`, {
+        method: 'DELETE',
+        headers: authHeaders()
+      });
+
+      if (!response.ok) {
+        return false;
+      }
+
+      await loadUsers();
+      return true;
+    } catch (error) {
+      console.error('Error deleting user:', error);
+      return false;
     }
-    
-    return true;
   };
 
-  const usersWithoutPasswords: User[] = allUsers.map(({ password, ...user }) => user);
-
   return (
     <AuthContext.Provider
       value={{
@@ -97,7 +131,7 @@ export function AuthProvider({ children }: { children: React.ReactNode }) {
         logout,
         isAuthenticated: !!user,
         isAdmin: user?.role === 'admin',
-        users: usersWithoutPasswords,
+        users,
         addUser,
         deleteUser
       }}
@@ -113,4 +147,4 @@ export function useAuth() {
     throw new Error('useAuth must be used within AuthProvider');
   }
   return context;
-}
\ No newline at end of file
+}
@@ -0,0 +1,31 @@
+import { useState, useEffect } from 'react';
+
+// Функция backend/warehouses; пока её адрес не задан, доступен только основной склад из миграции V0018
+const WAREHOUSES_API = import.meta.env.VITE_WAREHOUSES_URL;
+
+export interface Warehouse {
+  id: number;
+  code: string;
+  name: string;
+}
+
+export const DEFAULT_WAREHOUSE: Warehouse = { id: 1, code: 'MAIN', name: 'Основной склад' };
+
+export function useWarehouses() {
+  const [warehouses, setWarehouses] = useState<Warehouse[]>([DEFAULT_WAREHOUSE]);
+
+  useEffect(() => {
+    if (!WAREHOUSES_API) return;
+
+    fetch(WAREHOUSES_API)
+      .then((response) => (response.ok ? response.json() : null))
+      .then((data) => {
+        if (data?.warehouses?.length) {
+          setWarehouses(data.warehouses);
+        }
+      })
+      .catch((error) => console.error('Error loading warehouses:', error));
+  }, []);
+
+  return warehouses;
+}
@@ -0,0 +1,15 @@
+const AUTH_TOKEN_KEY = 'authToken';
+
+// Подписанный токен сессии из users?action=login; API управления пользователями принимает его в X-Auth-Token
+export function saveAuthToken(token: string) {
+  localStorage.setItem(AUTH_TOKEN_KEY, token);
+}
+
+export function clearAuthToken() {
+  localStorage.removeItem(AUTH_TOKEN_KEY);
+}
+
+export function authHeaders(): Record<string, string> {
+  const token = localStorage.getItem(AUTH_TOKEN_KEY);
+  return token ? { 'X-Auth-Token': token } : {};
+}
@@ -0,0 +1,34 @@
+const RETRY_ATTEMPTS = 3;
+const RETRY_DELAY_MS = 500;
+
+// POST с заголовком Idempotency-Key: при обрыве сети, 5xx или 409 (запрос ещё выполняется)
+// повторяется с тем же ключом, и сервер возвращает сохранённый ответ вместо второй записи
+export async function idempotentPost(
+  url: string,
+  body: unknown,
+  headers: Record<string, string> = {},
+  key: string = crypto.randomUUID()
+): Promise<Response> {
+  let lastError: unknown;
+
+  for (let attempt = 1; attempt <= RETRY_ATTEMPTS; attempt++) {
+    try {
+      const response = await fetch(url, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json', 'Idempotency-Key': key, ...headers },
+        body: JSON.stringify(body)
+      });
+      if ((response.status < 500 && response.status !== 409) || attempt === RETRY_ATTEMPTS) {
+        return response;
+      }
+    } catch (error) {
+      lastError = error;
+      if (attempt === RETRY_ATTEMPTS) {
+        throw error;
+      }
+    }
+    await new Promise((resolve) => setTimeout(resolve, RETRY_DELAY_MS * attempt));
+  }
+
+  throw lastError;
+}
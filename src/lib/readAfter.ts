@@ -0,0 +1,15 @@
+const READ_AFTER_KEY = 'readAfter';
+
+// Токен read-your-writes: LSN основной БД после последней записи.
+// GET с этим токеном читает с реплики, только если она уже догнала запись.
+export function rememberReadAfter(response: Response) {
+  const token = response.headers.get('X-Read-After');
+  if (token) {
+    sessionStorage.setItem(READ_AFTER_KEY, token);
+  }
+}
+
+export function readAfterHeaders(): Record<string, string> {
+  const token = sessionStorage.getItem(READ_AFTER_KEY);
+  return token ? { 'X-Read-After': token } : {};
+}
@@ -1,4 +1,4 @@
-import { useState, useEffect, useMemo } from "react";
+import { useState, useEffect, useMemo, useRef } from "react";
 import { Tabs, TabsList, TabsTrigger } from "@/components/ui/tabs";
 import { Input } from "@/components/ui/input";
 import Icon from "@/components/ui/icon";
@@ -15,18 +15,26 @@ import { StockToolbar } from "@/components/Toolbar/StockToolbar";
 import { UsersManagement } from "@/components/UsersManagement";
 import { useToast } from "@/hooks/use-toast";
 import { useOfflineStorage } from "@/hooks/useOfflineStorage";
+import { readAfterHeaders, rememberReadAfter } from "@/lib/readAfter";
 
 const STOCK_API = 'https://functions.poehali.dev/854afd98-2bf3-4236-b8b0-7995df44c841';
 const MOVEMENTS_API = 'https://functions.poehali.dev/178c4661-b69a-4921-8960-35d7db62c2d5';
 const EXPORT_API = 'https://functions.poehali.dev/48cb185d-5567-489a-8908-5e8bc392080f';
 const IMPORT_API = 'https://functions.poehali.dev/1c73e0e3-b0c0-4736-9352-752eb1a20a78';
 const CLEAR_DB_API = 'https://functions.poehali.dev/bab0feeb-2c4b-43b9-ba7b-e35e1cf7d977';
+// Сервис scripts/stock_events.py; без него данные обновляются только после собственных действий
+const STOCK_EVENTS_URL = import.meta.env.VITE_STOCK_EVENTS_URL;
+
+const stockStatus = (quantity: number, minStock: number) =>
+  quantity < minStock / 2 ? 'Критично' : quantity < minStock ? 'Мало' : 'В наличии';
 
 const Index = () => {
   const { isAuthenticated, user, logout, isAdmin } = useAuth();
   const { isOnline, offlineData, saveOfflineData } = useOfflineStorage();
   const [activeTab, setActiveTab] = useState("dashboard");
   const [stockData, setStockData] = useState([]);
+  const stockDataRef = useRef(stockData);
+  stockDataRef.current = stockData;
   const [recentMovements, setRecentMovements] = useState([]);
   const [loading, setLoading] = useState(true);
   const [searchQuery, setSearchQuery] = useState("");
@@ -72,8 +80,8 @@ const Index = () => {
 
     try {
       const [productsRes, movementsRes] = await Promise.all([
-        fetch(STOCK_API),
-        fetch(MOVEMENTS_API)
+        fetch(STOCK_API, { headers: readAfterHeaders() }),
+        fetch(MOVEMENTS_API, { headers: readAfterHeaders() })
       ]);
       
       const productsData = await productsRes.json();
@@ -88,14 +96,14 @@ const Index = () => {
         price: p.price,
         batch: p.batch || '',
         unit: p.unit || 'шт',
-        status: p.quantity < p.min_stock / 2 ? 'Критично' : p.quantity < p.min_stock ? 'Мало' : 'В наличии'
+        status: stockStatus(p.quantity, p.min_stock)
       }));
       
       const formattedMovements = movementsData.movements.map((m: any) => ({
         date: new Date(m.created_at).toLocaleDateString('ru-RU'),
         product: m.product_name,
         type: m.movement_type,
-        quantity: m.movement_type === 'Поступление' ? m.quantity : -m.quantity,
+        quantity: m.movement_type === 'Поступление' || m.movement_type === 'Перемещение (приём)' ? m.quantity : -m.quantity,
         user: m.user_name
       }));
       
@@ -128,6 +136,29 @@ const Index = () => {
     }
   }, [isAuthenticated]);
 
+  useEffect(() => {
+    if (!isAuthenticated || !STOCK_EVENTS_URL) return;
+
+    const source = new EventSource(STOCK_EVENTS_URL);
+    source.addEventListener('stock', (event) => {
+      const changes: { product_id: number; quantity: number }[] = JSON.parse((event as MessageEvent).data).changes;
+      const known = new Set(stockDataRef.current.map((item: any) => item.id));
+      // Новый товар - перечитываем список целиком, остальное обновляем на месте
+      if (changes.some((change) => !known.has(change.product_id))) {
+        loadData();
+        return;
+      }
+      const quantities = new Map(changes.map((change) => [change.product_id, change.quantity]));
+      setStockData((items: any) => items.map((item: any) => {
+        const quantity = quantities.get(item.id);
+        return quantity === undefined ? item : { ...item, quantity, status: stockStatus(quantity, item.minStock) };
+      }));
+    });
+    source.addEventListener('reset', () => loadData());
+
+    return () => source.close();
+  }, [isAuthenticated]);
+
   const handleAddProduct = async () => {
     try {
       const response = await fetch(STOCK_API, {
@@ -135,6 +166,7 @@ const Index = () => {
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify(newProduct)
       });
+      rememberReadAfter(response);
       
       if (response.ok) {
         toast({
@@ -212,18 +244,32 @@ const Index = () => {
         const base64 = e.target?.result as string;
         const base64Data = base64.split(',')[1];
         
-        const response = await fetch(IMPORT_API, {
+        let response = await fetch(IMPORT_API, {
           method: 'POST',
           headers: { 'Content-Type': 'application/json' },
-          body: JSON.stringify({ file: base64Data })
+          body: JSON.stringify({ file: base64Data, mode: 'job' })
         });
-        
-        if (response.ok) {
-          const result = await response.json();
-          
+
+        // Большой файл обрабатывается порциями: каждый POST с job_id продолжает задание
+        // с последней закоммиченной порции, пока оно не завершится
+        let job = response.ok ? (await response.json()).job : null;
+        while (job && job.status !== 'done' && job.status !== 'failed') {
+          if (response.status === 409) {
+            await new Promise((resolve) => setTimeout(resolve, 1000));
+          }
+          response = await fetch(IMPORT_API, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ job_id: job.id })
+          });
+          if (response.status !== 200 && response.status !== 409) break;
+          job = (await response.json()).job;
+        }
+
+        if (job && job.status === 'done') {
           toast({
             title: "Импорт завершен",
-            description: `Добавлено: ${result.inserted}, Обновлено: ${result.updated}`
+            description: `Добавлено: ${job.inserted}, Обновлено: ${job.updated}`
           });
           
           setImportOpen(false);
@@ -232,7 +278,7 @@ const Index = () => {
           
           await loadData();
         } else {
-          const error = await response.json();
+          const error = job?.status === 'failed' ? job : await response.json().catch(() => ({}));
           toast({
             title: "Ошибка импорта",
             description: error.error || "Не удалось импортировать данные",
@@ -269,7 +315,7 @@ const Index = () => {
         
         toast({
           title: "База данных очищена",
-          description: `Удалено товаров: ${result.products_deleted}, движений: ${result.movements_deleted}`
+          description: `Удалено товаров: ${result.products_deleted}, движений: ~${result.movements_deleted_estimate}`
         });
         
         await loadData();
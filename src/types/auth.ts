@@ -7,17 +7,13 @@ export interface User {
   name: string;
 }
 
-export interface UserWithPassword extends User {
-  password: string;
-}
-
 export interface AuthContextType {
   user: User | null;
-  login: (username: string, password: string) => boolean;
+  login: (username: string, password: string) => Promise<boolean>;
   logout: () => void;
   isAuthenticated: boolean;
   isAdmin: boolean;
   users: User[];
-  addUser: (username: string, password: string, name: string, role: UserRole) => boolean;
-  deleteUser: (userId: string) => boolean;
+  addUser: (username: string, password: string, name: string, role: UserRole) => Promise<boolean>;
+  deleteUser: (userId: string) => Promise<boolean>;
 }
\ No newline at end of file